@@ -4,6 +4,8 @@ BluetoothModule::BluetoothModule(uint8_t rxPin, uint8_t txPin, long baudRate) {
   btSerial = new SoftwareSerial(rxPin, txPin);
   btSerial->begin(baudRate);
   isConnected = false;
+  binaryMode = false;
+  sequence = 0;
 }
 
 void BluetoothModule::begin() {
@@ -19,6 +21,23 @@ void BluetoothModule::sendData(String data) {
 }
 
 void BluetoothModule::sendData(float temperature, float humidity) {
+  if (binaryMode) {
+    // 二进制帧（7字节）: 0xA5 | 序号 | 温度 int16 (0.01°C) | 湿度 uint16 (0.01%) | CRC-8
+    int16_t temp = (int16_t)(temperature * 100.0 + (temperature < 0 ? -0.5 : 0.5));
+    uint16_t hum = (uint16_t)(humidity * 100.0 + 0.5);
+    uint8_t frame[7];
+    frame[0] = 0xA5;
+    frame[1] = sequence++;
+    frame[2] = temp & 0xFF;
+    frame[3] = (temp >> 8) & 0xFF;
+    frame[4] = hum & 0xFF;
+    frame[5] = (hum >> 8) & 0xFF;
+    frame[6] = crc8(frame + 1, 5);
+    btSerial->write(frame, sizeof(frame));
+    btSerial->flush();
+    return;
+  }
+
   // 优化数据格式，减少传输字节
   String data = "D:" + String(temperature, 1) + "," + String(humidity, 1);
   sendData(data);
@@ -41,7 +60,10 @@ bool BluetoothModule::checkCommand() {
 }
 
 String BluetoothModule::getCommand() {
-  return receivedCommand;
+  // 取出后清空缓冲区，否则下一条命令会接在这条后面（如 "CONNECTSET_THRESHOLD,..."）
+  String command = receivedCommand;
+  receivedCommand = "";
+  return command;
 }
 
 void BluetoothModule::sendResponse(String response) {
@@ -56,8 +78,29 @@ bool BluetoothModule::connectionStatus() {
 void BluetoothModule::updateConnectionStatus(bool status) {
   isConnected = status;
   if (status) {
-    sendResponse("CONNECTED");
+    sendResponse(binaryMode ? "CONNECTED,BIN" : "CONNECTED");
   } else {
     sendResponse("DISCONNECTED");
   }
+}
+
+void BluetoothModule::setBinaryMode(bool enabled) {
+  binaryMode = enabled;
+  sequence = 0;
+}
+
+bool BluetoothModule::binaryModeEnabled() {
+  return binaryMode;
+}
+
+uint8_t BluetoothModule::crc8(const uint8_t* data, uint8_t length) {
+  // CRC-8，多项式 0x07，初值 0
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
 }
\ No newline at end of file
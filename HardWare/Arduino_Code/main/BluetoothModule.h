@@ -8,6 +8,9 @@ class BluetoothModule {
     SoftwareSerial* btSerial;
     String receivedCommand;
     bool isConnected;
+    bool binaryMode;      // 连接时主机发送 CONNECT,BIN 则以二进制帧发送数据
+    uint8_t sequence;     // 二进制帧序号，主机据此检测丢帧
+    static uint8_t crc8(const uint8_t* data, uint8_t length);
     
   public:
     BluetoothModule(uint8_t rxPin, uint8_t txPin, long baudRate = 9600);
@@ -19,6 +22,8 @@ class BluetoothModule {
     void sendResponse(String response);
     bool connectionStatus();
     void updateConnectionStatus(bool status);
+    void setBinaryMode(bool enabled);
+    bool binaryModeEnabled();
 };
 
 #endif
\ No newline at end of file
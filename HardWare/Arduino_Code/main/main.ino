@@ -156,12 +156,15 @@ void processBluetoothCommand(String command) {
     bluetooth.sendResponse("STATUS:" + deviceStatus);
   }
   else if (command.startsWith("CONNECT")) {
+    // CONNECT,BIN 请求二进制分帧，其余情况保持文本格式
+    bluetooth.setBinaryMode(command.startsWith("CONNECT,BIN"));
     bluetooth.updateConnectionStatus(true);
     deviceStatus = "CONNECTED";
     tftDisplay.drawFooter(deviceStatus);
     Serial.println("蓝牙已连接");
   }
   else if (command.startsWith("DISCONNECT")) {
+    bluetooth.setBinaryMode(false);
     bluetooth.updateConnectionStatus(false);
     deviceStatus = "RUNNING";
     tftDisplay.drawFooter(deviceStatus);
@@ -0,0 +1,370 @@
+"""
+报警引擎
+在采集路径上按设备、按通道（温度/湿度）检查报警规则，不经过界面线程：
+  threshold  超出 temp_min/temp_max 或 hum_min/hum_max；带回差，回到 [下限+回差, 上限-回差] 内才解除，
+             超限持续 min_duration 秒后才报警，短暂的毛刺不报警
+  rate       变化速率（每分钟）超过上限，速率按 rate_window 秒前的读数计算；回落到上限的 80% 以下解除
+接收线程只把读数追加到缓冲区，后台线程每 interval 秒取出一批，按设备分组后用 NumPy 整批计算，
+每秒数千条读数、多台设备时开销也很小。
+
+报警和解除都以事件（字典）发给 listeners，界面、采集程序、报警日志（AlertLog）
+和 Webhook（WebhookSink）各自订阅。本地测试 Webhook 可以运行：
+    python alerts.py --serve 9109        # 接收并打印 POST 到 http://127.0.0.1:9109/ 的报警事件
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from array import array
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue
+
+np = None       # NumPy 在第一次整批检查时才导入，见 _import_numpy()
+
+# 通道 -> (阈值键前缀, 名称, 单位)
+CHANNELS = {
+    'temperature': ('temp', "温度", "°C"),
+    'humidity': ('hum', "湿度", "%"),
+}
+RATE_CLEAR_RATIO = 0.8
+
+
+def _import_numpy():
+    """导入 NumPy（约占采集程序导入时间的一半），只有整批检查用到"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def _latch(set_mask, clear_mask, initial):
+    """置位/复位锁存：每个位置的状态为此前最近一次置位或复位的结果，都没有时为 initial"""
+    n = len(set_mask)
+    marks = np.where(set_mask, 1, np.where(clear_mask, 0, -1))
+    last = np.where(marks >= 0, np.arange(n), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, marks[np.maximum(last, 0)] == 1, initial)
+
+
+def _previous(values, initial):
+    """values 右移一位，第一个位置填 initial（上一批的最后状态）"""
+    shifted = np.empty_like(values)
+    shifted[0] = initial
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+class _ChannelState:
+    """一个设备一个通道跨批次保留的状态"""
+    __slots__ = ('out', 'since', 'alarm', 'rate_alarm', 'tail')
+
+    def __init__(self):
+        self.out = False                # 回差判断后的超限状态
+        self.since = 0.0                # 本次超限开始的时间
+        self.alarm = False              # 阈值报警（超限已持续 min_duration）
+        self.rate_alarm = False
+        self.tail = np.empty(0)         # 计算速率需要的最近读数
+
+
+class AlertEngine:
+    def __init__(self, thresholds, hysteresis=None, min_duration=5.0, rates=None,
+                 rate_window=60.0, interval=0.5):
+        self.thresholds = thresholds            # thresholds(device) -> {'temp_min': ..., 'temp_max': ..., ...}
+        self.hysteresis = hysteresis or {'temperature': 0.5, 'humidity': 2.0}
+        self.min_duration = min_duration
+        self.rates = rates or {}                # 通道 -> 每分钟变化上限，0 或缺省表示不检查
+        self.rate_window = rate_window
+        self.interval = interval
+        self.listeners = []                     # listener(event)，在报警线程中调用
+        self.active = {}                        # (设备, 通道, 规则) -> 报警事件
+
+        # 接收线程追加，报警线程整批取出
+        self._lock = threading.Lock()
+        self._times = array('d')
+        self._temperatures = array('d')
+        self._humidities = array('d')
+        self._codes = array('i')
+        self._device_codes = {}
+        self._device_ids = []
+
+        self._states = {}                       # (设备, 通道) -> _ChannelState
+        self._tail_times = {}                   # 设备 -> 速率窗口内的时间戳
+        self._eval_lock = threading.Lock()
+
+        # 统计
+        self.samples = 0
+        self.batches = 0
+        self.raised = 0
+        self.cleared = 0
+        self.eval_seconds = 0.0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, timestamp, temperature, humidity, device):
+        """追加一条读数（接收线程调用，只做追加）"""
+        with self._lock:
+            code = self._device_codes.get(device)
+            if code is None:
+                code = self._device_codes[device] = len(self._device_ids)
+                self._device_ids.append(device)
+            self._times.append(timestamp)
+            self._temperatures.append(temperature)
+            self._humidities.append(humidity)
+            self._codes.append(code)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.evaluate()
+            except Exception as e:
+                print(f"报警检查错误: {e}")
+
+    def close(self):
+        """检查剩余读数后停止报警线程"""
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.evaluate()
+
+    # ---------- 批量检查 ----------
+
+    def evaluate(self):
+        """取出缓冲区中的全部读数整批检查，返回产生的事件"""
+        _import_numpy()
+        with self._lock:
+            if not self._times:
+                return []
+            times = np.frombuffer(self._times, dtype=np.float64).copy()
+            temperatures = np.frombuffer(self._temperatures, dtype=np.float64).copy()
+            humidities = np.frombuffer(self._humidities, dtype=np.float64).copy()
+            codes = np.frombuffer(self._codes, dtype=np.int32).copy()
+            device_ids = list(self._device_ids)
+            del self._times[:], self._temperatures[:], self._humidities[:], self._codes[:]
+
+        started = time.perf_counter()
+        events = []
+        with self._eval_lock:
+            # 按设备分组，组内保持到达顺序
+            order = np.argsort(codes, kind='stable')
+            bounds = np.flatnonzero(np.diff(codes[order])) + 1
+            for group in np.split(order, bounds):
+                device = device_ids[codes[group[0]]]
+                thresholds = self.thresholds(device)
+                t = times[group]
+                tail_times = self._tail_times.get(device, np.empty(0))
+                for channel, values in (('temperature', temperatures[group]),
+                                        ('humidity', humidities[group])):
+                    key = (device, channel)
+                    state = self._states.get(key)
+                    if state is None:
+                        state = self._states[key] = _ChannelState()
+                    self._check_threshold(device, channel, state, t, values, thresholds, events)
+                    if self.rates.get(channel):
+                        self._check_rate(device, channel, state, t, values, tail_times, events)
+                if any(self.rates.get(channel) for channel in CHANNELS):
+                    all_times = np.concatenate((tail_times, t))
+                    self._tail_times[device] = all_times[self._tail_start(all_times)]
+
+            events.sort(key=lambda event: event['time'])
+            for event in events:
+                key = (event['device'], event['channel'], event['rule'])
+                if event['state'] == 'raised':
+                    self.active[key] = event
+                    self.raised += 1
+                else:
+                    self.active.pop(key, None)
+                    self.cleared += 1
+            self.samples += len(times)
+            self.batches += 1
+            self.eval_seconds = time.perf_counter() - started
+
+        for event in events:
+            for listener in list(self.listeners):
+                try:
+                    listener(event)
+                except Exception as e:
+                    print(f"报警回调错误: {e}")
+        return events
+
+    def _check_threshold(self, device, channel, state, t, values, thresholds, events):
+        prefix = CHANNELS[channel][0]
+        low, high = thresholds[f'{prefix}_min'], thresholds[f'{prefix}_max']
+        hysteresis = self.hysteresis.get(channel, 0.0)
+
+        # 回差：超出范围置位，回到收窄后的范围内复位，两者之间保持原状态
+        out = _latch((values < low) | (values > high),
+                     (values >= low + hysteresis) & (values <= high - hysteresis), state.out)
+
+        # 最短持续时间：每段连续超限从开始时间算起，满 min_duration 后的读数才处于报警状态
+        n = len(values)
+        starts = out & ~_previous(out, state.out)
+        last_start = np.where(starts, np.arange(n), -1)
+        np.maximum.accumulate(last_start, out=last_start)
+        since = np.where(last_start >= 0, t[np.maximum(last_start, 0)], state.since)
+        alarm = out & (t - since >= self.min_duration)
+
+        self._emit_edges(device, channel, 'threshold', alarm, state.alarm, t, values, events,
+                         low=low, high=high)
+        state.out = bool(out[-1])
+        state.since = float(since[-1])
+        state.alarm = bool(alarm[-1])
+
+    def _check_rate(self, device, channel, state, t, values, tail_times, events):
+        limit = self.rates[channel]
+        all_times = np.concatenate((tail_times, t))
+        all_values = np.concatenate((state.tail, values))
+        # 每条读数与 rate_window 秒前最近的一条比较
+        reference = np.searchsorted(all_times, t - self.rate_window, side='right') - 1
+        valid = reference >= 0
+        reference = np.maximum(reference, 0)
+        elapsed = t - all_times[reference]
+        valid &= elapsed > 0
+        rate = np.zeros(len(values))
+        np.divide((values - all_values[reference]) * 60.0, elapsed, out=rate, where=valid)
+        magnitude = np.abs(rate)
+
+        alarm = _latch(valid & (magnitude > limit), magnitude <= limit * RATE_CLEAR_RATIO, state.rate_alarm)
+        self._emit_edges(device, channel, 'rate', alarm, state.rate_alarm, t, rate, events, limit=limit)
+        state.rate_alarm = bool(alarm[-1])
+        state.tail = all_values[self._tail_start(all_times)]
+
+    def _tail_start(self, all_times):
+        """保留最后 rate_window 秒的读数，以及它之前的一条（下一批的比较基准）"""
+        return slice(max(np.searchsorted(all_times, all_times[-1] - self.rate_window, side='right') - 1, 0),
+                     None)
+
+    def _emit_edges(self, device, channel, rule, alarm, initial, t, values, events, **limits):
+        """报警状态由假变真时产生 raised 事件，由真变假时产生 cleared 事件"""
+        previous = _previous(alarm, initial)
+        _, name, unit = CHANNELS[channel]
+        for index in np.flatnonzero(alarm != previous):
+            raised = bool(alarm[index])
+            value = float(values[index])
+            if rule == 'threshold':
+                detail = f"{name} {value:.1f}{unit} " + (
+                    f"超出范围 [{limits['low']}, {limits['high']}]" if raised else "回到正常范围")
+            else:
+                detail = f"{name}变化 {value:+.1f}{unit}/分钟 " + (
+                    f"超过 {limits['limit']}{unit}/分钟" if raised else "恢复平稳")
+            events.append({
+                'time': float(t[index]),
+                'timestamp': datetime.fromtimestamp(t[index]).strftime('%Y-%m-%d %H:%M:%S'),
+                'device': device,
+                'channel': channel,
+                'rule': rule,
+                'state': 'raised' if raised else 'cleared',
+                'value': round(value, 2),
+                **limits,
+                'message': f"{'报警' if raised else '恢复'} {device}: {detail}"
+            })
+
+    def stats(self):
+        """返回统计计数"""
+        return {
+            'samples': self.samples,
+            'batches': self.batches,
+            'raised': self.raised,
+            'cleared': self.cleared,
+            'active': len(self.active),
+            'eval_seconds': self.eval_seconds
+        }
+
+
+class AlertLog:
+    """报警日志：每个事件追加一行 JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"写入报警日志失败: {e}")
+
+
+class WebhookSink:
+    """把报警事件以 JSON POST 到指定 URL；在自己的线程中发送，接收端慢或不可用时不影响报警线程"""
+
+    def __init__(self, url, timeout=2.0, maxsize=1000):
+        self.url = url
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self._queue = Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, event):
+        if self._queue.full():
+            self.failed += 1
+            return
+        self._queue.put(event)
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            request = urllib.request.Request(
+                self.url, data=json.dumps(event, ensure_ascii=False).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"发送报警 Webhook 失败: {e}")
+
+    def close(self):
+        """发送完已排队的事件后停止"""
+        self._queue.put(None)
+        self._thread.join(timeout=self.timeout + 1)
+
+
+def serve_webhook(port=9109, host="127.0.0.1"):
+    """本地 Webhook 接收端：打印收到的报警事件，用于在没有真实报警服务时测试"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                event = json.loads(self.rfile.read(length))
+                print(f"[{event.get('timestamp')}] {event.get('message')}")
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"报警 Webhook 接收端: http://{host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="报警 Webhook 本地接收端")
+    parser.add_argument("--serve", type=int, default=9109, metavar="PORT", help="监听端口")
+    args = parser.parse_args(argv)
+    serve_webhook(args.serve)
+
+
+if __name__ == "__main__":
+    main()
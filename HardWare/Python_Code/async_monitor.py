@@ -0,0 +1,268 @@
+"""
+asyncio 采集接口
+在 asyncio 服务中嵌入采集：串口以非阻塞方式打开，文件描述符通过 loop.add_reader 注册到事件循环，
+一个事件循环即可同时处理任意多台设备，不为每个串口创建线程，也不做定时轮询。
+分帧解析、历史存储、汇总和阈值配置都复用 BluetoothMonitor，记录不经过 data_queue，
+直接分发给各个 stream() 的消费者。依赖 add_reader，仅支持 posix 系统。
+
+用法:
+    async with AsyncMonitor() as monitor:
+        await monitor.connect("/dev/rfcomm0")
+        print(await monitor.request("STATUS"))
+        async for record in monitor.stream():
+            print(record)
+"""
+
+import asyncio
+import os
+
+from bluetooth_monitor import BluetoothMonitor
+from command_channel import UNKNOWN_REPLY, expected_reply
+from device_manager import DeviceLink
+
+
+class AsyncLink:
+    """事件循环中的一台设备：串口连接加上等待回应的请求队列"""
+
+    def __init__(self, device_id, link):
+        self.device_id = device_id
+        self.link = link
+        self.pending = []           # [(回应前缀, future)]，按发送顺序排列
+
+    def resolve(self, response):
+        """把 RESP 回应交给最早的匹配请求，返回是否有请求在等待它"""
+        for index, (reply, future) in enumerate(self.pending):
+            if reply is None:
+                continue
+            if response.startswith(reply) or response == UNKNOWN_REPLY:
+                del self.pending[index]
+                if not future.done():
+                    future.set_result(response)
+                return True
+        return False
+
+    def resolve_data(self, record):
+        for index, (reply, future) in enumerate(self.pending):
+            if reply is None:
+                del self.pending[index]
+                if not future.done():
+                    future.set_result(record)
+                return
+
+    def fail(self, error):
+        for _, future in self.pending:
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+
+
+class RecordStream:
+    """stream() 返回的异步迭代器：创建时立即订阅，第一次迭代之前到达的记录也会收到；
+    close() 后结束。提前停止迭代时调用 aclose()（或用 async with）取消订阅"""
+
+    def __init__(self, streams, size, device_id):
+        self._streams = streams
+        self._queue = asyncio.Queue(size)
+        self._subscriber = (self._queue, device_id)
+        streams.append(self._subscriber)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._subscriber not in self._streams:
+            raise StopAsyncIteration
+        record = await self._queue.get()
+        if record is None:
+            self._unsubscribe()
+            raise StopAsyncIteration
+        return record
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        self._unsubscribe()
+
+    def _unsubscribe(self):
+        if self._subscriber in self._streams:
+            self._streams.remove(self._subscriber)
+
+    def __del__(self):
+        self._unsubscribe()
+
+
+class AsyncMonitor:
+    DEFAULT_DEVICE = BluetoothMonitor.DEFAULT_DEVICE
+
+    def __init__(self, monitor=None, config_file="config.json", history_capacity=None,
+                 stream_size=1000, request_timeout=2.0):
+        if os.name != 'posix':
+            raise RuntimeError("asyncio 采集接口依赖 loop.add_reader，仅支持 posix 系统")
+        self.monitor = monitor or BluetoothMonitor(config_file=config_file,
+                                                   history_capacity=history_capacity)
+        self.stream_size = stream_size          # 每个 stream() 消费者最多缓存的记录数
+        self.request_timeout = request_timeout
+        self.links = {}
+        self.dropped = 0                        # 消费者跟不上时丢弃的记录数
+        self._streams = []                      # [(asyncio.Queue, 设备ID或None)]
+        self._connected_before = set()          # 成功连接过的设备ID，用于统计重连
+        self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # ---------- 连接 ----------
+
+    async def connect(self, port=None, baudrate=None, device_id=None, timeout=None):
+        """打开串口并发送连接命令，返回设备的回应（CONNECTED 或 CONNECTED,BIN）"""
+        device_id = device_id or self.DEFAULT_DEVICE
+        if device_id in self.links:
+            await self.disconnect(device_id)
+        self._loop = asyncio.get_running_loop()
+
+        config = self.monitor.config
+        framer_device = None if device_id == self.DEFAULT_DEVICE else device_id
+        framer = self.monitor.create_framer(
+            framer_device, publish=self._publish,
+            on_response=lambda response: self._on_response(device_id, response))
+        link = DeviceLink(device_id, port or config['port'], framer, baudrate or config['baudrate'],
+                          connect_command=self.monitor.connect_command())
+        entry = AsyncLink(device_id, link)
+
+        # 请求先登记再发送；DeviceLink.open() 会发送连接命令
+        future = self._loop.create_future()
+        entry.pending.append((expected_reply("CONNECT"), future))
+        try:
+            # 打开串口可能阻塞（蓝牙串口建立连接需要数秒），放到线程池中执行
+            await self._loop.run_in_executor(None, link.open)
+        except Exception:
+            self.monitor.connect_failures_total.inc()
+            raise
+        self.links[device_id] = entry
+        self._loop.add_reader(link._fd, self._on_readable, entry)
+
+        try:
+            reply = await asyncio.wait_for(future, timeout or self.request_timeout)
+        except BaseException:
+            self.monitor.connect_failures_total.inc()
+            self._remove(device_id)
+            raise
+        # 之前连接过的设备再次连接才算重连，其他设备的首次连接不算
+        if device_id in self._connected_before:
+            self.monitor.reconnects_total.inc()
+        self._connected_before.add(device_id)
+        self.monitor.connects_total.inc()
+        return reply
+
+    async def connect_devices(self):
+        """并发打开 config.json 中 devices 列表里的所有设备，返回成功的设备ID"""
+        devices = self.monitor.devices.configured_devices()
+        results = await asyncio.gather(
+            *(self.connect(device['port'], device.get('baudrate'), device['id']) for device in devices),
+            return_exceptions=True)
+        opened = []
+        for device, result in zip(devices, results):
+            if isinstance(result, BaseException):
+                print(f"设备 {device['id']} 连接失败: {result!r}")
+            else:
+                opened.append(device['id'])
+        return opened
+
+    async def disconnect(self, device_id=None):
+        """发送断开命令并关闭串口"""
+        device_id = device_id or self.DEFAULT_DEVICE
+        if device_id not in self.links:
+            return
+        try:
+            await self.request("DISCONNECT", device_id, timeout=0.5)
+        except (asyncio.TimeoutError, OSError):
+            pass
+        self._remove(device_id)
+
+    def _remove(self, device_id):
+        entry = self.links.pop(device_id, None)
+        if entry is None:
+            return
+        link = entry.link
+        if link._fd is not None:
+            self._loop.remove_reader(link._fd)
+        entry.fail(ConnectionError(f"设备 {device_id} 已断开"))
+        if link.serial_port and link.serial_port.is_open:
+            link.serial_port.close()
+
+    async def close(self):
+        """断开所有设备，结束所有 stream()，关闭历史存储"""
+        for device_id in list(self.links):
+            await self.disconnect(device_id)
+        for queue, _ in self._streams:
+            self._put(queue, None)
+        # monitor.close() 会等待线程退出和落盘，放到线程池中执行，不阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(None, self.monitor.close)
+
+    # ---------- 请求 ----------
+
+    async def request(self, command, device_id=None, timeout=None):
+        """发送命令并等待对应的 RESP 回应（GET_DATA 等待下一条读数），超时抛出 asyncio.TimeoutError"""
+        device_id = device_id or self.DEFAULT_DEVICE
+        entry = self.links.get(device_id)
+        if entry is None:
+            raise ConnectionError(f"设备 {device_id} 未连接")
+
+        future = self._loop.create_future()
+        item = (expected_reply(command), future)
+        entry.pending.append(item)
+        try:
+            entry.link.write((command + '\n').encode('utf-8'))
+        except OSError:
+            entry.pending.remove(item)
+            self.monitor.send_errors_total.inc()
+            raise
+        try:
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        finally:
+            if item in entry.pending:
+                entry.pending.remove(item)
+
+    # ---------- 数据 ----------
+
+    def stream(self, device_id=None):
+        """异步迭代新到达的记录（RecordStream）；device_id 为空时包括所有设备，close() 后结束。
+        调用时即开始接收，可以先创建 stream 再连接或发送请求"""
+        return RecordStream(self._streams, self.stream_size, device_id)
+
+    def _put(self, queue, record):
+        """队列满时丢弃最旧的记录"""
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(record)
+
+    def _publish(self, record):
+        """分帧解析器的记录回调（在事件循环线程中调用）"""
+        device_id = record['device']
+        entry = self.links.get(device_id)
+        if entry is not None and entry.pending:
+            entry.resolve_data(record)
+        for queue, wanted in self._streams:
+            if wanted is None or wanted == device_id:
+                self._put(queue, record)
+
+    def _on_response(self, device_id, response):
+        entry = self.links.get(device_id)
+        if entry is None or not entry.resolve(response):
+            print(f"设备响应 [{device_id}]: {response}")
+
+    def _on_readable(self, entry):
+        try:
+            entry.link.read_available()
+        except Exception as e:
+            self.monitor.device_errors_total.inc()
+            print(f"设备 {entry.device_id} 读取错误: {e}")
+            self._remove(entry.device_id)
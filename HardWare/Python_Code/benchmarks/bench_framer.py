@@ -0,0 +1,156 @@
+"""
+分帧解析微基准
+对比原 receive_data 中的 str 拼接 + split 解析与 LineFramer 的每秒处理行数，
+以及同样读数下文本帧与二进制帧（BinaryFramer）的字节数和解析速度。
+用法：python benchmarks/bench_framer.py [行数] [每次读取字节数]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from binary_framer import BinaryFramer, encode_frame
+from line_framer import LineFramer
+
+
+def make_stream(lines, seed=0):
+    """生成与固件输出格式一致的字节流，夹杂少量响应和损坏行"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        if i % 100 == 0:
+            out.append(b"RESP:THRESHOLD_SET\r\n")
+        elif i % 250 == 0:
+            out.append(b"D:23.4,\r\n")
+        else:
+            out.append(f"D:{rng.uniform(15, 35):.1f},{rng.uniform(20, 90):.1f}\r\n".encode())
+    return b''.join(out)
+
+
+def make_binary_stream(lines, seed=0):
+    """与 make_stream 相同的内容，数据行换成二进制帧（响应仍为文本行，损坏行换成校验错误的帧）"""
+    rng = random.Random(seed)
+    out = []
+    sequence = 0
+    for i in range(lines):
+        if i % 100 == 0:
+            out.append(b"RESP:THRESHOLD_SET\r\n")
+            continue
+        if i % 250 == 0:
+            frame = bytearray(encode_frame(sequence, 23.4, 0.0))
+            frame[-1] ^= 0xFF
+            out.append(bytes(frame))
+        else:
+            out.append(encode_frame(sequence, rng.uniform(15, 35), rng.uniform(20, 90)))
+        sequence += 1
+    return b''.join(out)
+
+
+def make_noise_stream(lines, noise_bytes=64 * 1024):
+    """开头是一段没有换行符的噪声（例如波特率不匹配时），后面是正常数据"""
+    return b'#' * noise_bytes + b'\n' + make_stream(lines)
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def legacy_parse(parts):
+    """原实现：逐块解码、字符串拼接、整体重新分割"""
+    counter = [0]
+
+    def on_data(temperature, humidity):
+        counter[0] += 1
+
+    buffer = ""
+    for raw_data in parts:
+        buffer += raw_data.decode('utf-8', errors='ignore')
+        lines = buffer.split('\n')
+        buffer = lines[-1]
+        for line in lines[:-1]:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('DATA:'):
+                values = line.replace('DATA:', '').split(',')
+            elif line.startswith('D:'):
+                values = line.replace('D:', '').split(',')
+            else:
+                continue
+            if len(values) == 2:
+                try:
+                    on_data(float(values[0]), float(values[1]))
+                except ValueError:
+                    pass
+    return counter[0]
+
+
+def framer_parse(parts):
+    counter = [0]
+
+    def on_data(temperature, humidity):
+        counter[0] += 1
+
+    framer = LineFramer(on_data, lambda response: None)
+    for raw_data in parts:
+        framer.feed(raw_data)
+    return counter[0]
+
+
+def binary_parse(parts):
+    counter = [0]
+
+    def on_data(temperature, humidity):
+        counter[0] += 1
+
+    framer = BinaryFramer(on_data, lambda response: None)
+    for raw_data in parts:
+        framer.feed(raw_data)
+    return counter[0]
+
+
+def bench(name, func, parts, line_count, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(parts)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<10} {line_count / best:>14,.0f} 行/秒  ({best * 1000:.1f} ms)")
+    return line_count / best
+
+
+if __name__ == "__main__":
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    stream = make_stream(line_count)
+    print(f"{line_count} 行, {len(stream)} 字节, 每次读取 {chunk_size} 字节")
+
+    scenarios = [
+        (f"正常数据, 块大小 {chunk_size}", stream, chunk_size),
+        ("正常数据, 块大小 4096", stream, 4096),
+        (f"64KB 无换行噪声 + 2000 行, 块大小 {chunk_size}", make_noise_stream(2000), chunk_size),
+    ]
+    for title, data, size in scenarios:
+        parts = chunks(data, size)
+        count = legacy_parse(parts)
+        assert count == framer_parse(parts)
+        print(f"--- {title} ---")
+        before = bench("原实现", legacy_parse, parts, count)
+        after = bench("LineFramer", framer_parse, parts, count)
+        print(f"加速比: {after / before:.2f}x")
+
+    binary_stream = make_binary_stream(line_count)
+    for size in (chunk_size, 4096):
+        text_parts = chunks(stream, size)
+        binary_parts = chunks(binary_stream, size)
+        count = framer_parse(text_parts)
+        assert count == binary_parse(binary_parts)
+        print(f"--- 文本帧 / 二进制帧, 块大小 {size} ---")
+        print(f"每条记录字节数: 文本 {len(stream) / count:.1f}, 二进制 {len(binary_stream) / count:.1f}")
+        before = bench("文本", framer_parse, text_parts, count)
+        after = bench("二进制", binary_parse, binary_parts, count)
+        print(f"加速比: {after / before:.2f}x")
@@ -0,0 +1,164 @@
+"""
+多设备负载测试
+在独立进程中用模拟设备产生数据，本进程用 BluetoothMonitor + DeviceManager 接收，
+逐级增加设备数量，找出 Python 端吞吐量和延迟的上限。
+延迟 = 记录进入 data_queue 的时间 - 模拟设备写入伪终端的时间（同一设备按顺序一一对应）。
+仅支持 posix 系统。
+用法：python benchmarks/bench_load.py [--devices 10,50,100,200,500] [--interval 0.1] [--duration 10] [--json 结果.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from queue import Empty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bluetooth_monitor import BluetoothMonitor
+from device_simulator import DeviceSimulator, raise_fd_limit
+
+
+class TimingMonitor(BluetoothMonitor):
+    """记录每条数据处理完成的时间"""
+
+    def __init__(self, *args, **kwargs):
+        self.receive_times = {}
+        self.recording = False
+        super().__init__(*args, **kwargs)
+
+    def _process_sensor_data(self, temperature, humidity, device_id=None, publish=None):
+        super()._process_sensor_data(temperature, humidity, device_id, publish)
+        if self.recording:
+            self.receive_times.setdefault(device_id, []).append(time.time())
+
+
+def simulator_process(conn, count, interval, jitter):
+    """子进程：创建模拟设备，收到开始信号后发送数据，收到停止信号后返回发送时间"""
+    raise_fd_limit(count)
+    simulator = DeviceSimulator()
+    for i in range(count):
+        simulator.add_device(interval=interval, jitter=jitter, seed=i)
+    conn.send(simulator.device_config())
+
+    conn.recv()
+    for device in simulator.devices:
+        device.send_times = []
+    simulator.start()
+
+    conn.recv()
+    simulator.stop()
+    conn.send({
+        'send_times': {device.device_id: device.send_times for device in simulator.devices},
+        'stats': simulator.stats()
+    })
+    conn.recv()
+    simulator.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_step(count, interval, jitter, duration):
+    """测试一个设备数量，返回结果字典"""
+    raise_fd_limit(count)
+    conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=simulator_process,
+                                      args=(child_conn, count, interval, jitter), daemon=True)
+    process.start()
+    devices = conn.recv()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_file = os.path.join(workdir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"devices": devices, "history_dir": os.path.join(workdir, "history")}, f)
+
+        monitor = TimingMonitor(config_file=config_file, history_capacity=100000)
+        opened = monitor.connect_devices()
+        monitor.recording = True
+        cpu_start = time.process_time()
+        conn.send("start")
+
+        # 模拟界面线程持续取出数据
+        consumed = 0
+        end = time.time() + duration
+        while time.time() < end:
+            try:
+                monitor.data_queue.get(timeout=0.1)
+                consumed += 1
+            except Empty:
+                pass
+        conn.send("stop")
+        result = conn.recv()
+
+        # 等待在途数据
+        time.sleep(0.5)
+        monitor.recording = False
+        cpu = time.process_time() - cpu_start
+        monitor.close()
+    conn.send("exit")
+    process.join(timeout=5)
+
+    latencies = []
+    sent = received = 0
+    for device_id, send_times in result['send_times'].items():
+        receive_times = monitor.receive_times.get(device_id, [])
+        sent += len(send_times)
+        received += len(receive_times)
+        latencies.extend(r - s for s, r in zip(send_times, receive_times))
+    latencies.sort()
+
+    return {
+        'devices': count,
+        'opened': len(opened),
+        'offered_per_sec': round(count / interval, 1),
+        'received_per_sec': round(received / duration, 1),
+        'sent': sent,
+        'received': received,
+        'lost': sent - received,
+        'pty_dropped': result['stats']['dropped'],
+        'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'latency_max_ms': round(latencies[-1] * 1000, 2) if latencies else float('nan'),
+        'cpu_percent': round(cpu / (duration + 0.5) * 100, 1),
+        'consumed': consumed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多设备负载测试")
+    parser.add_argument("--devices", default="10,50,100,200,500", help="逗号分隔的设备数量")
+    parser.add_argument("--interval", type=float, default=0.1, help="每台设备的发送间隔（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01, help="发送间隔抖动（秒）")
+    parser.add_argument("--duration", type=float, default=10.0, help="每级测试时长（秒）")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if os.name != 'posix':
+        parser.error("模拟设备依赖伪终端，仅支持 posix 系统")
+
+    results = []
+    print(f"{'设备数':>6}{'输入/s':>10}{'接收/s':>10}{'丢失':>8}{'p50(ms)':>10}"
+          f"{'p99(ms)':>10}{'max(ms)':>10}{'CPU%':>8}")
+    for count in (int(value) for value in args.devices.split(',')):
+        result = run_step(count, args.interval, args.jitter, args.duration)
+        results.append(result)
+        print(f"{result['devices']:>6}{result['offered_per_sec']:>10}{result['received_per_sec']:>10}"
+              f"{result['lost']:>8}{result['latency_p50_ms']:>10}{result['latency_p99_ms']:>10}"
+              f"{result['latency_max_ms']:>10}{result['cpu_percent']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+二进制历史文件基准
+生成指定条数的 history.bin，然后在新进程中测量：打开文件、按时间切出一天的数据、
+对切片求均值的耗时，以及这些操作前后的常驻内存（RSS）。
+同时启动一个写入进程持续追加，检查读取方 tail 时看到的记录都是完整、连续的；
+最后检查作为 HistoryStore 派生导出时，并发写入、删除过期记录和清空之后 history.bin 与分段一致。
+用法：python benchmarks/bench_mmap.py [--records 10000000] [--keep path]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+
+from history_mmap import RECORD, MappedHistory, MappedHistoryWriter, check_store
+from history_store import HistoryStore
+
+START = 1.6e9
+INTERVAL = 2.0          # 读数间隔（秒），与固件一致
+
+
+def rss_mb():
+    """当前进程的常驻内存 (总量, 其中匿名内存)，单位 MB；映射文件的页属于可回收的页缓存，
+    只计入总量。不支持时返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return int(fields['VmRSS'].split()[0]) / 1024, int(fields['RssAnon'].split()[0]) / 1024
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def generate(path, count, chunk=5000000):
+    writer = MappedHistoryWriter(path)
+    writer.device_code("room2")
+    rng = np.random.default_rng(1)
+    for offset in range(0, count, chunk):
+        size = min(chunk, count - offset)
+        batch = np.empty(size, dtype=RECORD)
+        batch['ts'] = START + (np.arange(offset, offset + size)) * INTERVAL
+        batch['temperature'] = 23 + rng.normal(0, 1, size)
+        batch['humidity'] = 55 + rng.normal(0, 5, size)
+        batch['device'] = np.arange(offset, offset + size) % 2
+        batch['reserved'] = 0
+        writer.append_array(batch)
+    writer.close()
+
+
+def measure(path):
+    """在新进程中运行，输出各步骤耗时和 RSS"""
+    base = rss_mb()
+    start = time.perf_counter()
+    history = MappedHistory(path)
+    opened = time.perf_counter()
+    middle = float(history.records['ts'][len(history) // 2])
+    day = history.slice(middle, middle + 86400)
+    sliced = time.perf_counter()
+    mean = float(day['temperature'].mean())
+    reduced = time.perf_counter()
+    room2 = history.slice(middle, middle + 86400, device="room2")
+    filtered = time.perf_counter()
+    print(f"记录 {len(history)} 条，文件 {os.path.getsize(path) / 2 ** 30:.2f} GiB")
+    print(f"打开 {(opened - start) * 1000:.2f}ms，切出一天 {len(day)} 条 {(sliced - opened) * 1000:.3f}ms，"
+          f"求均值 {(reduced - sliced) * 1000:.3f}ms（{mean:.2f} °C），"
+          f"按设备筛选 {len(room2)} 条 {(filtered - reduced) * 1000:.3f}ms")
+    if base is not None:
+        total, anon = rss_mb()
+        print(f"RSS 增加 {total - base[0]:.1f} MB，其中匿名内存 {anon - base[1]:.1f} MB")
+
+
+def append_forever(path, seconds):
+    """写入进程：持续追加小批次"""
+    writer = MappedHistoryWriter(path)
+    deadline = time.monotonic() + seconds
+    sequence = writer.count
+    while time.monotonic() < deadline:
+        records = [(START + (sequence + i) * INTERVAL, 20.0, float((sequence + i) % 100), None)
+                   for i in range(7)]
+        writer.append_batch(records)
+        sequence += 7
+    writer.close()
+
+
+def check_tail(path, seconds=3.0):
+    """写入进程追加的同时 tail，检查时间戳连续、没有不完整的记录"""
+    history = MappedHistory(path)
+    position = len(history)
+    previous = float(history.records['ts'][-1]) if position else None
+    writer = subprocess.Popen([sys.executable, __file__, "--append", path, "--seconds", str(seconds)])
+    batches = seen = 0
+    while writer.poll() is None or history.refresh():
+        history.refresh()
+        new = history.records[position:]
+        position = len(history)
+        if len(new):
+            ts = new['ts']
+            steps = np.diff(np.concatenate(([previous], ts)) if previous is not None else ts)
+            assert np.all(steps == INTERVAL), "tail 看到了不连续的记录"
+            assert np.all(new['temperature'] == 20.0), "tail 看到了不完整的记录"
+            previous = float(ts[-1])
+            batches += 1
+            seen += len(new)
+        time.sleep(0.001)
+    print(f"tail: 写入进程追加期间读到 {batches} 批、{seen} 条，全部完整且连续")
+
+
+def check_derived(directory, threads=4, per_thread=20000):
+    """多个线程并发追加和刷新，期间删除过期记录、清空，检查 history.bin 与分段一致"""
+    import threading
+
+    path = os.path.join(directory, "history.bin")
+    store = HistoryStore(directory, flush_interval=0.01, batch_size=100,
+                         segment_max_bytes=256 * 1024, retention_days=1,
+                         mirror=MappedHistoryWriter(path))
+    now = time.time()
+
+    def produce(device, old):
+        for i in range(per_thread):
+            ts = now - 3 * 86400 + i if old else now + i * 0.001
+            store.append(ts, 20.0 + i % 50 / 10, 50.0 + device, f"dev{device}")
+            if not i % 1000:
+                store.flush()
+
+    def run(old):
+        workers = [threading.Thread(target=produce, args=(device, old)) for device in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        store.flush()
+
+    run(old=True)
+    store.clear()
+    run(old=True)
+    run(old=False)
+    store.compact()
+    store.close()
+    store.mirror.close()
+    compared, mismatched = check_store(directory, path)
+    assert compared == threads * per_thread and not mismatched, \
+        f"history.bin 与分段不一致：比较 {compared} 条，不一致 {mismatched} 条"
+    print(f"派生导出: 并发写入、删除过期记录和清空之后 {compared} 条记录与分段一致")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二进制历史文件基准")
+    parser.add_argument("--records", type=int, default=10000000, help="生成的记录条数")
+    parser.add_argument("--keep", help="生成到这个路径并保留（默认临时目录，结束后删除）")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--append", help=argparse.SUPPRESS)
+    parser.add_argument("--seconds", type=float, default=3.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure)
+        return
+    if args.append:
+        append_forever(args.append, args.seconds)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.keep or os.path.join(workdir, "history.bin")
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            generate(path, args.records)
+            print(f"生成 {args.records} 条用时 {time.perf_counter() - start:.1f}s")
+        subprocess.run([sys.executable, __file__, "--measure", path], check=True)
+        tail_path = os.path.join(workdir, "tail.bin")
+        generate(tail_path, 1000)
+        check_tail(tail_path)
+        derived = os.path.join(workdir, "derived")
+        os.makedirs(derived)
+        check_derived(derived)
+
+
+if __name__ == "__main__":
+    main()
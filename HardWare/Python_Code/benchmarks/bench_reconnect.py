@@ -0,0 +1,87 @@
+"""
+重连时间基准
+用 device_simulator 模拟一台设备，反复让它掉线一段时间（模拟 HC-05 超出范围），测量：
+  握手时间：从发送连接命令到收到 RESP:CONNECTED
+  发现时间：从掉线到 BluetoothMonitor 判定链路失效（data_timeout）
+  恢复时间：从链路恢复到重新连接成功（指数退避的等待加上握手）
+用法：python benchmarks/bench_reconnect.py [--drops 5] [--outage 3] [--data-timeout 2]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bluetooth_monitor import BluetoothMonitor
+from device_simulator import DeviceSimulator
+
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重连时间基准")
+    parser.add_argument("--drops", type=int, default=5, help="掉线次数")
+    parser.add_argument("--outage", type=float, default=3.0, help="每次掉线持续时间（秒）")
+    parser.add_argument("--interval", type=float, default=0.2, help="模拟设备的发送间隔（秒）")
+    parser.add_argument("--data-timeout", type=float, default=2.0, help="判定链路失效的无数据时间（秒）")
+    parser.add_argument("--reconnect-max", type=float, default=4.0, help="退避等待的上限（秒）")
+    args = parser.parse_args()
+
+    simulator = DeviceSimulator()
+    device = simulator.add_device(interval=args.interval)
+    simulator.start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_file = os.path.join(workdir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"history_dir": os.path.join(workdir, "history"),
+                       "port_cache_file": os.path.join(workdir, "port_cache.json"),
+                       "metrics_port": 0, "data_timeout": args.data_timeout,
+                       "reconnect_max": args.reconnect_max}, f)
+        monitor = BluetoothMonitor(config_file=config_file)
+
+        start = time.monotonic()
+        if not monitor.connect(device.port):
+            print("连接模拟设备失败")
+            return
+        print(f"首次连接 {time.monotonic() - start:.3f}s，"
+              f"握手 p50≤{monitor.handshake_seconds.quantile(0.5) * 1000:g}ms")
+
+        detect, recover = [], []
+        for drop in range(1, args.drops + 1):
+            time.sleep(0.5)
+            dropped_at = time.monotonic()
+            device.drop_link(args.outage)
+            if not wait_for(lambda: monitor.state != monitor.CONNECTED, args.data_timeout + 5):
+                print(f"第{drop}次: 未检测到掉线")
+                break
+            detect.append(time.monotonic() - dropped_at)
+            restored_at = dropped_at + args.outage
+            if not wait_for(lambda: monitor.state == monitor.CONNECTED, args.outage + args.reconnect_max + 10):
+                print(f"第{drop}次: 未能重新连接")
+                break
+            recover.append(time.monotonic() - restored_at)
+            print(f"第{drop}次: 发现 {detect[-1]:.2f}s，恢复后 {recover[-1]:.2f}s 重新连接，"
+                  f"断开共 {monitor.last_reconnect_seconds:.2f}s")
+
+        if recover:
+            print(f"发现时间 中位数 {statistics.median(detect):.2f}s，"
+                  f"恢复后重连 中位数 {statistics.median(recover):.2f}s / 最大 {max(recover):.2f}s")
+        monitor.close()
+    simulator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+滚动统计基准
+测量 RollingStats 每条读数的更新开销随窗口长度的变化（应基本不变），
+并与每次重新扫描窗口内全部读数的做法对比。
+用法：python benchmarks/bench_rolling.py [--records 200000] [--rate 10]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rolling_stats import RollingStats
+
+
+def make_readings(count, rate):
+    """rate 条/秒的随机游走读数"""
+    random.seed(1)
+    temperature, humidity = 23.0, 55.0
+    readings = []
+    for index in range(count):
+        temperature += random.gauss(0, 0.05)
+        humidity = min(max(humidity + random.gauss(0, 0.2), 1.0), 100.0)
+        readings.append((1.7e9 + index / rate, temperature, humidity))
+    return readings
+
+
+def bench_incremental(readings, window):
+    stats = RollingStats(windows=(window,))
+    start = time.perf_counter()
+    for timestamp, temperature, humidity in readings:
+        stats.add(timestamp, temperature, humidity, "bench")
+    elapsed = time.perf_counter() - start
+    return elapsed / len(readings) * 1e6, stats.get("bench")
+
+
+def bench_rescan(readings, window, count=2000):
+    """每条读数重新计算窗口内的均值、标准差和极值（只测最后 count 条）"""
+    times = [reading[0] for reading in readings]
+    start = time.perf_counter()
+    low = 0
+    for index in range(len(readings) - count, len(readings)):
+        while times[low] <= times[index] - window:
+            low += 1
+        values = [reading[1] for reading in readings[low:index + 1]]
+        mean = sum(values) / len(values)
+        sum((value - mean) ** 2 for value in values)
+        min(values), max(values)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def check(readings, window, result):
+    """与直接计算的结果比较"""
+    end = readings[-1][0]
+    values = [temperature for timestamp, temperature, _ in readings if timestamp > end - window]
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+    got = result['temperature']['windows'][window]
+    assert got['count'] == len(values), (got['count'], len(values))
+    assert abs(got['mean'] - mean) < 1e-9 and abs(got['std'] - std) < 1e-9, (got, mean, std)
+    assert got['min'] == min(values) and got['max'] == max(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="滚动统计基准")
+    parser.add_argument("--records", type=int, default=200000, help="读数条数")
+    parser.add_argument("--rate", type=float, default=10.0, help="每秒读数条数")
+    args = parser.parse_args()
+
+    readings = make_readings(args.records, args.rate)
+    print(f"{'窗口':>8} {'窗口内条数':>10} {'增量 us/条':>10} {'重新扫描 us/条':>14}")
+    for window in (10.0, 60.0, 600.0, 3600.0):
+        per_record, result = bench_incremental(readings, window)
+        check(readings, window, result)
+        rescan = bench_rescan(readings, window)
+        print(f"{window:>8g} {result['temperature']['windows'][window]['count']:>10} "
+              f"{per_record:>10.2f} {rescan:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
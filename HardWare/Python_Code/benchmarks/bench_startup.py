@@ -0,0 +1,115 @@
+"""
+启动时间基准
+每次在新的子进程中冷启动图形界面，测量：
+  首帧时间：从进程启动到主窗口第一次显示
+  首条读数时间：从进程启动到界面收到第一条传感器数据
+posix 下用 device_simulator 模拟一台设备，也可以用 --port 指定真实串口。
+用法：python benchmarks/bench_startup.py [--runs 5] [--history 记录数] [--port 串口]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+
+
+def run_child(workdir, t0, timeout):
+    """子进程：启动界面并记录首帧和首条读数的时间"""
+    os.chdir(workdir)
+    import main
+
+    # 连接成功的提示框会阻塞测量，这里直接跳过
+    main.messagebox.showinfo = lambda *args, **kwargs: None
+
+    app = main.EnvironmentalMonitorGUI()
+    results = {'import_and_init': time.time() - t0}
+
+    def on_map(event):
+        if event.widget is app.root and 'first_frame' not in results:
+            app.root.update_idletasks()
+            results['first_frame'] = time.time() - t0
+
+    def poll():
+        now = time.time() - t0
+        if app.current_data is not None and 'first_reading' not in results:
+            results['first_reading'] = now
+        if 'first_reading' in results or now > timeout:
+            print(json.dumps(results), flush=True)
+            app.on_closing()
+            return
+        app.root.after(5, poll)
+
+    app.root.bind('<Map>', on_map)
+    app.root.after(5, poll)
+    app.run()
+
+
+def prepare_workdir(workdir, port, history):
+    """写入测试用的配置文件，并预先生成历史数据"""
+    config = {"port": port, "auto_connect": True, "history_dir": "history"}
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f)
+
+    if history:
+        from history_store import HistoryStore
+        store = HistoryStore(os.path.join(workdir, "history"))
+        start = time.time() - history
+        for i in range(history):
+            store.append(start + i, 20 + (i % 100) * 0.1, 50.0)
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--history", type=int, default=100000, help="预先写入的历史记录条数")
+    parser.add_argument("--port", help="真实串口（默认使用伪终端模拟设备）")
+    parser.add_argument("--interval", type=float, default=0.1, help="模拟设备的发送间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--t0", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.t0, args.timeout)
+        return
+
+    port = args.port
+    if port is None:
+        if os.name != 'posix':
+            parser.error("非 posix 系统请用 --port 指定真实串口")
+        from device_simulator import DeviceSimulator
+        simulator = DeviceSimulator()
+        port = simulator.add_device(interval=args.interval).port
+        simulator.start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_workdir(workdir, port, args.history)
+        print(f"历史记录 {args.history} 条，串口 {port}")
+        print(f"{'次数':<6}{'初始化(s)':>12}{'首帧(s)':>12}{'首条读数(s)':>14}")
+
+        for run in range(1, args.runs + 1):
+            t0 = time.time()
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", workdir,
+                 "--t0", repr(t0), "--timeout", str(args.timeout)],
+                capture_output=True, text=True
+            )
+            lines = [line for line in output.stdout.splitlines() if line.startswith('{')]
+            if not lines:
+                print(f"第{run}次运行失败:\n{output.stderr.strip()}")
+                return
+            result = json.loads(lines[-1])
+            print(f"{run:<6}{result.get('import_and_init', float('nan')):>12.3f}"
+                  f"{result.get('first_frame', float('nan')):>12.3f}"
+                  f"{result.get('first_reading', float('nan')):>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+采集链路基准测试套件
+在合成的（或录制的）字节流上测量采集链路各环节的开销，结果输出为 JSON，便于不同版本之间对比：
+  framing      receive_data 分帧解析吞吐量（假串口按块返回字节）
+  process      _process_sensor_data 每条记录的开销
+  persistence  HistoryStore 追加和批量落盘每条记录的开销
+  handoff      data_queue 从采集线程到界面线程的交接延迟
+  gui          update_data 每帧、每条记录的界面更新开销（需要图形显示）
+指标名以 _per_sec 结尾的越大越好，其余（_us、_ms）越小越好。
+
+用法:
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --stream recorded.bin --only framing
+    python benchmarks/run_benchmarks.py --compare baseline.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+
+from bench_framer import chunks, make_stream
+from bluetooth_monitor import BluetoothMonitor
+from history_store import HistoryStore
+from line_framer import LineFramer
+
+
+METRIC_SUFFIXES = ("_per_sec", "_us", "_ms")
+
+
+class ReplaySerial:
+    """按固定块大小回放字节流的假串口，接口与 receive_data 用到的 pyserial 方法一致"""
+
+    def __init__(self, parts, monitor):
+        self.parts = parts
+        self.monitor = monitor
+        self.position = 0
+        self.current = b''
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return len(self.current)
+
+    def read(self, size=1):
+        if not self.current:
+            if self.position >= len(self.parts):
+                # 数据回放完毕，让接收线程退出
+                self.monitor.running = False
+                return b''
+            self.current = self.parts[self.position]
+            self.position += 1
+        data, self.current = self.current[:size], self.current[size:]
+        return data
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def cancel_read(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def make_monitor(workdir, **config):
+    """在临时目录中创建 BluetoothMonitor"""
+    config.setdefault("history_dir", os.path.join(workdir, "history"))
+    config_file = os.path.join(workdir, "config.json")
+    with open(config_file, "w") as f:
+        json.dump(config, f)
+    return BluetoothMonitor(config_file=config_file, history_capacity=config.get('history_capacity'))
+
+
+def best_of(repeat, func):
+    """多次运行取最短耗时"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_framing(workdir, stream, repeat):
+    """receive_data 的分帧解析吞吐量；解析出的记录只计数，不进入后续处理"""
+    monitor = make_monitor(workdir)
+    count = [0]
+
+    def on_data(temperature, humidity):
+        count[0] += 1
+
+    results = {}
+    for size in (64, 4096):
+        parts = chunks(stream, size)
+
+        def run():
+            count[0] = 0
+            monitor.framer = LineFramer(on_data, lambda response: None)
+            monitor.serial_port = ReplaySerial(parts, monitor)
+            monitor.running = monitor.is_connected = True
+            monitor.receive_data()
+
+        elapsed = best_of(repeat, run)
+        results[f"chunk{size}_lines_per_sec"] = round(monitor.framer.lines / elapsed)
+        results[f"chunk{size}_mb_per_sec"] = round(len(stream) / elapsed / 1e6, 2)
+    results['records'] = count[0]
+    monitor.is_connected = False
+    monitor.serial_port = None
+    monitor.close()
+    return results
+
+
+def bench_process(workdir, count, repeat):
+    """_process_sensor_data 每条记录的开销（环形缓冲区、队列、日志缓冲、汇总）"""
+    monitor = make_monitor(workdir, history_capacity=count * repeat + 1, flush_interval=3600.0)
+
+    def run():
+        for i in range(count):
+            monitor._process_sensor_data(20.0 + (i % 100) * 0.1, 50.0)
+        # 清空队列和日志缓冲，不计入下一轮
+        while monitor.get_latest_data() is not None:
+            pass
+        monitor.store._pending = []
+
+    elapsed = best_of(repeat, run)
+    monitor.close()
+    return {'per_record_us': round(elapsed / count * 1e6, 3),
+            'records_per_sec': round(count / elapsed)}
+
+
+def bench_persistence(workdir, count, repeat):
+    """HistoryStore 追加（编码）和批量落盘每条记录的开销"""
+    results = {}
+    for batch in (50, 1000):
+        store = HistoryStore(os.path.join(workdir, f"store_{batch}"), flush_interval=3600.0,
+                             batch_size=count + 1)
+        append_time = flush_time = 0.0
+        for _ in range(repeat):
+            now = time.time()
+            start = time.perf_counter()
+            for i in range(count):
+                store.append(now + i * 1e-3, 20.5, 50.5)
+            append_time += time.perf_counter() - start
+
+            # 按批量大小分批落盘
+            pending = store._pending
+            store._pending = []
+            start = time.perf_counter()
+            for offset in range(0, count, batch):
+                store._pending = pending[offset:offset + batch]
+                store.flush()
+            flush_time += time.perf_counter() - start
+        bytes_written = sum(os.path.getsize(os.path.join(store.directory, name))
+                            for name in store.list_segments())
+        store.close()
+        total = count * repeat
+        results['append_per_record_us'] = round(append_time / total * 1e6, 3)
+        results[f"flush_batch{batch}_per_record_us"] = round(flush_time / total * 1e6, 3)
+        results['bytes_per_record'] = round(bytes_written / total, 1)
+    return results
+
+
+def bench_handoff(workdir, count, frame_rate):
+    """采集线程放入 data_queue 到界面线程取出的延迟"""
+    monitor = make_monitor(workdir, flush_interval=3600.0)
+    results = {}
+
+    for mode in ("blocking", "frame"):
+        produced = []
+        received = []
+        done = threading.Event()
+
+        def consumer():
+            while len(received) < count:
+                if mode == "blocking":
+                    monitor.data_queue.get()
+                    received.append(time.perf_counter())
+                else:
+                    # 与 update_data 相同：每帧取出队列中的所有数据
+                    while True:
+                        data = monitor.get_latest_data()
+                        if data is None:
+                            break
+                        received.append(time.perf_counter())
+                    time.sleep(1.0 / frame_rate)
+            done.set()
+
+        thread = threading.Thread(target=consumer, daemon=True)
+        thread.start()
+        for i in range(count):
+            produced.append(time.perf_counter())
+            monitor._process_sensor_data(20.0, 50.0)
+            time.sleep(0.001)
+        done.wait(10)
+
+        latencies = sorted(r - p for p, r in zip(produced, received))
+        results[f"{mode}_p50_us"] = round(latencies[len(latencies) // 2] * 1e6, 1)
+        results[f"{mode}_p99_us"] = round(latencies[int(len(latencies) * 0.99)] * 1e6, 1)
+
+    monitor.close()
+    return results
+
+
+def bench_gui(workdir, frames, records_per_frame):
+    """update_data 的开销：每帧放入若干条记录后直接调用一次"""
+    import tkinter as tk
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        return {'skipped': f"没有图形显示: {e}"}
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import main
+        app = main.EnvironmentalMonitorGUI()
+        app.monitor.wait_history_loaded()
+        while app.chart is None:    # 等待延迟创建的曲线图
+            app.root.update()
+        app.running = False         # 不让 update_data 重新调度自身
+        app.root.update()
+
+        for _ in range(10):     # 预热
+            app.monitor._process_sensor_data(20.0, 50.0)
+        app.update_data()
+
+        elapsed = 0.0
+        for frame in range(frames):
+            for i in range(records_per_frame):
+                app.monitor._process_sensor_data(20.0 + (frame % 50) * 0.1, 50.0)
+            start = time.perf_counter()
+            app.running = True
+            app.update_data()
+            app.running = False
+            app.root.update_idletasks()
+            elapsed += time.perf_counter() - start
+        app.monitor.close()
+        app.root.destroy()
+    finally:
+        os.chdir(cwd)
+
+    return {'per_frame_ms': round(elapsed / frames * 1e3, 3),
+            'per_record_us': round(elapsed / (frames * records_per_frame) * 1e6, 1)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """与基线对比，返回退化的指标列表"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            if not metric.endswith(METRIC_SUFFIXES):
+                continue
+            old = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            ratio = value / old
+            higher_is_better = metric.endswith("_per_sec")
+            worse = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+            mark = "  <-- 退化" if worse else ""
+            print(f"{name}.{metric:<32} {old:>14} -> {value:>14}  ({ratio:.2f}x){mark}")
+            if worse:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集链路基准测试套件")
+    parser.add_argument("-o", "--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--stream", help="录制的原始字节流文件（默认使用合成数据）")
+    parser.add_argument("--lines", type=int, default=200000, help="合成数据的行数")
+    parser.add_argument("--records", type=int, default=50000, help="process/persistence 的记录数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="逗号分隔，只运行指定的基准")
+    parser.add_argument("--compare", help="与之前保存的结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="对比时允许的相对变化")
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream, 'rb') as f:
+            stream = f.read()
+    else:
+        stream = make_stream(args.lines)
+
+    benchmarks = {
+        'framing': lambda workdir: bench_framing(workdir, stream, args.repeat),
+        'process': lambda workdir: bench_process(workdir, args.records, args.repeat),
+        'persistence': lambda workdir: bench_persistence(workdir, args.records, args.repeat),
+        'handoff': lambda workdir: bench_handoff(workdir, 2000, 20),
+        'gui': lambda workdir: bench_gui(workdir, 200, 5),
+    }
+    selected = args.only.split(',') if args.only else list(benchmarks)
+
+    results = {}
+    for name in selected:
+        with tempfile.TemporaryDirectory() as workdir:
+            results[name] = benchmarks[name](workdir)
+        print(f"{name:<12} {json.dumps(results[name], ensure_ascii=False)}")
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'stream': args.stream or f"synthetic:{args.lines}",
+            'stream_bytes': len(stream)
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} 项指标退化超过 {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
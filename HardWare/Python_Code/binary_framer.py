@@ -0,0 +1,130 @@
+"""
+二进制分帧
+连接时发送 CONNECT,BIN，支持的固件回应 RESP:CONNECTED,BIN 后以固定长度的二进制帧发送读数：
+
+    字节  0      1     2-3            4-5            6
+         0xA5   序号   温度 int16     湿度 uint16    CRC-8
+                       (0.01 °C)      (0.01 %)       (多项式 0x07，覆盖字节 1-5)
+
+多字节字段为小端序。每条读数 7 字节，文本帧 D:23.4,56.7\\r\\n 为 13 字节。
+同步字节 0xA5 不会出现在 ASCII 文本中，所以响应行（RESP:...）和旧固件的文本数据
+可以和二进制帧混在同一个字节流里，BinaryFramer 把帧之间的字节交给 LineFramer 按行解析。
+序号每帧加 1（模 256），跳号时累计到 lost。
+"""
+
+import struct
+
+from line_framer import LineFramer
+
+SYNC = 0xA5
+FRAME = struct.Struct('<BBhHB')
+FRAME_SIZE = FRAME.size
+FRAME_BYTES = struct.Struct(f'{FRAME_SIZE}B')     # 解码时按字节解包，CRC 和数值都从字节计算
+TEMP_SCALE = 100.0
+HUM_SCALE = 100.0
+
+
+def _make_crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _make_crc8_table()
+
+
+def crc8(data):
+    """CRC-8（多项式 0x07，初值 0），与固件 BluetoothModule::crc8 一致"""
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_frame(sequence, temperature, humidity):
+    """按固件格式编码一帧（模拟设备和基准测试使用）"""
+    body = struct.pack('<BhH', sequence & 0xFF,
+                       round(temperature * TEMP_SCALE), round(humidity * HUM_SCALE))
+    return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+
+class BinaryFramer(LineFramer):
+    """二进制帧与文本行混合的分帧解析器，回调和统计与 LineFramer 相同"""
+
+    def __init__(self, on_data, on_response=None):
+        super().__init__(on_data, on_response)
+        self.frames = 0
+        self._pending = bytearray()     # 以同步字节开头、尚未收齐的帧
+        self._last_sequence = None
+
+    def feed(self, data):
+        """送入新到达的字节，解析其中所有完整的帧和行"""
+        self.bytes_received += len(data)
+
+        # 纯文本（旧固件或握手之前）直接走按行解析
+        if not self._pending and SYNC not in data:
+            self._feed_lines(data)
+            return
+
+        buffer = self._pending
+        buffer += data
+        size = len(buffer)
+        iter_unpack = FRAME_BYTES.iter_unpack
+        table = CRC8_TABLE
+        on_data = self.on_data
+        last = self._last_sequence
+        position = frames = malformed = lost = 0
+
+        while position < size:
+            start = buffer.find(SYNC, position)
+            if start < 0:
+                self._feed_lines(buffer[position:])
+                position = size
+                break
+            if start > position:
+                self._feed_lines(buffer[position:start])
+            end = start + (size - start) // FRAME_SIZE * FRAME_SIZE
+            if end == start:
+                position = start        # 帧不完整，等待后续字节
+                break
+
+            # 连续的帧一次解包；遇到不是同步字节的位置（帧之间的文本行）或校验失败时回到外层查找
+            position = start
+            for sync, sequence, t0, t1, h0, h1, check in iter_unpack(buffer[start:end]):
+                if sync != SYNC:
+                    break
+                if table[table[table[table[table[sequence] ^ t0] ^ t1] ^ h0] ^ h1] != check:
+                    # 校验失败：丢弃同步字节，从下一个字节重新同步
+                    malformed += 1
+                    position += 1
+                    break
+                if last is not None:
+                    lost += (sequence - last - 1) & 0xFF
+                last = sequence
+                frames += 1
+                position += FRAME_SIZE
+                temperature = t0 | t1 << 8
+                temperature -= (temperature & 0x8000) << 1      # int16 符号扩展
+                on_data(temperature / TEMP_SCALE, (h0 | h1 << 8) / HUM_SCALE)
+
+        del buffer[:position]
+        self._last_sequence = last
+        self.frames += frames
+        self.records += frames
+        self.malformed += malformed
+        self.lost += lost
+
+    def reset(self):
+        """丢弃未完成的行和帧，重新开始序号检测"""
+        super().reset()
+        self._pending.clear()
+        self._last_sequence = None
+
+    def stats(self):
+        stats = super().stats()
+        stats['frames'] = self.frames
+        return stats
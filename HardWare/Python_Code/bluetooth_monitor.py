@@ -0,0 +1,892 @@
+"""
+蓝牙串口数据采集
+负责串口连接、分帧解析、历史存储和汇总，不依赖任何界面模块，
+可以被图形界面（main.py）和无界面采集程序（collector.py）共用。
+"""
+
+import serial
+import threading
+import random
+import time
+import json
+import os
+from array import array
+from datetime import datetime
+from queue import Empty
+
+from alerts import AlertEngine, AlertLog, WebhookSink
+from binary_framer import BinaryFramer
+from command_channel import CommandChannel
+from device_manager import DeviceManager
+from history_buffer import HistoryRingBuffer, HistoryView
+from history_mmap import MappedHistory, MappedHistoryWriter
+from history_store import HistoryStore
+from line_framer import LineFramer
+from metrics import MetricsRegistry, MetricsServer
+from port_registry import PortRegistry
+from record_queue import BoundedRecordQueue
+from rolling_stats import RollingStats
+from rollups import RollupTiers
+
+
+class BluetoothMonitor:
+    DEFAULT_DEVICE = "default"
+
+    # 单串口连接的状态
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"           # 串口已打开，等待握手回应
+    CONNECTED = "connected"
+    RECONNECTING = "reconnecting"       # 链路失效，按退避间隔自动重连
+
+    def __init__(self, config_file="config.json", history_capacity=None, background_load=False):
+        self.serial_port = None
+        self.is_connected = False
+        self.state = self.DISCONNECTED
+        self.last_reconnect_seconds = None
+        self._link_lock = threading.RLock()
+        self._handshake = threading.Event()
+        self._reconnect_stop = threading.Event()
+        self._reconnect_thread = None
+        self.running = False
+        self.receive_thread = None
+        self.config_file = config_file
+        self.history_file = "history.json"
+        self.config = self.load_config()
+        self.commands = CommandChannel(self._write_serial, self.config['command_timeout'],
+                                       self.config['command_window'])
+        self.framer = self.create_framer()
+        self.data_queue = self.create_data_queue()
+        # 无界面采集时可以只在内存中保留少量最近记录
+        if history_capacity is not None:
+            self.config['history_capacity'] = history_capacity
+        # 设备ID与环形缓冲区中设备编号的对应关系，编号0为单串口连接
+        self.device_ids = [self.DEFAULT_DEVICE]
+        self._device_codes = {self.DEFAULT_DEVICE: 0}
+        self._device_lock = threading.Lock()
+        self.mapped_history = self.create_mapped_history()
+        self.store = HistoryStore(
+            directory=self.config['history_dir'],
+            flush_interval=self.config['flush_interval'],
+            segment_max_bytes=self.config['segment_max_bytes'],
+            retention_days=self.config['retention_days'],
+            compact_interval=self.config['compact_interval'],
+            mirror=self.mapped_history
+        )
+        self.devices = DeviceManager(self)
+        self.alerts = self.create_alert_engine()
+        self.rolling = RollingStats(self.config['stats_windows'], self.config['stats_ewma_tau'])
+        self.port_registry = PortRegistry(self.config['port_cache_file'], self.config['port_watch_interval'])
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        self._setup_metrics()
+
+        # 历史回放和汇总层加载可能需要数秒，background_load 为 True 时在后台线程中进行，
+        # 加载完成前到达的记录先暂存，完成后再按顺序补入环形缓冲区和汇总层
+        self.history = HistoryRingBuffer(self.config['history_capacity'])
+        self.rollups = None
+        self.history_loaded = threading.Event()
+        self._history_lock = threading.Lock()
+        self._early_records = []
+        self._load_cancel = threading.Event()       # 清空历史或关闭时中止回放
+        self._load_thread = None
+        if background_load:
+            self._load_thread = threading.Thread(target=self.load_history, daemon=True)
+            self._load_thread.start()
+        else:
+            self.load_history()
+
+    def load_config(self):
+        """加载配置文件"""
+        default_config = {
+            "port": "COM10",
+            "baudrate": 9600,
+            "temp_min": 18.0,
+            "temp_max": 30.0,
+            "hum_min": 30.0,
+            "hum_max": 80.0,
+            "auto_connect": False,
+            "history_dir": "history",
+            "flush_interval": 5.0,
+            "segment_max_bytes": 4 * 1024 * 1024,
+            "retention_days": 180,
+            "compact_interval": 3600.0,
+            "history_capacity": 1000000,
+            "devices": [],
+            "read_batch_window": 0.0,
+            "ui_frame_rate": 20,
+            "chart_window": 600.0,
+            "chart_max_points": 2000,
+            "metrics_port": 9108,
+            "binary_framing": False,
+            "queue_maxsize": 10000,
+            "queue_policy": "drop_oldest",
+            "queue_put_timeout": 0.1,
+            "port_cache_file": "port_cache.json",
+            "port_watch_interval": 2.0,
+            "handshake_timeout": 3.0,
+            "handshake_retry": 0.5,
+            "data_timeout": 10.0,
+            "auto_reconnect": True,
+            "reconnect_initial": 0.5,
+            "reconnect_max": 30.0,
+            "command_timeout": 2.0,
+            "command_window": 64,
+            "alert_min_duration": 5.0,
+            "alert_temp_hysteresis": 0.5,
+            "alert_hum_hysteresis": 2.0,
+            "alert_temp_rate": 2.0,
+            "alert_hum_rate": 10.0,
+            "alert_rate_window": 60.0,
+            "alert_interval": 0.5,
+            "alert_log": True,
+            "alert_webhook": "",
+            "stats_windows": [60.0, 600.0],
+            "stats_ewma_tau": 30.0,
+            "history_mmap": True
+        }
+
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+                    # 更新默认配置
+                    for key in default_config:
+                        if key in config:
+                            default_config[key] = config[key]
+            except:
+                pass
+        return default_config
+
+    def create_data_queue(self):
+        """按配置创建采集线程到界面的有界交接队列，配置无效时使用默认策略"""
+        try:
+            return BoundedRecordQueue(self.config['queue_maxsize'], self.config['queue_policy'],
+                                      self.config['queue_put_timeout'])
+        except ValueError as e:
+            print(f"数据队列配置无效: {e}")
+            return BoundedRecordQueue()
+
+    def mapped_history_path(self):
+        return os.path.join(self.config['history_dir'], "history.bin")
+
+    def create_mapped_history(self):
+        """配置了 history_mmap 时打开定长二进制历史文件（分段的派生导出）的写入方，文件格式不兼容时不写入"""
+        if not self.config['history_mmap']:
+            return None
+        os.makedirs(self.config['history_dir'], exist_ok=True)
+        try:
+            return MappedHistoryWriter(self.mapped_history_path())
+        except (OSError, ValueError) as e:
+            print(f"打开二进制历史文件失败: {e}")
+            return None
+
+    def open_mapped_history(self):
+        """以内存映射方式只读打开二进制历史文件（MappedHistory），没有启用时返回 None"""
+        if self.mapped_history is None:
+            return None
+        self.store.flush()
+        return MappedHistory(self.mapped_history_path())
+
+    def create_alert_engine(self):
+        """按配置创建报警引擎，报警事件写入历史目录下的 alerts.jsonl，配置了 alert_webhook 时同时 POST 到该地址"""
+        config = self.config
+        engine = AlertEngine(
+            self.get_thresholds,
+            hysteresis={'temperature': config['alert_temp_hysteresis'],
+                        'humidity': config['alert_hum_hysteresis']},
+            min_duration=config['alert_min_duration'],
+            rates={'temperature': config['alert_temp_rate'], 'humidity': config['alert_hum_rate']},
+            rate_window=config['alert_rate_window'],
+            interval=config['alert_interval']
+        )
+        if config['alert_log']:
+            os.makedirs(config['history_dir'], exist_ok=True)
+            engine.listeners.append(AlertLog(os.path.join(config['history_dir'], "alerts.jsonl")))
+        self.alert_webhook = None
+        if config['alert_webhook']:
+            self.alert_webhook = WebhookSink(config['alert_webhook'])
+            engine.listeners.append(self.alert_webhook)
+        return engine
+
+    def _setup_metrics(self):
+        """注册运行指标"""
+        metrics = self.metrics
+        self.connects_total = metrics.counter("connects_total", "成功建立串口连接的次数")
+        self.reconnects_total = metrics.counter("reconnects_total", "链路失效后自动重新连接成功的次数")
+        self.link_drops_total = metrics.counter("link_drops_total", "检测到链路失效（读取错误或长时间无数据）的次数")
+        self.connect_failures_total = metrics.counter("connect_failures_total", "串口连接失败的次数")
+        self.receive_errors_total = metrics.counter("receive_errors_total", "接收线程读取错误的次数")
+        self.send_errors_total = metrics.counter("send_errors_total", "发送命令失败的次数")
+        self.device_errors_total = metrics.counter("device_errors_total", "多设备读取错误的次数")
+        self.records_persisted_total = metrics.counter("records_persisted_total", "已写入历史日志的记录数")
+        self.flush_duration = metrics.histogram("flush_duration_seconds", "历史日志每批落盘的耗时")
+        self.display_latency = metrics.histogram("display_latency_seconds", "数据到达到界面显示的延迟")
+        self.handshake_seconds = metrics.histogram("handshake_seconds", "从发送连接命令到收到设备回应的耗时")
+        self.reconnect_seconds = metrics.histogram(
+            "reconnect_seconds", "链路失效到重新连接成功的耗时",
+            buckets=(0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+        self.command_rtt = metrics.histogram("command_rtt_seconds", "命令从写入串口到收到回应的耗时")
+
+        # 热路径计数直接读取各分帧解析器已有的计数器
+        for name, key, help_text in (
+                ("bytes_received_total", 'bytes_received', "从串口读取的字节数"),
+                ("lines_total", 'lines', "收到的完整行数"),
+                ("records_parsed_total", 'records', "解析成功的数据记录数"),
+                ("parse_failures_total", 'malformed', "格式错误、解析失败的数据行数"),
+                ("unknown_lines_total", 'unknown', "无法识别的行数"),
+                ("lost_frames_total", 'lost', "按序号检测到的丢失帧数（二进制分帧）")):
+            metrics.collector(name, 'counter', help_text,
+                              lambda key=key: [({'device': device_id}, framer.stats()[key])
+                                               for device_id, framer in self._framers()])
+
+        metrics.gauge("data_queue_depth", "等待界面取出的记录数", lambda: self.data_queue.qsize())
+        metrics.collector("data_queue_dropped_total", 'counter', "数据队列满时丢弃的记录数",
+                          lambda: self.data_queue.dropped)
+        metrics.collector("data_queue_coalesced_total", 'counter', "被同一设备新记录覆盖的记录数",
+                          lambda: self.data_queue.coalesced)
+        commands = self.commands
+        metrics.collector("commands_sent_total", 'counter', "已写入串口的命令数", lambda: commands.sent)
+        metrics.collector("command_batches_total", 'counter', "命令写入次数（多条排队命令合并为一次）",
+                          lambda: commands.batches)
+        metrics.collector("command_timeouts_total", 'counter', "超时没有回应的命令数", lambda: commands.timeouts)
+        metrics.gauge("commands_in_flight", "已发送、等待回应的命令数", commands.in_flight)
+        commands.on_reply = self.command_rtt.observe
+
+        def on_send_error(error):
+            self.send_errors_total.inc()
+            print(f"发送命令失败: {error}")
+        commands.on_error = on_send_error
+
+        alerts = self.alerts
+        metrics.collector("alerts_raised_total", 'counter', "产生的报警数", lambda: alerts.raised)
+        metrics.gauge("alerts_active", "当前未解除的报警数", lambda: len(alerts.active))
+        metrics.gauge("alert_batch_seconds", "最近一批报警检查的耗时", lambda: alerts.eval_seconds)
+
+        metrics.gauge("history_records", "内存环形缓冲区中的记录数", lambda: len(self.history))
+        metrics.gauge("connected_devices", "当前连接的设备数",
+                      lambda: len(self.devices.links) + int(self.is_connected))
+        metrics.gauge("uptime_seconds", "运行时间", lambda: round(time.time() - metrics.started, 1))
+
+        def on_flush(duration, count):
+            self.flush_duration.observe(duration)
+            self.records_persisted_total.inc(count)
+        self.store.on_flush = on_flush
+
+    def _framers(self):
+        """所有连接的 (设备ID, 分帧解析器)"""
+        yield self.DEFAULT_DEVICE, self.framer
+        for device_id, link in list(self.devices.links.items()):
+            yield device_id, link.framer
+
+    def start_metrics_server(self):
+        """在 config.json 指定的本机端口上提供 /metrics，端口为0时不启动"""
+        port = self.config['metrics_port']
+        if not port or self.metrics_server is not None:
+            return False
+        try:
+            server = MetricsServer(self.metrics, port)
+            server.start()
+        except OSError as e:
+            print(f"指标服务启动失败（端口 {port}）: {e}")
+            return False
+        self.metrics_server = server
+        return True
+
+    def save_config(self):
+        """保存配置文件"""
+        with open(self.config_file, 'w') as f:
+            json.dump(self.config, f, indent=2)
+
+    def load_history(self):
+        """加载历史数据（回放追加日志分段）"""
+        # 加载开始之后写入日志的记录在 _early_records 中，回放时跳过
+        cutoff = time.time()
+        discard_rollups = False
+        try:
+            self._migrate_legacy_history()
+            rollups = RollupTiers(directory=self.config['history_dir'],
+                                  minute_retention_days=self.config['retention_days'])
+
+            # 内存中只保留最近的记录，完整历史保存在分段文件中
+            capacity = self.config['history_capacity']
+            history = self.history
+
+            # 还没有汇总数据时（首次运行）回放全部历史来建立汇总层，
+            # 否则只把汇总层最后一个分钟桶之后的记录补进去
+            rebuild = rollups.resume_time() is None
+            records = self.store.replay() if rebuild else self.store.replay(limit=capacity)
+            resume = {}
+            cancel = self._load_cancel
+            for index, (timestamp, temperature, humidity, device_id) in enumerate(records):
+                if not index & 0xFFF and cancel.is_set():
+                    # 重建到一半的汇总层不完整，删除后下次启动重新建立
+                    discard_rollups = rebuild
+                    break
+                if timestamp >= cutoff:
+                    continue
+                history.append(timestamp, temperature, humidity, self.device_code(device_id))
+                if not rebuild:
+                    if device_id not in resume:
+                        resume[device_id] = rollups.resume_time(device_id)
+                    if timestamp < resume[device_id]:
+                        continue
+                rollups.add(timestamp, temperature, humidity, device_id)
+        except Exception as e:
+            print(f"加载历史数据失败: {e}")
+            rollups = RollupTiers(directory=self.config['history_dir'],
+                                  minute_retention_days=self.config['retention_days'])
+
+        with self._history_lock:
+            for timestamp, temperature, humidity, device_id in self._early_records:
+                self.history.append(timestamp, temperature, humidity, self.device_code(device_id))
+                rollups.add(timestamp, temperature, humidity, device_id)
+            if discard_rollups:
+                rollups.clear()
+            self._early_records = None
+            self.rollups = rollups
+        self.history_loaded.set()
+
+    def wait_history_loaded(self, timeout=None):
+        """等待后台历史加载完成"""
+        return self.history_loaded.wait(timeout)
+
+    def _migrate_legacy_history(self):
+        """把旧版 history.json 导入追加日志"""
+        if not os.path.exists(self.history_file) or not self.store.is_empty():
+            return
+        try:
+            with open(self.history_file, 'r') as f:
+                legacy = json.load(f)
+            for record in legacy:
+                timestamp = datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S').timestamp()
+                self.store.append(timestamp, record['temperature'], record['humidity'])
+            self.store.flush()
+            os.replace(self.history_file, self.history_file + ".migrated")
+        except Exception as e:
+            print(f"导入旧历史数据失败: {e}")
+
+    def save_history(self):
+        """保存历史数据（把缓冲中的记录追加到日志）"""
+        self.store.flush()
+
+    def clear_history(self):
+        """清空内存和磁盘上的历史数据；后台加载尚未完成时先中止回放（界面应在后台线程中调用）"""
+        self._load_cancel.set()
+        self.wait_history_loaded()
+        self.history.clear()
+        self.store.clear()
+        self.rollups.clear()
+
+    def device_code(self, device_id):
+        """设备ID对应的环形缓冲区编号"""
+        if device_id is None:
+            return 0
+        code = self._device_codes.get(device_id)
+        if code is None:
+            # 接收线程、多设备读线程和历史加载线程都可能遇到新设备，分配编号时加锁
+            with self._device_lock:
+                code = self._device_codes.get(device_id)
+                if code is None:
+                    code = len(self.device_ids)
+                    self.device_ids.append(device_id)
+                    self._device_codes[device_id] = code
+        return code
+
+    def _make_record(self, timestamp, temperature, humidity, device_id=None):
+        return {
+            'timestamp': datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+            'temperature': temperature,
+            'humidity': humidity,
+            'device': device_id or self.DEFAULT_DEVICE,
+            'received_at': timestamp
+        }
+
+    def get_available_ports(self):
+        """获取可用串口列表（热插拔监视线程运行时直接返回其结果）"""
+        return self.port_registry.available_ports()
+
+    def resolve_port(self, port, baudrate=None):
+        """用串口缓存确定实际串口和波特率：已知设备换了串口名时使用新串口，
+        未指定波特率时使用上次成功的波特率，不需要重新探测"""
+        resolved, entry = self.port_registry.resolve(port)
+        if resolved != port:
+            print(f"设备已从 {port} 移到 {resolved}")
+        if baudrate is None:
+            baudrate = entry.get('baudrate') if entry else None
+        return resolved, baudrate or self.config['baudrate']
+
+    def connect(self, port=None, baudrate=None):
+        """连接蓝牙设备：打开串口并完成握手，收到设备回应即返回"""
+        if self.state != self.DISCONNECTED:
+            self.disconnect()
+
+        port, baudrate = self.resolve_port(port or self.config['port'], baudrate)
+        with self._link_lock:
+            if not self._open_link(port, baudrate):
+                self.connect_failures_total.inc()
+                return False
+
+        # 更新配置和串口缓存
+        self.config['port'] = port
+        self.config['baudrate'] = baudrate
+        self.save_config()
+        self.port_registry.remember(port, baudrate=baudrate)
+        return True
+
+    def _open_link(self, port, baudrate, abort=None):
+        """打开串口、启动接收线程并握手，成功后进入 connected 状态；abort 被设置时提前放弃握手"""
+        self.state = self.CONNECTING
+        try:
+            self.serial_port = serial.Serial(
+                port=port,
+                baudrate=baudrate,
+                # 阻塞读，由 cancel_read() 在断开时唤醒；超过 data_timeout 没有任何数据视为链路失效
+                timeout=self.config['data_timeout'] or None,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                bytesize=serial.EIGHTBITS
+            )
+            # 清空缓冲区
+            self.serial_port.reset_input_buffer()
+            self.serial_port.reset_output_buffer()
+        except Exception as e:
+            print(f"连接失败: {e}")
+            self.state = self.DISCONNECTED
+            return False
+
+        # 先启动接收线程再发送连接命令，回应一到就能处理
+        self._handshake.clear()
+        self.running = True
+        self.receive_thread = threading.Thread(target=self.receive_data, daemon=True)
+        self.receive_thread.start()
+        self.commands.start()
+
+        # 收到 RESP:READY 或 RESP:CONNECTED 即完成握手；蓝牙链路刚建立时命令可能丢失，
+        # 没有回应时按 handshake_retry 间隔重发，直到 handshake_timeout
+        started = time.monotonic()
+        deadline = started + self.config['handshake_timeout']
+        attempt = None
+        while True:
+            # 请求二进制分帧时旧固件仍回应 CONNECTED 并继续发送文本；
+            # 重发前取消上一条，丢失的命令不再占用发送窗口
+            if attempt is not None:
+                attempt.cancel()
+            attempt = self.send_command(self.connect_command())
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._handshake.wait(min(self.config['handshake_retry'], remaining)):
+                break
+            if abort is not None and abort.is_set():
+                break
+        if not self._handshake.is_set():
+            if abort is None or not abort.is_set():
+                print(f"连接失败: {port} 在 {self.config['handshake_timeout']}s 内没有回应")
+            attempt.cancel()
+            self._close_link()
+            self.state = self.DISCONNECTED
+            return False
+
+        self.handshake_seconds.observe(time.monotonic() - started)
+        self.is_connected = True
+        self.state = self.CONNECTED
+        self.connects_total.inc()
+        return True
+
+    def _close_link(self):
+        """停止发送线程和接收线程并关闭串口"""
+        self.running = False
+        self.is_connected = False
+        self.commands.stop()
+
+        # 唤醒阻塞在 read() 上的接收线程并等待其退出
+        if self.serial_port and self.serial_port.is_open:
+            self.serial_port.cancel_read()
+        if self.receive_thread and self.receive_thread is not threading.current_thread():
+            self.receive_thread.join(timeout=1)
+
+        if self.serial_port and self.serial_port.is_open:
+            self.serial_port.close()
+
+    def disconnect(self):
+        """断开连接，同时停止自动重连"""
+        self._reconnect_stop.set()
+        if self._reconnect_thread and self._reconnect_thread is not threading.current_thread():
+            self._reconnect_thread.join(timeout=self.config['handshake_timeout'] + 1)
+
+        with self._link_lock:
+            if self.is_connected:
+                # 等待设备确认断开，最多 0.3 秒
+                try:
+                    self.send_command("DISCONNECT", timeout=0.3).result(timeout=1)
+                except Exception:
+                    pass
+            self._close_link()
+            self.state = self.DISCONNECTED
+
+    def _link_lost(self, reason):
+        """接收线程发现链路失效（读取错误或长时间没有数据）：关闭串口并在后台重连"""
+        if not self.running or self.state != self.CONNECTED:
+            return          # 主动断开；握手阶段的失败由 _open_link 按超时处理
+        print(f"连接已断开: {reason}")
+        self.link_drops_total.inc()
+        self.running = False
+        self.is_connected = False
+        self.commands.stop(f"连接已断开: {reason}")
+        try:
+            self.serial_port.close()
+        except Exception:
+            pass
+
+        if not self.config['auto_reconnect']:
+            self.state = self.DISCONNECTED
+            return
+        self._start_reconnect(self.config['port'], self.config['baudrate'])
+
+    def connect_in_background(self, port=None, baudrate=None):
+        """首次连接失败后在后台按退避间隔继续尝试，直到成功或 disconnect()（无人值守运行时使用）"""
+        port, baudrate = self.resolve_port(port or self.config['port'], baudrate)
+        self._start_reconnect(port, baudrate, initial=True)
+
+    def _start_reconnect(self, port, baudrate, initial=False):
+        self.state = self.RECONNECTING
+        self._reconnect_stop.clear()
+        self._reconnect_thread = threading.Thread(
+            target=self._reconnect_loop, args=(port, baudrate, initial), daemon=True)
+        self._reconnect_thread.start()
+
+    def backoff_delay(self, attempt):
+        """第 attempt 次重连前的等待：指数增长到 reconnect_max，取后一半随机抖动，避免多端同时重试"""
+        delay = min(self.config['reconnect_initial'] * 2 ** attempt, self.config['reconnect_max'])
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _reconnect_loop(self, port, baudrate, initial=False):
+        """按指数退避重连，直到成功或 disconnect() 被调用；initial 为 True 时是首次连接，不计入重连"""
+        lost_at = time.monotonic()
+        attempt = 0
+        while True:
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            if self._reconnect_stop.wait(delay):
+                return
+            with self._link_lock:
+                if self._reconnect_stop.is_set():
+                    return
+                # 适配器重新枚举后串口名可能变化
+                current_port, _ = self.resolve_port(port, baudrate)
+                if self._open_link(current_port, baudrate, abort=self._reconnect_stop):
+                    self.config['port'] = current_port
+                    if initial:
+                        print(f"已连接 {current_port}（第{attempt}次尝试）")
+                        return
+                    elapsed = time.monotonic() - lost_at
+                    self.last_reconnect_seconds = elapsed
+                    self.reconnect_seconds.observe(elapsed)
+                    self.reconnects_total.inc()
+                    print(f"已重新连接 {current_port}（第{attempt}次尝试，断开 {elapsed:.2f}s）")
+                    return
+                self.state = self.RECONNECTING
+            print(f"重连失败（第{attempt}次），{self.backoff_delay(attempt):.1f}s 左右后重试")
+
+    def connect_devices(self):
+        """打开 config.json 中配置的所有设备"""
+        return self.devices.open_all()
+
+    def close(self):
+        """断开所有连接并关闭历史存储"""
+        self.disconnect()
+        self.devices.close()
+        self.port_registry.stop()
+        if self._load_thread is not None:
+            self._load_cancel.set()
+            self._load_thread.join(timeout=5)
+        self.alerts.close()
+        if self.alert_webhook is not None:
+            self.alert_webhook.close()
+        self.store.close()
+        if self.mapped_history is not None:
+            self.mapped_history.close()
+        if self.rollups is not None:
+            self.rollups.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def send_command(self, command, timeout=None):
+        """发送命令到Arduino：放入发送队列后立即返回 Future，
+        收到对应的 RESP 回应（GET_DATA 为下一条读数）时完成，超时得到 TimeoutError"""
+        return self.commands.submit(command, timeout)
+
+    def _write_serial(self, data):
+        """命令发送线程写入串口"""
+        self.serial_port.write(data)
+        self.serial_port.flush()  # 确保数据立即发送
+
+    def receive_data(self):
+        """接收数据线程 - 事件驱动，链路空闲时阻塞等待不占用CPU"""
+        self.framer.reset()
+        # 大于0时收到首个字节后再等待一小段时间，以延迟换取批量读取
+        batch_window = self.config['read_batch_window']
+        data_timeout = self.config['data_timeout']
+        last_data = time.monotonic()
+        while self.running:
+            try:
+                # 阻塞直到有字节到达；cancel_read() 或超过 data_timeout 会让 read 返回空
+                raw_data = self.serial_port.read(1)
+                if not raw_data:
+                    if not self.running:
+                        break
+                    if data_timeout and time.monotonic() - last_data >= data_timeout:
+                        self._link_lost(f"{data_timeout}s 内没有收到数据")
+                        break
+                    continue
+                last_data = time.monotonic()
+                if batch_window > 0:
+                    time.sleep(batch_window)
+
+                # 读取所有可用数据
+                waiting = self.serial_port.in_waiting
+                if waiting:
+                    raw_data += self.serial_port.read(waiting)
+
+                # 增量分帧并解析完整的行
+                self.framer.feed(raw_data)
+
+            except Exception as e:
+                self.receive_errors_total.inc()
+                print(f"接收数据错误: {e}")
+                self._link_lost(str(e))
+                break
+
+    def create_framer(self, device_id=None, publish=None, on_response=None):
+        """创建绑定到设备的分帧解析器，device_id 为空表示单串口连接；
+        publish 替代 data_queue.put 接收记录，on_response 替代默认的响应输出"""
+        def on_data(temperature, humidity):
+            self._process_sensor_data(temperature, humidity, device_id, publish)
+
+        if on_response is None:
+            def on_response(response):
+                # 单串口连接的回应先交给等待它的命令，没有命令认领时输出
+                if device_id is not None or not self.commands.resolve(response):
+                    print(f"设备响应{f' [{device_id}]' if device_id else ''}: {response}")
+                if response.startswith("CONNECTED"):
+                    self._remember_protocol(device_id, response)
+                if device_id is None:
+                    self._on_link_response(response)
+
+        if self.config['binary_framing']:
+            return BinaryFramer(on_data, on_response)
+        return LineFramer(on_data, on_response)
+
+    def _on_link_response(self, response):
+        """单串口连接的握手"""
+        if response == "READY" or response.startswith("CONNECTED"):
+            if response == "READY" and self.state == self.CONNECTED:
+                # 设备在连接期间重启，重新发送连接命令恢复连接状态和协议
+                self.send_command(self.connect_command())
+            self._handshake.set()
+
+    def _remember_protocol(self, device_id, response):
+        """根据连接回应记录设备实际使用的协议"""
+        if device_id is None:
+            port = self.config['port']
+        else:
+            link = self.devices.links.get(device_id)
+            if link is None:
+                return
+            port = link.port
+        self.port_registry.remember(port, protocol="binary" if response.endswith(",BIN") else "text")
+
+    def connect_command(self):
+        """连接命令，配置了 binary_framing 时请求二进制分帧"""
+        return "CONNECT,BIN" if self.config['binary_framing'] else "CONNECT"
+
+    def _process_sensor_data(self, temperature, humidity, device_id=None, publish=None):
+        """处理传感器数据"""
+        # 创建数据记录
+        timestamp = time.time()
+        record = self._make_record(timestamp, temperature, humidity, device_id)
+
+        with self._history_lock:
+            if self._early_records is not None:
+                # 历史还在加载，等加载完成后再补入环形缓冲区和汇总层
+                self._early_records.append((timestamp, temperature, humidity, device_id))
+            else:
+                # 添加到历史环形缓冲区
+                self.history.append(timestamp, temperature, humidity, self.device_code(device_id))
+
+                # 增量更新分钟/小时/天汇总
+                self.rollups.add(timestamp, temperature, humidity, device_id)
+
+        # 报警检查由报警线程整批进行，这里只追加
+        self.alerts.add(timestamp, temperature, humidity, record['device'])
+
+        # 增量更新滚动统计，每条读数常数时间
+        self.rolling.add(timestamp, temperature, humidity, record['device'])
+
+        # 等待读数的 GET_DATA 命令
+        if device_id is None:
+            self.commands.resolve_data(record)
+
+        # 放入有界队列供GUI使用（所有设备汇入同一队列，满时按 queue_policy 处理）
+        if publish is None:
+            self.data_queue.put(record)
+        else:
+            publish(record)
+
+        # 追加到历史日志，由后台线程按刷新间隔批量写盘
+        self.store.append(timestamp, temperature, humidity, device_id)
+
+    def get_latest_data(self):
+        """获取最新数据"""
+        try:
+            return self.data_queue.get_nowait()
+        except Empty:
+            return None
+
+    def get_pending_data(self):
+        """一次取出队列中的所有数据"""
+        return self.data_queue.drain()
+
+    def set_thresholds(self, temp_min, temp_max, hum_min, hum_max):
+        """设置阈值"""
+        self.config['temp_min'] = temp_min
+        self.config['temp_max'] = temp_max
+        self.config['hum_min'] = hum_min
+        self.config['hum_max'] = hum_max
+
+        # 发送到设备
+        command = f"SET_THRESHOLD,{temp_min},{temp_max},{hum_min},{hum_max}"
+        future = self.send_command(command)
+
+        # 保存配置
+        self.save_config()
+        return future
+
+    def toggle_threshold(self):
+        """切换设备上的阈值报警开关，返回命令的 Future"""
+        return self.send_command("TOGGLE_THRESHOLD")
+
+    def request_data(self):
+        """请求数据，返回命令的 Future，完成时得到设备的下一条读数"""
+        return self.send_command("GET_DATA")
+
+    def iter_range(self, start, end, device_id=None):
+        """逐条返回时间范围内的记录 (timestamp, temperature, humidity, device_id)
+
+        直接流式读取磁盘上的历史分段，内存占用与范围大小无关；
+        device_id 为空时返回所有设备。
+        """
+        devices = None
+        if device_id is not None:
+            devices = {None if device_id == self.DEFAULT_DEVICE else device_id}
+        for timestamp, temperature, humidity, device in self.store.iter_range(start, end, devices):
+            yield timestamp, temperature, humidity, device or self.DEFAULT_DEVICE
+
+    def query_range(self, start, end, device_id=None):
+        """按时间范围查询，返回列视图（HistoryView）
+
+        历史加载完成且范围在内存环形缓冲区内时直接二分返回零拷贝视图，否则从磁盘分段读取。
+        """
+        if self.history_loaded.is_set() and self.history.covers(start):
+            view = self.history.range(start, end)
+            if device_id is None:
+                return view
+            code = self.device_code(device_id)
+            records = ((ts, t, h, d) for ts, t, h, d in
+                       zip(view.timestamps, view.temperatures, view.humidities, view.devices)
+                       if d == code)
+        else:
+            records = ((ts, t, h, self.device_code(d))
+                       for ts, t, h, d in self.iter_range(start, end, device_id))
+
+        timestamps, temperatures, humidities, devices = array('d'), array('f'), array('f'), array('H')
+        for timestamp, temperature, humidity, device in records:
+            timestamps.append(timestamp)
+            temperatures.append(temperature)
+            humidities.append(humidity)
+            devices.append(device)
+        return HistoryView(memoryview(timestamps), memoryview(temperatures),
+                           memoryview(humidities), memoryview(devices))
+
+    def get_trend(self, start, end, resolution, device_id=None):
+        """长时间范围查询：按分辨率（秒）自动选择分钟/小时/天汇总层
+
+        分辨率小于一分钟时返回 None，此时应使用原始历史数据。
+        """
+        if device_id == self.DEFAULT_DEVICE:
+            device_id = None
+        self.wait_history_loaded()
+        return self.rollups.query(start, end, resolution, device_id)
+
+    def get_thresholds(self, device_id=None):
+        """获取设备阈值（设备未单独配置时使用全局阈值）"""
+        if device_id is None or device_id == self.DEFAULT_DEVICE:
+            return {key: self.config[key] for key in DeviceManager.THRESHOLD_KEYS}
+        return self.devices.get_thresholds(device_id)
+
+    def check_thresholds(self, temperature, humidity, device_id=None):
+        """检查读数是否超出阈值，返回超限项列表 [(名称, 数值, 下限, 上限), ...]"""
+        thresholds = self.get_thresholds(device_id)
+        violations = []
+        if temperature < thresholds['temp_min'] or temperature > thresholds['temp_max']:
+            violations.append(("温度", temperature, thresholds['temp_min'], thresholds['temp_max']))
+        if humidity < thresholds['hum_min'] or humidity > thresholds['hum_max']:
+            violations.append(("湿度", humidity, thresholds['hum_min'], thresholds['hum_max']))
+        return violations
+
+    def get_statistics(self, device_id=None):
+        """设备的滚动统计（均值、标准差、最小/最大值、EWMA，含露点），窗口由 stats_windows 配置"""
+        return self.rolling.get(device_id or self.DEFAULT_DEVICE)
+
+    def get_history(self, limit=50):
+        """获取历史数据（最近 limit 条的零拷贝列视图）"""
+        return self.history.view(limit)
+
+
+# 配置文件模板
+config_template = {
+    "port": "COM10",
+    "baudrate": 9600,
+    "temp_min": 18.0,
+    "temp_max": 30.0,
+    "hum_min": 30.0,
+    "hum_max": 80.0,
+    "auto_connect": False,
+    "history_dir": "history",
+    "flush_interval": 5.0,
+    "segment_max_bytes": 4 * 1024 * 1024,
+    "retention_days": 180,
+    "compact_interval": 3600.0,
+    "history_capacity": 1000000,
+    "devices": [],
+    "read_batch_window": 0.0,
+    "ui_frame_rate": 20,
+    "chart_window": 600.0,
+    "chart_max_points": 2000,
+    "metrics_port": 9108,
+    "binary_framing": False,
+    "queue_maxsize": 10000,
+    "queue_policy": "drop_oldest",
+    "queue_put_timeout": 0.1,
+    "port_cache_file": "port_cache.json",
+    "port_watch_interval": 2.0,
+    "handshake_timeout": 3.0,
+    "handshake_retry": 0.5,
+    "data_timeout": 10.0,
+    "auto_reconnect": True,
+    "reconnect_initial": 0.5,
+    "reconnect_max": 30.0,
+    "command_timeout": 2.0,
+    "command_window": 64,
+    "alert_min_duration": 5.0,
+    "alert_temp_hysteresis": 0.5,
+    "alert_hum_hysteresis": 2.0,
+    "alert_temp_rate": 2.0,
+    "alert_hum_rate": 10.0,
+    "alert_rate_window": 60.0,
+    "alert_interval": 0.5,
+    "alert_log": True,
+    "alert_webhook": "",
+    "stats_windows": [60.0, 600.0],
+    "stats_ewma_tau": 30.0,
+    "history_mmap": True
+}
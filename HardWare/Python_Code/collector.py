@@ -0,0 +1,142 @@
+"""
+无界面采集程序
+在没有显示器的服务器上运行：复用 BluetoothMonitor 完成采集、持久化和阈值检查，
+不导入 tkinter/matplotlib，配置来自 config.json。
+
+用法:
+    python collector.py                         # 使用 config.json 中的串口和设备
+    python collector.py --port /dev/rfcomm0 -v  # 指定串口并打印每条读数
+    python collector.py --no-serial             # 只打开 config.json 中 devices 列出的设备
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from queue import Empty
+
+from bluetooth_monitor import BluetoothMonitor, config_template
+from record_queue import BoundedRecordQueue
+
+
+class Collector:
+    def __init__(self, monitor, verbose=False, stats_interval=60.0):
+        self.monitor = monitor
+        self.verbose = verbose
+        self.stats_interval = stats_interval
+        self.records = 0
+        self._stop = threading.Event()
+        # 报警由报警引擎检查（带回差和最短持续时间），这里只输出事件
+        monitor.alerts.listeners.append(self.handle_alert)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, duration=None):
+        """处理数据直到 stop() 被调用或运行满 duration 秒"""
+        deadline = time.time() + duration if duration else None
+        next_stats = time.time() + self.stats_interval if self.stats_interval > 0 else None
+
+        while not self._stop.is_set():
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                break
+            if next_stats is not None and now >= next_stats:
+                self.print_stats()
+                next_stats = now + self.stats_interval
+
+            try:
+                record = self.monitor.data_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            self.handle_record(record)
+
+    def handle_record(self, record):
+        """记录已由 BluetoothMonitor 写入历史并交给报警引擎，这里只做输出"""
+        self.records += 1
+        if self.verbose:
+            print(f"[{record['timestamp']}] {record['device']}: "
+                  f"{record['temperature']:.1f} °C, {record['humidity']:.1f} %")
+
+    def handle_alert(self, event):
+        """报警引擎的事件回调（在报警线程中调用），报警和解除各输出一次"""
+        print(f"[{event['timestamp']}] {event['message']}")
+
+    def print_stats(self):
+        """输出运行统计"""
+        stats = self.monitor.metrics.snapshot()
+        print(f"已接收 {self.records} 条记录，"
+              f"串口 {stats['bytes_received_total']} 字节，"
+              f"解析失败 {stats['parse_failures_total']} 行，"
+              f"队列丢弃 {stats['data_queue_dropped_total']} 条，"
+              f"合并 {stats['data_queue_coalesced_total']} 条，"
+              f"当前报警 {stats['alerts_active']} 个，"
+              f"已连接设备 {stats['connected_devices']} 个")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="环境监测无界面采集程序")
+    parser.add_argument("--config", default="config.json", help="配置文件路径")
+    parser.add_argument("--port", help="串口（默认使用配置文件中的 port）")
+    parser.add_argument("--baudrate", type=int,
+                        help="波特率（默认使用串口缓存中上次成功的波特率，其次是配置文件中的 baudrate）")
+    parser.add_argument("--no-serial", action="store_true",
+                        help="不打开 port 指定的串口，只打开 devices 中的设备")
+    parser.add_argument("--history-capacity", type=int, default=3600,
+                        help="内存中保留的最近记录条数（完整历史在磁盘上）")
+    parser.add_argument("--queue-policy", choices=BoundedRecordQueue.POLICIES,
+                        help="数据队列满时的处理策略（默认使用配置文件中的 queue_policy）")
+    parser.add_argument("--duration", type=float, help="运行指定秒数后退出")
+    parser.add_argument("--stats-interval", type=float, default=60.0,
+                        help="统计信息输出间隔（秒），0 表示不输出")
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印每条读数")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.config):
+        with open(args.config, "w") as f:
+            json.dump(config_template, f, indent=2)
+        print(f"已创建默认配置文件 {args.config}")
+
+    monitor = BluetoothMonitor(config_file=args.config, history_capacity=args.history_capacity)
+    if args.queue_policy:
+        monitor.config['queue_policy'] = args.queue_policy
+        monitor.data_queue = monitor.create_data_queue()
+    collector = Collector(monitor, verbose=args.verbose, stats_interval=args.stats_interval)
+
+    if monitor.start_metrics_server():
+        print(f"指标端点: http://127.0.0.1:{monitor.metrics_server.port}/metrics")
+
+    # 收到 SIGTERM 时正常退出，确保历史数据写盘
+    signal.signal(signal.SIGTERM, lambda signum, frame: collector.stop())
+
+    try:
+        waiting = False
+        if not args.no_serial:
+            port = args.port or monitor.config['port']
+            if monitor.connect(port, args.baudrate):
+                print(f"已连接 {port}")
+            else:
+                # 无人值守运行，串口暂时不可用（设备未上电、适配器未插入）时按退避间隔继续尝试
+                print(f"{port} 暂时无法连接，将在后台继续重试")
+                monitor.connect_in_background(port, args.baudrate)
+            waiting = True
+        if monitor.config['devices']:
+            opened = monitor.connect_devices()
+            waiting = waiting or bool(opened)
+        if not waiting:
+            print("没有可用的设备，退出")
+            return 1
+
+        collector.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.close()
+        print(f"已停止，共接收 {collector.records} 条记录")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+"""
+命令通道
+所有发往设备的命令先放入发送队列，由专门的发送线程写入串口，调用方（包括界面线程）从不阻塞在串口写入上。
+每条命令返回一个 concurrent.futures.Future，收到对应的 RESP 回应时得到回应内容，超时得到 TimeoutError；
+GET_DATA 没有 RESP 回应，得到该设备的下一条读数。
+
+命令不等待上一条的回应就继续发送（流水线），发送线程把排队的多条命令合并成一次写入和一次 flush。
+固件用 SoftwareSerial 接收命令，接收缓冲区只有 64 字节，所以已发送但尚未回应的命令总字节数
+不超过 window_bytes，超出的命令留在队列中，等前面的命令回应或超时后再发送。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# 命令前缀 -> 回应前缀，顺序与固件 processBluetoothCommand() 的匹配顺序一致；
+# GET_DATA 没有 RESP 回应，对应的请求由下一条读数完成
+COMMAND_REPLIES = (
+    ("GET_DATA", None),
+    ("SET_THRESHOLD", "THRESHOLD_SET"),
+    ("TOGGLE_THRESHOLD", "THRESHOLD_TOGGLED"),
+    ("STATUS", "STATUS:"),
+    ("CONNECT", "CONNECTED"),
+    ("DISCONNECT", "DISCONNECTED"),
+)
+UNKNOWN_REPLY = "UNKNOWN_CMD"
+
+
+def expected_reply(command):
+    """命令对应的回应前缀；GET_DATA 返回 None，无法识别的命令固件回应 UNKNOWN_CMD"""
+    for prefix, reply in COMMAND_REPLIES:
+        if command.startswith(prefix):
+            return reply
+    return UNKNOWN_REPLY
+
+
+class _Command:
+    __slots__ = ('data', 'reply', 'future', 'deadline', 'sent_at')
+
+    def __init__(self, command, timeout):
+        self.data = (command + '\n').encode('utf-8')
+        self.reply = expected_reply(command)
+        self.future = Future()
+        self.deadline = time.monotonic() + timeout     # 从提交时算起，包括在队列中等待的时间
+        self.sent_at = None
+
+
+class CommandChannel:
+    def __init__(self, write, timeout=2.0, window_bytes=64):
+        self.write = write                  # write(bytes)：写入串口并 flush，在发送线程中调用
+        self.timeout = timeout
+        self.window_bytes = window_bytes
+        self.on_reply = None                # on_reply(往返秒数)，命令得到回应时调用
+        self.on_error = None                # on_error(异常)，写入失败时调用
+
+        self._outgoing = deque()            # 等待发送的命令
+        self._pending = deque()             # 已发送、等待回应的命令，按发送顺序排列
+        self._pending_bytes = 0
+        self._data_waiters = 0              # _pending 中 GET_DATA 的数量，读数热路径据此跳过加锁
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # 统计
+        self.sent = 0
+        self.batches = 0
+        self.replies = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def start(self):
+        """启动发送线程（串口打开后调用）"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, reason="连接已断开"):
+        """停止发送线程，尚未完成的命令得到 ConnectionError"""
+        with self._cond:
+            self._running = False
+            failed = list(self._outgoing) + list(self._pending)
+            self._outgoing.clear()
+            self._pending.clear()
+            self._pending_bytes = 0
+            self._data_waiters = 0
+            self._cond.notify_all()
+        for item in failed:
+            self._complete(item.future, error=ConnectionError(reason))
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def submit(self, command, timeout=None):
+        """把命令放入发送队列，立即返回 Future；未连接时 Future 直接得到 ConnectionError"""
+        item = _Command(command, timeout or self.timeout)
+        with self._cond:
+            if self._running:
+                self._outgoing.append(item)
+                self._cond.notify()
+                return item.future
+        self._complete(item.future, error=ConnectionError("设备未连接"))
+        return item.future
+
+    def in_flight(self):
+        """已发送、等待回应的命令数"""
+        return len(self._pending)
+
+    def queued(self):
+        """等待发送的命令数"""
+        return len(self._outgoing)
+
+    # ---------- 回应 ----------
+
+    def resolve(self, response):
+        """把 RESP 回应交给最早的匹配命令，返回是否有命令在等待它（在接收线程中调用）"""
+        with self._cond:
+            for item in self._pending:
+                if item.reply is None:
+                    continue
+                if response.startswith(item.reply) or response == UNKNOWN_REPLY:
+                    self._release(item)
+                    break
+            else:
+                return False
+        self._replied(item, response)
+        return True
+
+    def resolve_data(self, record):
+        """把读数交给最早的 GET_DATA 命令"""
+        if not self._data_waiters:
+            return False
+        with self._cond:
+            for item in self._pending:
+                if item.reply is None:
+                    self._release(item)
+                    break
+            else:
+                return False
+        self._replied(item, record)
+        return True
+
+    def _release(self, item):
+        """从等待回应的命令中移除，释放发送窗口（持有锁时调用）"""
+        self._pending.remove(item)
+        self._pending_bytes -= len(item.data)
+        if item.reply is None:
+            self._data_waiters -= 1
+        self._cond.notify()
+
+    def _replied(self, item, result):
+        self.replies += 1
+        if self.on_reply is not None:
+            self.on_reply(time.monotonic() - item.sent_at)
+        self._complete(item.future, result)
+
+    @staticmethod
+    def _complete(future, result=None, error=None):
+        """设置结果；调用方已经 cancel() 的 Future 直接忽略"""
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # ---------- 发送线程 ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    now = time.monotonic()
+                    expired = self._expire(now)
+                    batch = self._take_batch(now)
+                    if batch or expired:
+                        break
+                    self._cond.wait(self._next_deadline(now))
+
+            for item in expired:
+                self._complete(item.future, error=TimeoutError(f"命令 {item.data.decode().strip()} 没有回应"))
+            if not batch:
+                continue
+
+            # 合并成一次写入，回应可能在 write 返回前就到达，所以发送前已登记到 _pending
+            try:
+                self.write(b"".join(item.data for item in batch))
+            except Exception as e:
+                self.errors += 1
+                with self._cond:
+                    for item in batch:
+                        if item in self._pending:
+                            self._release(item)
+                for item in batch:
+                    self._complete(item.future, error=e)
+                if self.on_error is not None:
+                    self.on_error(e)
+                continue
+            self.sent += len(batch)
+            self.batches += 1
+
+    def _expire(self, now):
+        """移除超时和已被调用方取消的命令，返回超时的命令（持有锁时调用）"""
+        expired = []
+        for queue in (self._outgoing, self._pending):
+            for item in [item for item in queue if item.deadline <= now or item.future.cancelled()]:
+                if queue is self._pending:
+                    self._release(item)
+                else:
+                    queue.remove(item)
+                if not item.future.cancelled():
+                    expired.append(item)
+        self.timeouts += len(expired)
+        return expired
+
+    def _take_batch(self, now):
+        """从队列头部取出能放进发送窗口的命令，登记为等待回应（持有锁时调用）"""
+        batch = []
+        while self._outgoing:
+            item = self._outgoing[0]
+            size = len(item.data)
+            # 窗口为空时即使单条命令超过窗口也照常发送
+            if self._pending and self._pending_bytes + size > self.window_bytes:
+                break
+            self._outgoing.popleft()
+            item.sent_at = now
+            self._pending.append(item)
+            self._pending_bytes += size
+            if item.reply is None:
+                self._data_waiters += 1
+            batch.append(item)
+        return batch
+
+    def _next_deadline(self, now):
+        """距最近一个超时的秒数，没有等待中的命令时返回 None（无限等待）"""
+        deadlines = [item.deadline for item in self._outgoing]
+        deadlines.extend(item.deadline for item in self._pending)
+        if not deadlines:
+            return None
+        return max(min(deadlines) - now, 0)
+
+    def stats(self):
+        """返回统计计数"""
+        return {
+            'sent': self.sent,
+            'batches': self.batches,
+            'replies': self.replies,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'in_flight': len(self._pending),
+            'queued': len(self._outgoing)
+        }
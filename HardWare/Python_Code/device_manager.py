@@ -0,0 +1,317 @@
+"""
+多设备管理
+在一个进程内同时打开多个串口，每个串口对应一个带ID的设备；
+所有串口由同一个基于 selectors 的读线程复用读取，记录汇入同一个数据流。
+Windows 上串口不能 select，每个设备一个带超时的阻塞读线程。
+设备断开（或首次打开失败）后按与默认连接相同的指数退避在后台重连。
+"""
+
+import os
+import selectors
+import threading
+import time
+
+import serial
+
+
+class DeviceLink:
+    """单个设备的串口连接"""
+    READ_TIMEOUT = 0.5      # Windows 上阻塞读取的超时（秒），超时后检查是否已停止
+
+    def __init__(self, device_id, port, framer, baudrate=9600, thresholds=None,
+                 connect_command="CONNECT"):
+        self.device_id = device_id
+        self.port = port
+        self.framer = framer
+        self.baudrate = baudrate
+        self.thresholds = thresholds or {}
+        self.connect_command = connect_command
+        self.serial_port = None
+        self.last_data = None       # 最近一次收到数据的时间（time.monotonic()）
+        self._fd = None
+
+    def open(self):
+        """打开串口（非阻塞读）"""
+        self.serial_port = serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            timeout=0 if os.name == 'posix' else self.READ_TIMEOUT,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            bytesize=serial.EIGHTBITS
+        )
+        self.serial_port.reset_input_buffer()
+        # posix 上直接读写文件描述符：pyserial 的 read/write 内部使用 select()，
+        # 描述符编号超过 1024 时会失败，设备数量多时就会遇到
+        if os.name == 'posix':
+            self._fd = self.serial_port.fileno()
+        self.last_data = time.monotonic()
+        self.write((self.connect_command + "\n").encode())
+
+    def write(self, data):
+        if self._fd is not None:
+            os.write(self._fd, data)
+        else:
+            self.serial_port.write(data)
+
+    def close(self):
+        if self.serial_port and self.serial_port.is_open:
+            try:
+                self.write(b"DISCONNECT\n")
+            except Exception:
+                pass
+            self.serial_port.close()
+
+    def read_available(self):
+        """读取已到达的字节并交给分帧解析器"""
+        if self._fd is not None:
+            try:
+                data = os.read(self._fd, 4096)
+            except BlockingIOError:
+                return
+            if not data:
+                # 可读但没有数据：设备已断开
+                raise serial.SerialException("设备已断开")
+            self.last_data = time.monotonic()
+            self.framer.feed(data)
+            return
+        waiting = self.serial_port.in_waiting
+        if waiting:
+            self.last_data = time.monotonic()
+            self.framer.feed(self.serial_port.read(waiting))
+
+    def read_blocking(self):
+        """阻塞读取（Windows）：等到有数据或超过 READ_TIMEOUT，不轮询"""
+        data = self.serial_port.read(max(1, self.serial_port.in_waiting))
+        if data:
+            self.last_data = time.monotonic()
+            self.framer.feed(data)
+
+
+class DeviceManager:
+    THRESHOLD_KEYS = ("temp_min", "temp_max", "hum_min", "hum_max")
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self.links = {}
+        self._configs = {}          # 设备ID -> config.json 中的设备配置
+        self._reconnecting = {}     # 设备ID -> 后台重连线程的停止事件
+        self.running = False
+        self._lock = threading.Lock()
+        self._reader_thread = None
+
+        # Windows 上串口不是可 select 的文件描述符，每个设备一个阻塞读线程；
+        # close() 后关闭，再次添加设备时重新创建
+        self._selector = None
+
+    def _device_thresholds(self, device_config):
+        """设备阈值：设备配置优先，否则使用全局配置；每次调用时读取，配置修改后立即生效"""
+        return {key: device_config.get(key, self.monitor.config[key])
+                for key in self.THRESHOLD_KEYS}
+
+    def configured_devices(self):
+        """config.json 中 devices 列表里格式正确的条目，缺少 id 或 port 的条目打印后跳过"""
+        devices = []
+        for index, device_config in enumerate(self.monitor.config.get('devices', [])):
+            if not isinstance(device_config, dict) or not device_config.get('id') \
+                    or not device_config.get('port'):
+                print(f"忽略 devices 中第{index + 1}个设备配置（需要 id 和 port）: {device_config}")
+                continue
+            devices.append(device_config)
+        return devices
+
+    def open_all(self):
+        """打开 config.json 中 devices 列表里的所有设备"""
+        opened = []
+        for device_config in self.configured_devices():
+            device_id = device_config['id']
+            # 保存设备配置本身而不是阈值副本，之后修改配置中的阈值对已打开的设备同样生效
+            self._configs[device_id] = device_config
+            if self.add_device(device_id, device_config['port'], device_config.get('baudrate')):
+                opened.append(device_id)
+        return opened
+
+    def add_device(self, device_id, port, baudrate=None, thresholds=None):
+        """打开一个设备并加入读线程，未指定波特率时使用串口缓存中上次成功的波特率；
+        打开失败且配置了 auto_reconnect 时在后台按退避间隔重试"""
+        if device_id in self.links or device_id in self._reconnecting:
+            self.remove_device(device_id)
+        link = self._open_link(device_id, port, baudrate, thresholds)
+        if link is None:
+            if self.monitor.config['auto_reconnect']:
+                self._start_reconnect(device_id, port, baudrate, thresholds)
+            return False
+        return self._attach(link)
+
+    def _open_link(self, device_id, port, baudrate, thresholds):
+        """打开设备串口，失败时打印原因并返回 None"""
+        port, baudrate = self.monitor.resolve_port(port, baudrate)
+        link = DeviceLink(device_id, port, self.monitor.create_framer(device_id),
+                          baudrate, thresholds, self.monitor.connect_command())
+        try:
+            link.open()
+        except Exception as e:
+            print(f"设备 {device_id} 连接失败: {e}")
+            return None
+        self.monitor.port_registry.remember(port, baudrate=baudrate)
+        return link
+
+    def _attach(self, link, stop=None):
+        """把已打开的连接加入读线程；stop 为重连线程的停止事件，重连期间设备被移除时关闭连接并返回 False"""
+        with self._lock:
+            attached = stop is None or not stop.is_set()
+            if attached:
+                if stop is not None:
+                    self._reconnecting.pop(link.device_id, None)
+                self.links[link.device_id] = link
+                if os.name == 'posix':
+                    if self._selector is None:
+                        self._selector = selectors.DefaultSelector()
+                    self._selector.register(link.serial_port.fileno(), selectors.EVENT_READ, link)
+        if not attached:
+            link.close()
+            return False
+        self.running = True
+        if os.name == 'posix':
+            self._start_reader()
+        else:
+            threading.Thread(target=self._link_reader, args=(link,), daemon=True).start()
+        return True
+
+    def remove_device(self, device_id):
+        """关闭并移除一个设备，停止它的后台重连"""
+        with self._lock:
+            stop = self._reconnecting.pop(device_id, None)
+            if stop:
+                stop.set()
+            link = self._detach(device_id)
+        if link:
+            link.close()
+
+    def _detach(self, device_id, link=None):
+        """从读线程中移除设备（持有 _lock 时调用）；指定 link 时只在它仍是当前连接时移除"""
+        current = self.links.get(device_id)
+        if current is None or (link is not None and current is not link):
+            return None
+        del self.links[device_id]
+        if self._selector:
+            try:
+                self._selector.unregister(current.serial_port.fileno())
+            except (KeyError, ValueError):
+                pass
+        return current
+
+    # ---------- 自动重连 ----------
+
+    def _link_lost(self, link, reason):
+        """读取出错或超过 data_timeout 没有数据：关闭连接，配置了 auto_reconnect 时在后台重连"""
+        with self._lock:
+            lost = self._detach(link.device_id, link)
+        if lost is None:
+            return
+        link.close()
+        print(f"设备 {link.device_id} 链路失效: {reason}")
+        if self.running and self.monitor.config['auto_reconnect']:
+            self._start_reconnect(link.device_id, link.port, link.baudrate, link.thresholds, lost=True)
+
+    def _start_reconnect(self, device_id, port, baudrate, thresholds, lost=False):
+        stop = threading.Event()
+        with self._lock:
+            self._reconnecting[device_id] = stop
+        threading.Thread(target=self._reconnect_loop,
+                         args=(device_id, port, baudrate, thresholds, stop, lost), daemon=True).start()
+
+    def _reconnect_loop(self, device_id, port, baudrate, thresholds, stop, lost):
+        """按与默认连接相同的指数退避重连一个设备，直到成功或设备被移除；
+        lost 为 False 时是首次打开失败后的重试，不计入重连"""
+        lost_at = time.monotonic()
+        attempt = 0
+        while not stop.wait(self.monitor.backoff_delay(attempt)):
+            attempt += 1
+            link = self._open_link(device_id, port, baudrate, thresholds)
+            if link is None:
+                print(f"设备 {device_id} 重连失败（第{attempt}次），"
+                      f"{self.monitor.backoff_delay(attempt):.1f}s 左右后重试")
+                continue
+            if not self._attach(link, stop):
+                return
+            if not lost:
+                print(f"设备 {device_id} 已连接 {link.port}（第{attempt}次尝试）")
+                return
+            elapsed = time.monotonic() - lost_at
+            self.monitor.reconnect_seconds.observe(elapsed)
+            self.monitor.reconnects_total.inc()
+            print(f"设备 {device_id} 已重新连接 {link.port}（第{attempt}次尝试，断开 {elapsed:.2f}s）")
+            return
+
+    def get_thresholds(self, device_id):
+        """获取设备阈值：add_device() 指定的阈值优先，其次是设备配置，最后是全局配置"""
+        link = self.links.get(device_id)
+        if link and link.thresholds:
+            return link.thresholds
+        return self._device_thresholds(self._configs.get(device_id, {}))
+
+    def _start_reader(self):
+        if self._reader_thread and self._reader_thread.is_alive():
+            return
+        self.running = True
+        self._reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
+        self._reader_thread.start()
+
+    def _reader_loop(self):
+        """统一读线程（posix）：一个线程复用读取所有设备"""
+        selector = self._selector
+        while self.running:
+            with self._lock:
+                has_links = bool(self.links)
+            if not has_links:
+                time.sleep(0.1)
+                continue
+            for key, _ in selector.select(timeout=0.5):
+                link = key.data
+                try:
+                    link.read_available()
+                except Exception as e:
+                    self.monitor.device_errors_total.inc()
+                    print(f"设备 {link.device_id} 读取错误: {e}")
+                    self._link_lost(link, str(e))
+            with self._lock:
+                links = list(self.links.values())
+            for link in links:
+                self._check_timeout(link)
+
+    def _check_timeout(self, link):
+        """和默认连接一样，超过 data_timeout 没有任何数据视为链路失效，返回是否失效"""
+        data_timeout = self.monitor.config['data_timeout']
+        if data_timeout and time.monotonic() - link.last_data >= data_timeout:
+            self._link_lost(link, f"{data_timeout}s 内没有收到数据")
+            return True
+        return False
+
+    def _link_reader(self, link):
+        """单个设备的阻塞读线程（Windows），设备被移除或关闭后结束"""
+        while self.running and self.links.get(link.device_id) is link:
+            try:
+                link.read_blocking()
+            except Exception as e:
+                if self.links.get(link.device_id) is not link:
+                    return      # 串口已被 remove_device() 关闭
+                self.monitor.device_errors_total.inc()
+                print(f"设备 {link.device_id} 读取错误: {e}")
+                self._link_lost(link, str(e))
+                return
+            if self._check_timeout(link):
+                return
+
+    def close(self):
+        """关闭所有设备并停止后台重连；之后仍可以再添加设备"""
+        self.running = False
+        for device_id in list(self.links) + list(self._reconnecting):
+            self.remove_device(device_id)
+        if self._reader_thread:
+            self._reader_thread.join(timeout=1)
+            self._reader_thread = None
+        with self._lock:
+            if self._selector:
+                self._selector.close()
+                self._selector = None
@@ -0,0 +1,393 @@
+"""
+模拟设备
+按 Arduino 固件（main.ino / BluetoothModule）的协议模拟 HC-05 蓝牙串口设备：
+启动时发送 RESP:READY，周期发送 D:温度,湿度，并回应 CONNECT、DISCONNECT、GET_DATA、
+SET_THRESHOLD、TOGGLE_THRESHOLD、STATUS 等命令；收到 CONNECT,BIN 后改为发送二进制帧（见 binary_framer）。
+每个设备是一个伪终端，BluetoothMonitor.connect 和 BluetoothConnectionTester 可以直接打开；
+所有设备由一个基于 selectors 的线程驱动，可以同时模拟数百台设备。仅支持 posix 系统。
+
+用法:
+    python device_simulator.py                          # 一台设备，2秒一条
+    python device_simulator.py -n 200 --interval 0.1 --config-out sim_devices.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import re
+import selectors
+import threading
+import time
+
+from binary_framer import encode_frame
+
+_FLOAT_PREFIX = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+
+class SimulatedDevice:
+    """一台模拟设备（伪终端的主设备端）"""
+
+    def __init__(self, device_id, interval=2.0, jitter=0.0, noise=0.1,
+                 base_temp=24.0, base_hum=50.0, boot_delay=0.0,
+                 error_rate=0.0, corrupt_rate=0.0, seed=None):
+        self.device_id = device_id
+        self.interval = interval            # 传感器读取间隔（固件为2秒）
+        self.jitter = jitter                # 每次间隔的随机抖动（秒）
+        self.noise = noise                  # 读数的高斯噪声标准差
+        self.base_temp = base_temp
+        self.base_hum = base_hum
+        self.boot_delay = boot_delay        # 固件 setup() 中等待传感器稳定的时间
+        self.error_rate = error_rate        # 传感器读取失败（不发送数据）的概率
+        self.corrupt_rate = corrupt_rate    # 发送损坏行的概率，用于测试解析容错
+        self.random = random.Random(seed)
+
+        self.status = "INIT"
+        self.connected = False
+        self.binary = False
+        self.sequence = 0
+        self.show_thresholds = True
+        self.thresholds = (18.0, 30.0, 30.0, 80.0)
+        self.temperature = base_temp
+        self.humidity = base_hum
+        self.next_sample = None
+        self.outage_until = 0.0             # 在此时间之前模拟蓝牙链路中断：不发送也不响应
+        self._phase = self.random.uniform(0, 2 * math.pi)
+        self._buffer = bytearray()          # 已收到、尚未被 checkCommand() 读取的字节
+        self._command = bytearray()         # BluetoothModule::receivedCommand
+
+        # 统计
+        self.sent = 0
+        self.dropped = 0
+        self.commands = 0
+        self.send_times = None      # 设为列表时记录每条数据的发送时间（负载测试用）
+
+        self.master = None
+        self.slave = None
+        self.port = None
+
+    def open(self):
+        """创建伪终端，返回从设备端路径（即串口名）"""
+        import tty
+
+        self.master, self.slave = os.openpty()
+        # 关闭回显和换行转换；保持从设备端打开，客户端断开后主设备端仍然可用
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        # BluetoothModule::begin()
+        self._write_line(b"RESP:READY")
+        self.schedule(time.time())
+        return self.port
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def fileno(self):
+        return self.master
+
+    # ---------- 输出 ----------
+
+    def _write(self, data):
+        """伪终端缓冲区满时丢弃（HC-05 未连接时同样会丢数据）"""
+        try:
+            os.write(self.master, data)
+            return True
+        except BlockingIOError:
+            self.dropped += 1
+            return False
+
+    def _write_line(self, line):
+        """与 println 一致以 \\r\\n 结尾"""
+        return self._write(line + b"\r\n")
+
+    def _respond(self, response):
+        self._write_line(b"RESP:" + response.encode())
+
+    def _send_data(self):
+        corrupt = self.corrupt_rate and self.random.random() < self.corrupt_rate
+        if self.binary:
+            frame = encode_frame(self.sequence, self.temperature, self.humidity)
+            self.sequence = (self.sequence + 1) & 0xFF
+            if corrupt:
+                # 翻转一个数据字节，接收端应校验失败
+                index = self.random.randint(1, len(frame) - 2)
+                frame = frame[:index] + bytes((frame[index] ^ 0x10,)) + frame[index + 1:]
+            written = self._write(frame)
+        else:
+            line = f"D:{self.temperature:.1f},{self.humidity:.1f}".encode()
+            if corrupt:
+                line = line[:self.random.randint(2, len(line) - 1)]
+            written = self._write_line(line)
+        if written:
+            self.sent += 1
+            if self.send_times is not None:
+                self.send_times.append(time.time())
+
+    # ---------- 传感器 ----------
+
+    def _read_sensor(self, now):
+        """以缓慢的正弦变化加噪声模拟 DHT22 读数"""
+        if self.error_rate and self.random.random() < self.error_rate:
+            return False
+        wave = math.sin(now / 600.0 + self._phase)
+        self.temperature = self.base_temp + 2.0 * wave + self.random.gauss(0, self.noise)
+        self.humidity = min(max(self.base_hum - 5.0 * wave + self.random.gauss(0, self.noise), 0.0), 100.0)
+        return True
+
+    def drop_link(self, duration):
+        """模拟 HC-05 掉线 duration 秒（超出范围、电源波动）；恢复后需要主机重新发送 CONNECT"""
+        self.outage_until = time.time() + duration
+        self.connected = False
+        self.binary = False
+
+    def schedule(self, now):
+        """安排首次读取：启动等待之后在一个间隔内随机错开，避免大量设备同时发送"""
+        self.next_sample = now + self.boot_delay + self.random.uniform(0, self.interval)
+        return self.next_sample
+
+    def tick(self, now):
+        """到达读取时间时读取传感器并发送数据，返回下一次读取时间"""
+        if self.status == "INIT":
+            self.status = "RUNNING"
+        if now >= self.outage_until and self._read_sensor(now):
+            self._send_data()
+        delay = self.interval
+        if self.jitter:
+            delay = max(delay + self.random.uniform(-self.jitter, self.jitter), 0.0)
+        # 以计划时间为基准累加，避免调度误差累积成频率偏移
+        self.next_sample = max(self.next_sample + delay, now)
+        return self.next_sample
+
+    # ---------- 命令 ----------
+
+    def handle_input(self):
+        """读取主机发来的字节，按固件 loop() 的方式取出命令并处理"""
+        try:
+            data = os.read(self.master, 4096)
+        except (BlockingIOError, OSError):
+            return
+        if time.time() < self.outage_until:
+            return          # 链路中断期间主机发来的命令丢失
+        self._buffer += data
+        # 固件每次 loop() 调用 checkCommand()，有完整命令时 getCommand() 取出并处理
+        while self.check_command():
+            self.commands += 1
+            self.process_command(self.get_command())
+
+    def check_command(self):
+        """与 BluetoothModule::checkCommand() 一致：逐字节读到 \\n，trim 后非空则返回 True；
+        命令在 getCommand() 取出前一直留在 _command 中，空行清空 _command"""
+        buffer = self._buffer
+        position = 0
+        try:
+            while position < len(buffer):
+                c = buffer[position]
+                position += 1
+                if c == 0x0A:
+                    self._command = self._command.strip()      # String::trim()，只去掉 ASCII 空白
+                    if self._command:
+                        return True
+                    self._command = bytearray()
+                else:
+                    self._command.append(c)
+            return False
+        finally:
+            del buffer[:position]
+
+    def get_command(self):
+        """与 BluetoothModule::getCommand() 一致：取出命令并清空缓冲区"""
+        command = self._command.decode('utf-8', errors='ignore')
+        self._command = bytearray()
+        return command
+
+    def process_command(self, command):
+        """与 processBluetoothCommand() 相同的前缀匹配顺序"""
+        if command.startswith("GET_DATA"):
+            self._send_data()
+        elif command.startswith("SET_THRESHOLD"):
+            # 与固件一样用 indexOf 找前四个逗号，第五段取到行尾；缺少逗号时不回应
+            commas = []
+            for _ in range(4):
+                index = command.find(',', commas[-1] + 1 if commas else 0)
+                if index < 0:
+                    return
+                commas.append(index)
+            bounds = commas + [len(command)]
+            self.thresholds = tuple(_to_float(command[bounds[i] + 1:bounds[i + 1]]) for i in range(4))
+            self._respond("THRESHOLD_SET")
+        elif command.startswith("TOGGLE_THRESHOLD"):
+            self.show_thresholds = not self.show_thresholds
+            self._respond("THRESHOLD_TOGGLED")
+        elif command.startswith("STATUS"):
+            self._respond("STATUS:" + self.status)
+        elif command.startswith("CONNECT"):
+            self.connected = True
+            self.binary = command.startswith("CONNECT,BIN")
+            self.sequence = 0
+            self.status = "CONNECTED"
+            self._respond("CONNECTED,BIN" if self.binary else "CONNECTED")
+        elif command.startswith("DISCONNECT"):
+            self.connected = False
+            self.binary = False
+            self.status = "RUNNING"
+            self._respond("DISCONNECTED")
+        else:
+            self._respond("UNKNOWN_CMD")
+
+
+def _to_float(text):
+    """与 Arduino String::toFloat()（atof）一样，解析开头的数字部分，无法解析时返回 0"""
+    match = _FLOAT_PREFIX.match(text)
+    return float(match.group()) if match else 0.0
+
+
+class DeviceSimulator:
+    """在一个线程中驱动多台模拟设备"""
+
+    def __init__(self):
+        self.devices = []
+        self._selector = selectors.DefaultSelector()
+        self._schedule = []         # (下一次读取时间, 序号)
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def add_device(self, device_id=None, **kwargs):
+        """创建并打开一台设备，参数同 SimulatedDevice"""
+        device = SimulatedDevice(device_id or f"sim{len(self.devices) + 1}", **kwargs)
+        device.open()
+        with self._lock:
+            index = len(self.devices)
+            self.devices.append(device)
+            self._selector.register(device.master, selectors.EVENT_READ, device)
+            heapq.heappush(self._schedule, (device.next_sample, index))
+        return device
+
+    @property
+    def ports(self):
+        return [device.port for device in self.devices]
+
+    def device_config(self):
+        """生成 config.json 中 devices 字段的内容"""
+        return [{"id": device.device_id, "port": device.port} for device in self.devices]
+
+    def run(self, duration=None):
+        """事件循环：等待命令或下一次读取时间"""
+        self._running = True
+        deadline = time.time() + duration if duration else None
+        # 从事件循环开始时重新计时，创建设备到开始运行之间不会积压数据
+        with self._lock:
+            now = time.time()
+            self._schedule = [(device.schedule(now), index) for index, device in enumerate(self.devices)]
+            heapq.heapify(self._schedule)
+        while self._running:
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                break
+            with self._lock:
+                while self._schedule and self._schedule[0][0] <= now:
+                    _, index = heapq.heappop(self._schedule)
+                    heapq.heappush(self._schedule, (self.devices[index].tick(now), index))
+                timeout = self._schedule[0][0] - now if self._schedule else 0.5
+            if deadline is not None:
+                timeout = min(timeout, deadline - now)
+            for key, _ in self._selector.select(max(timeout, 0.0)):
+                key.data.handle_input()
+
+    def start(self):
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        for device in self.devices:
+            self._selector.unregister(device.master)
+            device.close()
+        self.devices = []
+        self._schedule = []
+
+    def stats(self):
+        """汇总所有设备的统计"""
+        return {
+            'devices': len(self.devices),
+            'sent': sum(device.sent for device in self.devices),
+            'dropped': sum(device.dropped for device in self.devices),
+            'commands': sum(device.commands for device in self.devices)
+        }
+
+
+def raise_fd_limit(count):
+    """每台设备占用两个文件描述符，设备较多时尝试提高进程的打开文件数上限"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = count * 2 + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按固件协议模拟蓝牙温湿度设备")
+    parser.add_argument("-n", "--devices", type=int, default=1, help="设备数量")
+    parser.add_argument("--interval", type=float, default=2.0, help="数据发送间隔（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="发送间隔的随机抖动（秒）")
+    parser.add_argument("--noise", type=float, default=0.1, help="读数噪声标准差")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="传感器读取失败概率")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0, help="发送损坏行的概率")
+    parser.add_argument("--boot-delay", type=float, default=0.0, help="启动后开始发送数据前的等待（秒）")
+    parser.add_argument("--duration", type=float, help="运行指定秒数后退出")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    parser.add_argument("--config-out", help="把设备列表写入该文件（config.json 的 devices 格式）")
+    args = parser.parse_args(argv)
+
+    if os.name != 'posix':
+        parser.error("模拟设备依赖伪终端，仅支持 posix 系统")
+
+    raise_fd_limit(args.devices)
+    simulator = DeviceSimulator()
+    for i in range(args.devices):
+        simulator.add_device(
+            interval=args.interval, jitter=args.jitter, noise=args.noise,
+            error_rate=args.error_rate, corrupt_rate=args.corrupt_rate,
+            boot_delay=args.boot_delay,
+            seed=None if args.seed is None else args.seed + i
+        )
+
+    if args.config_out:
+        with open(args.config_out, 'w') as f:
+            json.dump({"devices": simulator.device_config()}, f, indent=2)
+        print(f"设备列表已写入 {args.config_out}")
+    for device in simulator.devices[:10]:
+        print(f"{device.device_id}: {device.port}")
+    if len(simulator.devices) > 10:
+        print(f"... 共 {len(simulator.devices)} 台设备")
+    print(json.dumps({"ports": simulator.ports}), flush=True)
+
+    try:
+        simulator.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"已停止: {simulator.stats()}")
+        simulator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+后台流式导出
+在后台线程中按块读取磁盘上的历史分段并写出，内存占用只与块大小有关；
+支持 CSV、gzip 压缩的 CSV 和 Parquet（通过 pandas/pyarrow）。
+"""
+
+import gzip
+import threading
+import time
+from datetime import datetime
+
+
+class HistoryExporter:
+    FORMATS = {
+        "csv": ".csv",
+        "csv.gz": ".csv.gz",
+        "parquet": ".parquet"
+    }
+    HEADER = ("时间", "温度(°C)", "湿度(%)", "设备")
+
+    def __init__(self, monitor, chunk_size=50000):
+        self.monitor = monitor
+        self.chunk_size = chunk_size
+        self.thread = None
+        self._cancel = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        # 供界面轮询的进度状态
+        self.progress = 0.0
+        self.rows = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self.filename = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, filename, fmt="csv", start=None, end=None, device_id=None):
+        """启动后台导出，start/end 为时间戳，None 表示不限"""
+        if self.running:
+            raise RuntimeError("已有导出任务正在进行")
+        if fmt not in self.FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+
+        self._reset()
+        self._cancel.clear()
+        self.filename = filename
+        self.thread = threading.Thread(target=self._run,
+                                       args=(filename, fmt, start, end, device_id),
+                                       daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _chunks(self, start, end, device_id):
+        """按块读取记录，并根据时间进度更新 progress"""
+        first = self.monitor.store.first_timestamp()
+        begin = max(start, first) if first is not None else start
+        span = max(end - begin, 1e-9)
+
+        chunk = []
+        for record in self.monitor.iter_range(start, end, device_id):
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self.progress = min(max((record[0] - begin) / span, 0.0), 1.0)
+                yield chunk
+                chunk = []
+                if self._cancel.is_set():
+                    self.cancelled = True
+                    return
+        if chunk:
+            yield chunk
+
+    def _run(self, filename, fmt, start, end, device_id):
+        start = 0.0 if start is None else start
+        end = time.time() if end is None else end
+        try:
+            chunks = self._chunks(start, end, device_id)
+            if fmt == "parquet":
+                self._write_parquet(filename, chunks)
+            else:
+                self._write_csv(filename, chunks, compress=(fmt == "csv.gz"))
+            if not self.cancelled:
+                self.progress = 1.0
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def _write_csv(self, filename, chunks, compress=False):
+        opener = gzip.open if compress else open
+        with opener(filename, 'wt', encoding='utf-8', newline='') as f:
+            f.write(','.join(self.HEADER) + '\n')
+            for chunk in chunks:
+                lines = [f"{datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')},"
+                         f"{temperature:.1f},{humidity:.1f},{device}\n"
+                         for ts, temperature, humidity, device in chunk]
+                f.write(''.join(lines))
+                self.rows += len(chunk)
+
+    def _write_parquet(self, filename, chunks):
+        # pandas/pyarrow 只在导出 Parquet 时才需要
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                timestamps, temperatures, humidities, devices = zip(*chunk)
+                table = pa.Table.from_pandas(
+                    self._parquet_frame(pd, timestamps, temperatures, humidities, pd.Categorical(devices)),
+                    preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(filename, table.schema, compression='zstd')
+                else:
+                    table = table.cast(writer.schema)
+                # 每块写成一个行组，不需要把全部数据放进内存
+                writer.write_table(table)
+                self.rows += len(chunk)
+            if writer is None:
+                # 范围内没有记录时也写出只有表结构的文件，与 CSV 只有表头一致
+                devices = pd.Categorical([], categories=pd.Index([], dtype='str'))
+                table = pa.Table.from_pandas(self._parquet_frame(pd, [], [], [], devices),
+                                             preserve_index=False)
+                writer = pq.ParquetWriter(filename, table.schema, compression='zstd')
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @staticmethod
+    def _parquet_frame(pd, timestamps, temperatures, humidities, devices):
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(pd.Series(timestamps, dtype='float64'), unit='s', utc=True),
+            'temperature': pd.array(temperatures, dtype='float32'),
+            'humidity': pd.array(humidities, dtype='float32'),
+            'device': devices
+        })
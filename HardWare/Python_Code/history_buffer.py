@@ -0,0 +1,135 @@
+"""
+定长环形历史缓冲区
+时间戳、温度、湿度分别存放在类型化数组中，每条记录只占十几个字节。
+每条记录同时写入 i 和 i+capacity 两个位置（镜像写入），
+因此任意长度不超过容量的窗口在内存中都是连续的，可以直接返回零拷贝的 memoryview。
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class HistoryView:
+    """历史数据的列视图（memoryview，不复制数据）"""
+
+    def __init__(self, timestamps, temperatures, humidities, devices):
+        self.timestamps = timestamps
+        self.temperatures = temperatures
+        self.humidities = humidities
+        self.devices = devices      # 设备编号列，编号与设备ID的对应由调用方维护
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __bool__(self):
+        return len(self.timestamps) > 0
+
+    def __iter__(self):
+        """按时间顺序逐条返回 (timestamp, temperature, humidity)"""
+        return zip(self.timestamps, self.temperatures, self.humidities)
+
+    def __reversed__(self):
+        """最新的记录在前"""
+        return zip(reversed(self.timestamps), reversed(self.temperatures),
+                   reversed(self.humidities))
+
+
+class HistoryRingBuffer:
+    def __init__(self, capacity=1000000):
+        if capacity <= 0:
+            raise ValueError("capacity 必须大于0")
+        self.capacity = capacity
+        self._timestamps = array('d', [0.0]) * (2 * capacity)
+        self._temperatures = array('f', [0.0]) * (2 * capacity)
+        self._humidities = array('f', [0.0]) * (2 * capacity)
+        self._devices = array('H', [0]) * (2 * capacity)
+        self._head = 0      # 下一条记录的写入位置
+        self._count = 0
+        self.appended = 0   # 累计追加的记录数，调用方据此只处理新记录
+        self.generation = 0 # 每次 clear() 加一
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def append(self, timestamp, temperature, humidity, device=0):
+        """追加一条记录，O(1)，写满后覆盖最旧的记录"""
+        with self._lock:
+            head = self._head
+            mirror = head + self.capacity
+            self._timestamps[head] = self._timestamps[mirror] = timestamp
+            self._temperatures[head] = self._temperatures[mirror] = temperature
+            self._humidities[head] = self._humidities[mirror] = humidity
+            self._devices[head] = self._devices[mirror] = device
+
+            self._head = head + 1 if head + 1 < self.capacity else 0
+            if self._count < self.capacity:
+                self._count += 1
+            self.appended += 1
+
+    def extend(self, records):
+        """批量追加 (timestamp, temperature, humidity, device) 记录"""
+        for timestamp, temperature, humidity, device in records:
+            self.append(timestamp, temperature, humidity, device)
+
+    def view(self, limit=None):
+        """返回最近 limit 条记录的零拷贝视图（按时间顺序）"""
+        with self._lock:
+            return self._view(limit)
+
+    def snapshot(self):
+        """返回 (全部记录的视图, 累计追加数, clear 次数)，三者在同一时刻取得"""
+        with self._lock:
+            return self._view(None), self.appended, self.generation
+
+    def _view(self, limit):
+        count = self._count if limit is None else max(0, min(limit, self._count))
+        # 镜像区保证 [end - count, end) 连续
+        end = self._head + self.capacity if self._count == self.capacity else self._head
+        start = end - count
+        return HistoryView(
+            memoryview(self._timestamps)[start:end],
+            memoryview(self._temperatures)[start:end],
+            memoryview(self._humidities)[start:end],
+            memoryview(self._devices)[start:end]
+        )
+
+    def range(self, start, end):
+        """返回时间戳在 [start, end] 范围内的零拷贝视图，二分查找 O(log n)"""
+        view = self.view()
+        lo = bisect_left(view.timestamps, start)
+        hi = bisect_right(view.timestamps, end, lo)
+        return HistoryView(view.timestamps[lo:hi], view.temperatures[lo:hi],
+                           view.humidities[lo:hi], view.devices[lo:hi])
+
+    def covers(self, start):
+        """start 之后的数据是否都在内存中（最早一条记录不晚于 start）
+
+        缓冲区未写满不代表包含全部历史（后台加载可能尚未完成或失败），
+        所以总是和最早的记录比较。
+        """
+        with self._lock:
+            if not self._count:
+                return False
+            oldest = self._head - self._count if self._count < self.capacity else self._head
+            return self._timestamps[oldest] <= start
+
+    def latest(self):
+        """返回最新一条记录，没有数据时返回 None"""
+        with self._lock:
+            if not self._count:
+                return None
+            index = self._head - 1 if self._head else self.capacity - 1
+            return (self._timestamps[index], self._temperatures[index],
+                    self._humidities[index])
+
+    def clear(self):
+        """清空缓冲区（不释放内存）"""
+        with self._lock:
+            self._head = 0
+            self._count = 0
+            self.generation += 1
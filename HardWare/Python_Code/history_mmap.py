@@ -0,0 +1,510 @@
+"""
+定长二进制历史文件
+history.bin 是 HistoryStore 分段（追加日志，唯一的数据来源）的派生导出：每批写入分段后
+按同样的顺序追加，随分段按保留期限删除和清空，供其他进程直接内存映射读取，不需要解析。
+启用之前的记录不在其中；文件损坏或删除后可以停止采集程序，用 import 从分段重新生成，
+check 比较两者是否一致。文件格式：
+
+    偏移  0  魔数 b"GYHIST1\\0"
+          8  版本 uint32、头部长度 uint32、记录长度 uint32
+         20  代数 uint32（文件被替换或原地清空时加一）
+         24  已提交记录数 uint64，32 处是同一个值的副本
+         40  创建时间 float64
+         48  起始序号 uint64（此前清空或按保留期限删除的记录总数），其余补零到 HEADER_SIZE
+    头部之后是定长记录（小端）：ts float64、temperature float32、humidity float32、device uint32、保留 uint32
+
+追加时先写记录，再一次写入已提交记录数的两个副本；读取方只使用两个副本相同时的记录数，
+所以写入方正在追加时其他进程也可以安全地读取和 tail，看到的总是完整的记录。
+清空和删除过期记录（prune）时写出新文件再替换，不改动其他进程已经映射的旧文件，
+替换后把旧文件头部的代数加一；读取方在 refresh() 时发现代数变化后重新打开，
+tail() 按起始序号接着返回新记录。Windows 上其他进程打开着的文件不能被替换：
+这时清空改为原地把记录数置零并增加代数（读取方此前取得的记录视图可能被新记录覆盖），
+删除过期记录推迟到下一次压缩。
+设备ID存放在 history.bin.devices（JSON 列表，下标为 device 编号，0 为单串口设备 null），
+新设备先写入设备表再写入引用它的记录。
+
+    with MappedHistory("history/history.bin") as history:
+        records = history.records                       # numpy 结构化数组，零拷贝
+        day = history.slice(start, end)                 # 按时间范围二分切片，只读取用到的页
+        for new in history.tail():                      # 持续返回新提交的记录
+            ...
+
+命令行：python history_mmap.py info|slice|tail history/history.bin ...
+      python history_mmap.py import|check history history/history.bin
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+np = None       # NumPy 在第一次读写记录时才导入，见 _record_dtype()
+
+MAGIC = b"GYHIST1\0"
+VERSION = 1
+HEADER = struct.Struct('<8sIII')
+GENERATION = struct.Struct('<I')
+GENERATION_OFFSET = 20
+COUNT = struct.Struct('<QQ')            # 已提交记录数和它的副本
+COUNT_OFFSET = 24
+CREATED = struct.Struct('<d')
+CREATED_OFFSET = 40
+BASE = struct.Struct('<Q')
+BASE_OFFSET = 48
+HEADER_SIZE = 64
+RECORD_SIZE = 24
+_RECORD = None
+DEVICES_SUFFIX = ".devices"
+
+
+def _record_dtype():
+    """记录的 NumPy 结构（RECORD）。导入 NumPy 约占采集程序导入时间的一半，
+    打开文件、读写头部都不需要它，第一次读写记录时才导入"""
+    global np, _RECORD
+    if _RECORD is None:
+        import numpy
+        np = numpy
+        _RECORD = np.dtype([('ts', '<f8'), ('temperature', '<f4'), ('humidity', '<f4'),
+                            ('device', '<u4'), ('reserved', '<u4')])
+    return _RECORD
+
+
+def __getattr__(name):
+    # from history_mmap import RECORD 时才创建结构
+    if name == 'RECORD':
+        return _record_dtype()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _read_header(f):
+    """读取并校验头部，返回 (已提交记录数, 起始序号, 代数)"""
+    f.seek(0)
+    raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError("历史文件头部不完整")
+    magic, version, header_size, record_size = HEADER.unpack_from(raw)
+    if magic != MAGIC or header_size != HEADER_SIZE or record_size != RECORD_SIZE:
+        raise ValueError(f"不是支持的历史文件格式（版本 {version}）")
+    count, copy = COUNT.unpack_from(raw, COUNT_OFFSET)
+    return (min(count, copy), BASE.unpack_from(raw, BASE_OFFSET)[0],
+            GENERATION.unpack_from(raw, GENERATION_OFFSET)[0])
+
+
+def _write_temp(path, base=0, records=None, generation=0, chunk=1 << 20):
+    """把新的历史文件写到临时文件并刷到磁盘，返回临时文件路径，由调用方替换 path"""
+    header = bytearray(HEADER_SIZE)
+    HEADER.pack_into(header, 0, MAGIC, VERSION, HEADER_SIZE, RECORD_SIZE)
+    GENERATION.pack_into(header, GENERATION_OFFSET, generation)
+    count = 0 if records is None else len(records)
+    COUNT.pack_into(header, COUNT_OFFSET, count, count)
+    CREATED.pack_into(header, CREATED_OFFSET, time.time())
+    BASE.pack_into(header, BASE_OFFSET, base)
+    temp_file = path + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(header)
+        for start in range(0, count, chunk):
+            f.write(records[start:start + chunk].tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    return temp_file
+
+
+def _load_devices(path):
+    try:
+        with open(path + DEVICES_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return [None]
+
+
+class MappedHistoryWriter:
+    """history.bin 的写入方（每个文件只应有一个写入进程）"""
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self.devices = _load_devices(path)
+        self._codes = {device: code for code, device in enumerate(self.devices)}
+
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE:
+            os.replace(_write_temp(path), path)
+        self._open()
+        # 去掉崩溃时写入但没有提交的记录
+        end = HEADER_SIZE + self.count * RECORD_SIZE
+        if os.fstat(self._file.fileno()).st_size > end:
+            self._file.truncate(end)
+
+    def _open(self):
+        self._file = open(self.path, 'r+b', buffering=0)
+        self.count, self.base, self.generation = _read_header(self._file)
+
+    def device_code(self, device):
+        """设备编号，新设备先写入设备表"""
+        code = self._codes.get(device)
+        if code is None:
+            code = self._codes[device] = len(self.devices)
+            self.devices.append(device)
+            temp_file = self.path + DEVICES_SUFFIX + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.devices, f, ensure_ascii=False)
+            os.replace(temp_file, self.path + DEVICES_SUFFIX)
+        return code
+
+    def append_batch(self, records):
+        """追加 [(timestamp, temperature, humidity, device), ...]"""
+        if not records:
+            return
+        record = _record_dtype()
+        with self._lock:
+            batch = np.empty(len(records), dtype=record)
+            batch['ts'] = [record[0] for record in records]
+            batch['temperature'] = [record[1] for record in records]
+            batch['humidity'] = [record[2] for record in records]
+            batch['device'] = [self.device_code(record[3]) for record in records]
+            batch['reserved'] = 0
+            self._append(batch)
+
+    def append_array(self, batch):
+        """追加已经是 RECORD 结构的数组（导入、基准测试）"""
+        record = _record_dtype()
+        with self._lock:
+            self._append(np.ascontiguousarray(batch, dtype=record))
+
+    def _append(self, batch):
+        f = self._file
+        f.seek(HEADER_SIZE + self.count * RECORD_SIZE)
+        f.write(batch.tobytes())
+        if self.fsync:
+            os.fsync(f.fileno())
+        # 记录写完之后才提交记录数，读取方不会看到写了一半的记录
+        self.count += len(batch)
+        f.seek(COUNT_OFFSET)
+        f.write(COUNT.pack(self.count, self.count))
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def clear(self):
+        """删除所有记录（保留设备表）：换成一个新的空文件。不在原文件上截断，
+        其他进程映射着的旧文件保持不变（访问被截掉的映射页会收到 SIGBUS）；
+        文件不能被替换时原地把记录数置零"""
+        with self._lock:
+            base = self.base + self.count
+            if self._replace(_write_temp(self.path, base, None, self.generation + 1)):
+                return
+            f = self._file
+            self.count = 0
+            f.seek(COUNT_OFFSET)
+            f.write(COUNT.pack(0, 0))
+            self.base = base
+            f.seek(BASE_OFFSET)
+            f.write(BASE.pack(base))
+            # 最后写代数，读取方看到代数变化时头部的其他字段已经更新
+            self.generation += 1
+            f.seek(GENERATION_OFFSET)
+            f.write(GENERATION.pack(self.generation))
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def prune(self, cutoff, min_fraction=0.125):
+        """删除 cutoff 之前的记录，返回删除的条数。需要重写整个文件，
+        所以过期记录不少于 min_fraction 时才执行，文件最多比保留期限多出这一比例"""
+        record = _record_dtype()
+        with self._lock:
+            if not self.count:
+                return 0
+            records = np.memmap(self._file, dtype=record, mode='r', offset=HEADER_SIZE, shape=(self.count,))
+            expired = bisect_left(records['ts'], cutoff)
+            if not expired or expired < self.count * min_fraction:
+                return 0
+            temp_file = _write_temp(self.path, self.base + expired, records[expired:], self.generation + 1)
+            # 释放映射：Windows 上被映射的文件不能被替换
+            del records
+            return expired if self._replace(temp_file) else 0
+
+    def _replace(self, temp_file):
+        """用 temp_file 替换当前文件（持有锁时调用），成功返回 True"""
+        old = self._file
+        if os.name != 'posix':
+            # Windows 上打开着的文件不能被替换，先关闭自己的句柄；
+            # 其他进程还打开着 history.bin 时替换仍会失败，保留原文件
+            old.close()
+        try:
+            os.replace(temp_file, self.path)
+        except OSError as e:
+            print(f"替换历史文件失败: {e}")
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+            if old.closed:
+                self._open()
+            return False
+        if not old.closed:
+            # 旧文件的代数加一，仍映射着它的读取方在 refresh() 时重新打开新文件
+            old.seek(GENERATION_OFFSET)
+            old.write(GENERATION.pack(self.generation + 1))
+            old.close()
+        self._open()
+        return True
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class MappedHistory:
+    """history.bin 的只读内存映射视图，写入方正在追加时也可以打开"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.base = 0                   # 第一条记录的序号，文件被替换后变化
+        self.devices = _load_devices(path)
+        self._open()
+        self.refresh()
+
+    def _open(self):
+        self._file = open(self.path, 'rb')
+        self._map = None                # 旧映射上的数组视图仍然有效，由引用计数释放
+        self._mapped_size = 0
+        self.count = 0                  # 由 refresh() 设置
+        _, self.base, self.generation = _read_header(self._file)
+
+    def _stale(self):
+        """写入方替换文件（旧文件的代数加一）或原地清空（代数加一）后需要重新打开"""
+        if self._map is not None and self._mapped_size >= HEADER_SIZE:
+            generation = GENERATION.unpack_from(self._map, GENERATION_OFFSET)[0]
+        else:
+            generation = _read_header(self._file)[2]
+        return generation != self.generation
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def refresh(self):
+        """读取最新提交的记录数，文件变大时重新映射，文件被替换或清空时重新打开；返回新增的记录数"""
+        if self._stale():
+            self._file.close()
+            self._open()
+        count = self._committed_count()
+        if count is None:
+            return 0            # 写入方正在更新记录数，沿用上一次的值
+        size = HEADER_SIZE + count * RECORD_SIZE
+        if size > self._mapped_size:
+            # 旧映射上的数组视图仍然有效，不显式关闭，由引用计数释放
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._map)
+            # 二分查找只访问少量分散的记录，关闭预读，否则每次访问会映射数 MB 的相邻页
+            self._advise(mmap.MADV_RANDOM if hasattr(mmap, 'MADV_RANDOM') else None)
+        # 文件被替换或清空后记录数可能变小；设备表在遇到未知编号时才重新读取，不扫描新记录
+        added = count - self.count
+        self.count = count
+        return added
+
+    def _committed_count(self):
+        if self._map is not None and self._mapped_size >= HEADER_SIZE:
+            count, copy = COUNT.unpack_from(self._map, COUNT_OFFSET)
+        else:
+            count = copy = _read_header(self._file)[0]
+        if count != copy:
+            return None
+        # 不超过文件中实际存在的完整记录
+        available = (os.fstat(self._file.fileno()).st_size - HEADER_SIZE) // RECORD_SIZE
+        return min(count, available)
+
+    @property
+    def records(self):
+        """全部已提交记录的结构化数组视图（零拷贝，只读）"""
+        record = _record_dtype()
+        if not self.count:
+            return np.empty(0, dtype=record)
+        return np.frombuffer(self._map, dtype=record, count=self.count, offset=HEADER_SIZE)
+
+    def slice(self, start=None, end=None, device=None):
+        """[start, end] 时间范围内的记录；不指定设备时为所有设备的零拷贝视图，指定设备ID时返回筛选后的副本。
+        按时间二分查找，记录按追加顺序近似按时间排列（同一批落盘的记录已排序）"""
+        records = self.records
+        # 时间戳列是跨步视图，np.searchsorted 会先复制成连续数组（读完整个文件），
+        # bisect 只访问二分经过的约 log2(n) 条记录
+        ts = records['ts']
+        low = 0 if start is None else bisect_left(ts, start)
+        high = len(records) if end is None else bisect_right(ts, end)
+        part = records[low:high]
+        # 切片范围内的数据提前异步读入页缓存，弥补关闭的预读
+        if high > low:
+            self._advise(getattr(mmap, 'MADV_WILLNEED', None),
+                         HEADER_SIZE + low * RECORD_SIZE, (high - low) * RECORD_SIZE)
+        if device is not None:
+            if device not in self.devices:
+                self.devices = _load_devices(self.path)
+            if device not in self.devices:
+                return part[:0]
+            part = part[part['device'] == self.devices.index(device)]
+        return part
+
+    def _advise(self, option, start=0, length=0):
+        """mmap.madvise（不支持的平台上忽略）"""
+        if option is None:
+            return
+        if length:
+            page = mmap.PAGESIZE
+            length += start % page
+            start -= start % page
+        try:
+            self._map.madvise(option, start, length)
+        except (AttributeError, OSError, ValueError):
+            pass
+
+    def device_name(self, code):
+        if code >= len(self.devices):
+            self.devices = _load_devices(self.path)
+        return self.devices[code] if code < len(self.devices) else None
+
+    def tail(self, interval=0.5, stop=None):
+        """持续返回新提交的记录（结构化数组视图），stop（threading.Event）被设置时结束"""
+        while stop is None or not stop.is_set():
+            # 按序号记录读到的位置，文件被替换后从新文件中对应的位置继续
+            sequence = self.base + self.count
+            self.refresh()
+            position = max(sequence - self.base, 0)
+            if self.count > position:
+                yield self.records[position:]
+            if stop is not None:
+                stop.wait(interval)
+            else:
+                time.sleep(interval)
+
+    def close(self):
+        self._map = None
+        self._file.close()
+
+
+def import_store(directory, path):
+    """把 HistoryStore 分段中的全部记录导入空的 history.bin（需先停止采集程序）"""
+    from history_store import HistoryStore
+
+    writer = MappedHistoryWriter(path)
+    try:
+        if writer.count:
+            raise ValueError(f"{path} 已有 {writer.count} 条记录")
+        store = HistoryStore(directory, flush_interval=3600)
+        batch = []
+        for record in store.replay():
+            batch.append(record)
+            if len(batch) >= 100000:
+                writer.append_batch(sorted(batch, key=lambda record: record[0]))
+                batch = []
+        writer.append_batch(sorted(batch, key=lambda record: record[0]))
+        store.close()
+        return writer.count
+    finally:
+        writer.close()
+
+
+def check_store(directory, path):
+    """比较 history.bin 与分段中的记录，返回 (比较的条数, 不一致的条数)（需先停止采集程序）
+
+    history.bin 攒够一定比例的过期记录才重写，可能比分段多出一段旧记录，启用之前的记录只在分段中，
+    所以只比较两者都覆盖的时间范围；同一批内的顺序可能不同，按多重集合比较。
+    """
+    from collections import Counter
+
+    from history_store import HistoryStore
+
+    _record_dtype()
+    store = HistoryStore(directory, flush_interval=3600)
+    try:
+        with MappedHistory(path) as history:
+            records = history.records
+            first = store.first_timestamp()
+            if not len(records) or first is None:
+                return 0, 0
+            start = max(float(records['ts'][0]), first)
+            mapped = Counter((ts, temperature, humidity, history.device_name(device))
+                             for ts, temperature, humidity, device, _
+                             in records[bisect_left(records['ts'], start):].tolist())
+        # 二进制文件中温湿度是 float32，按同样的精度比较
+        stored = Counter((ts, float(np.float32(temperature)), float(np.float32(humidity)), device)
+                         for ts, temperature, humidity, device in store.replay() if ts >= start)
+    finally:
+        store.close()
+    compared = max(sum(mapped.values()), sum(stored.values()))
+    return compared, sum((mapped - stored).values()) + sum((stored - mapped).values())
+
+
+def _format(history, records):
+    for ts, temperature, humidity, device, _ in records.tolist():
+        name = history.device_name(device)
+        print(f"{datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')}  "
+              f"{temperature:6.1f} °C  {humidity:6.1f} %  {name or ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="定长二进制历史文件工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="显示记录数、时间范围和设备")
+    info.add_argument("path")
+    part = sub.add_parser("slice", help="输出时间范围内的记录")
+    part.add_argument("path")
+    part.add_argument("--start", help="开始时间 YYYY-mm-dd HH:MM:SS")
+    part.add_argument("--end", help="结束时间 YYYY-mm-dd HH:MM:SS")
+    part.add_argument("--device", help="只输出该设备")
+    part.add_argument("--limit", type=int, default=50, help="最多输出的条数")
+    follow = sub.add_parser("tail", help="持续输出新写入的记录")
+    follow.add_argument("path")
+    follow.add_argument("--interval", type=float, default=0.5)
+    load = sub.add_parser("import", help="从 HistoryStore 分段目录导入")
+    load.add_argument("directory")
+    load.add_argument("path")
+    check = sub.add_parser("check", help="与 HistoryStore 分段比较，检查导出是否一致")
+    check.add_argument("directory")
+    check.add_argument("path")
+    args = parser.parse_args(argv)
+
+    def parse_time(text):
+        return datetime.strptime(text, '%Y-%m-%d %H:%M:%S').timestamp() if text else None
+
+    if args.command == "import":
+        print(f"已导入 {import_store(args.directory, args.path)} 条记录")
+        return 0
+    if args.command == "check":
+        compared, mismatched = check_store(args.directory, args.path)
+        print(f"比较 {compared} 条，不一致 {mismatched} 条")
+        return 1 if mismatched else 0
+
+    with MappedHistory(args.path) as history:
+        if args.command == "info":
+            records = history.records
+            print(f"记录数: {len(records)}  文件: {os.path.getsize(args.path)} 字节")
+            if len(records):
+                first, last = records['ts'][0], records['ts'][-1]
+                print(f"时间范围: {datetime.fromtimestamp(first)} ~ {datetime.fromtimestamp(last)}")
+            print(f"设备: {', '.join(str(device) for device in history.devices)}")
+        elif args.command == "slice":
+            records = history.slice(parse_time(args.start), parse_time(args.end), args.device)
+            print(f"共 {len(records)} 条")
+            _format(history, records[-args.limit:] if args.limit else records)
+        else:
+            try:
+                for records in history.tail(args.interval):
+                    _format(history, records)
+            except KeyboardInterrupt:
+                pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
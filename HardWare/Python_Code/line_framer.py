@@ -0,0 +1,130 @@
+"""
+字节流分帧与记录解析
+只在新到达的字节中查找换行符，半行暂存在 bytearray 中；
+按行首两个字节查预先建立的分发表，数值直接从字节解析，不经过 str 解码。
+半行最多暂存 MAX_LINE 字节：长时间没有换行符的噪声（以及二进制分帧重新同步时跳过的字节）
+超过上限后丢弃到下一个换行符，计为格式错误，缓冲区不会无限增长。
+"""
+
+
+class LineFramer:
+    DATA_PREFIXES = (b'DATA:', b'D:')
+    RESPONSE_PREFIX = b'RESP:'
+    MAX_LINE = 256                          # 半行缓冲的上限（字节），固件发送的行远短于此
+
+    def __init__(self, on_data, on_response=None):
+        self.on_data = on_data              # on_data(temperature, humidity)
+        self.on_response = on_response      # on_response(text)
+        self.buffer = bytearray()           # 尚未收到换行符的半行
+        self._overflow = False              # 当前行超过 MAX_LINE，丢弃到下一个换行符
+
+        # 统计
+        self.bytes_received = 0
+        self.lines = 0
+        self.records = 0
+        self.responses = 0
+        self.malformed = 0
+        self.unknown = 0
+        self.lost = 0                       # 按序号检测到的丢失帧（只有二进制分帧会计数）
+
+        # 按行首两个字节预先建立的分发表：两字节 -> (完整前缀, 前缀长度, 是否为数据行)
+        self._dispatch = {}
+        for prefix in self.DATA_PREFIXES:
+            self._dispatch[prefix[:2]] = (prefix, len(prefix), True)
+        prefix = self.RESPONSE_PREFIX
+        self._dispatch[prefix[:2]] = (prefix, len(prefix), False)
+
+    def feed(self, data):
+        """送入新到达的字节，解析其中所有完整的行"""
+        self.bytes_received += len(data)
+        self._feed_lines(data)
+
+    def _feed_lines(self, data):
+        # 只在新到达的字节里找换行符，半行直接追加到 bytearray，不重复扫描
+        if self._overflow:
+            cut = data.find(b'\n')
+            if cut < 0:
+                return
+            self._overflow = False
+            data = data[cut + 1:]
+        if b'\n' not in data:
+            self.buffer += data
+            if len(self.buffer) > self.MAX_LINE:
+                self._drop_line()
+            return
+        if self.buffer:
+            self.buffer += data
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        elif not isinstance(data, bytes):
+            data = bytes(data)
+
+        lines = data.split(b'\n')
+        tail = lines.pop()
+        if tail:
+            self.buffer += tail
+            if len(self.buffer) > self.MAX_LINE:
+                self._drop_line()
+
+        # 热路径：计数先累加到局部变量，循环结束后再写回
+        dispatch = self._dispatch
+        on_data = self.on_data
+        count = records = malformed = unknown = 0
+        for line in lines:
+            entry = dispatch.get(line[:2])
+            if entry is None:
+                # 少见情况：空行或行首有空白
+                line = line.strip()
+                if not line:
+                    continue
+                entry = dispatch.get(line[:2])
+            count += 1
+            if entry is None or not line.startswith(entry[0]):
+                unknown += 1
+                continue
+            if not entry[2]:
+                self._parse_response(line, entry[1])
+                continue
+            try:
+                # float() 直接解析字节并忽略首尾空白（包括 \r），不需要先解码成 str
+                temperature, humidity = line[entry[1]:].split(b',')
+                temperature = float(temperature)
+                humidity = float(humidity)
+            except ValueError:
+                malformed += 1
+                continue
+            records += 1
+            on_data(temperature, humidity)
+
+        self.lines += count
+        self.records += records
+        self.malformed += malformed
+        self.unknown += unknown
+
+    def _drop_line(self):
+        """半行超过 MAX_LINE：丢弃已暂存的部分，计为一次格式错误，之后的字节丢弃到下一个换行符"""
+        self.buffer.clear()
+        self._overflow = True
+        self.malformed += 1
+
+    def _parse_response(self, line, offset):
+        self.responses += 1
+        if self.on_response:
+            self.on_response(line[offset:].decode('utf-8', errors='ignore').strip())
+
+    def reset(self):
+        """丢弃未完成的行"""
+        self.buffer.clear()
+        self._overflow = False
+
+    def stats(self):
+        """返回统计计数"""
+        return {
+            'bytes_received': self.bytes_received,
+            'lines': self.lines,
+            'records': self.records,
+            'responses': self.responses,
+            'malformed': self.malformed,
+            'unknown': self.unknown,
+            'lost': self.lost
+        }
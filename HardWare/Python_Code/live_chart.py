@@ -0,0 +1,278 @@
+"""
+实时温湿度曲线
+嵌入 Tk 窗口的 matplotlib 图表：曲线使用 blitting 局部重绘，
+坐标轴、刻度和阈值带只在视图范围变化时才整体重绘；
+数据直接从环形缓冲区零拷贝读取，按可见范围保形降采样后再绘制。
+缓冲区中有其他设备的记录时，曲线只显示选中的设备：每帧只把新追加的记录中属于该设备的部分
+复制到单独的连续数组，不再每帧筛选整个缓冲区。
+"""
+
+from datetime import datetime
+
+import matplotlib
+
+matplotlib.use('TkAgg')
+# 中文标签字体
+matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
+matplotlib.rcParams['axes.unicode_minus'] = False
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from downsample import minmax_downsample, visible_range
+
+
+class _DeviceSeries:
+    """一台设备的时间、温度、湿度列，连续存放；超过 capacity 条时丢弃最旧的记录"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._ts = np.empty(0, dtype=np.float64)
+        self._temp = np.empty(0, dtype=np.float32)
+        self._hum = np.empty(0, dtype=np.float32)
+        self._start = 0
+        self._end = 0
+
+    def extend(self, ts, temp, hum):
+        count = len(ts)
+        if not count:
+            return
+        if count > self.capacity:
+            ts, temp, hum = ts[-self.capacity:], temp[-self.capacity:], hum[-self.capacity:]
+            count = self.capacity
+        if self._end + count > len(self._ts):
+            # 空间不足时把保留的记录移到开头，数组最多为 capacity 的两倍，移动的开销均摊到每条记录是常数
+            keep = min(self._end - self._start, self.capacity - count)
+            size = min(max(2 * (keep + count), 1024), 2 * self.capacity)
+            columns = []
+            for column in (self._ts, self._temp, self._hum):
+                kept = column[self._end - keep:self._end].copy()
+                if size > len(column):
+                    column = np.empty(size, dtype=column.dtype)
+                column[:keep] = kept
+                columns.append(column)
+            self._ts, self._temp, self._hum = columns
+            self._start, self._end = 0, keep
+        end = self._end + count
+        self._ts[self._end:end] = ts
+        self._temp[self._end:end] = temp
+        self._hum[self._end:end] = hum
+        self._end = end
+        self._start = max(self._start, end - self.capacity)
+
+    def columns(self):
+        return (self._ts[self._start:self._end], self._temp[self._start:self._end],
+                self._hum[self._start:self._end])
+
+
+class LiveChart:
+    def __init__(self, parent, history, window=600.0, max_points=2000):
+        self.history = history
+        self.window = window                # 跟随模式下显示的时间跨度（秒）
+        self.max_points = max_points        # 每条曲线最多绘制的点数
+        self.device_code = 0
+        # 缓冲区中只有当前设备的记录时 _series 为 None，直接使用零拷贝视图
+        self._series = None
+        self._view = None
+        self._seen = 0                      # 已处理到的累计追加数
+        self._generation = None             # 缓冲区被清空后重新建立
+        self.follow = True                  # 跟随最新数据；缩放或平移后自动关闭
+        self._background = None
+        self._setting_limits = False
+        self._bands = []
+        self._band_values = []
+
+        self.figure = Figure(figsize=(8, 3), dpi=100)
+        self.temp_ax = self.figure.add_subplot(211)
+        self.hum_ax = self.figure.add_subplot(212, sharex=self.temp_ax)
+        self.temp_ax.set_ylabel("温度(°C)")
+        self.hum_ax.set_ylabel("湿度(%)")
+        self.temp_ax.tick_params(labelbottom=False)
+        self.hum_ax.xaxis.set_major_formatter(FuncFormatter(self._format_time))
+        for ax in (self.temp_ax, self.hum_ax):
+            ax.grid(True, alpha=0.3)
+
+        # animated=True：曲线不参与整体重绘，由 blit 单独绘制
+        self.temp_line, = self.temp_ax.plot([], [], color='tab:red', linewidth=1, animated=True)
+        self.hum_line, = self.hum_ax.plot([], [], color='tab:blue', linewidth=1, animated=True)
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=parent)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, parent, pack_toolbar=False)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.temp_ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+
+    @property
+    def widget(self):
+        return self.canvas.get_tk_widget()
+
+    # ---------- 数据 ----------
+
+    def _sync(self):
+        """处理上次以来新追加的记录，每帧只看新记录"""
+        view, appended, generation = self.history.snapshot()
+        self._view = view
+        new = appended - self._seen
+        if generation != self._generation or new > len(view):
+            self._rebuild(view)
+        elif new:
+            devices = np.frombuffer(view.devices, dtype=np.uint16)[-new:]
+            if self._series is None:
+                if (devices != self.device_code).any():
+                    self._rebuild(view)
+            else:
+                mask = devices == self.device_code
+                if mask.any():
+                    self._series.extend(np.frombuffer(view.timestamps, dtype=np.float64)[-new:][mask],
+                                        np.frombuffer(view.temperatures, dtype=np.float32)[-new:][mask],
+                                        np.frombuffer(view.humidities, dtype=np.float32)[-new:][mask])
+        self._seen = appended
+        self._generation = generation
+
+    def _rebuild(self, view):
+        """切换设备、缓冲区被清空或出现其他设备的记录时，筛选一次整个缓冲区"""
+        devices = np.frombuffer(view.devices, dtype=np.uint16)
+        mask = devices == self.device_code
+        if mask.all():
+            self._series = None
+            return
+        self._series = _DeviceSeries(self.history.capacity)
+        self._series.extend(np.frombuffer(view.timestamps, dtype=np.float64)[mask],
+                            np.frombuffer(view.temperatures, dtype=np.float32)[mask],
+                            np.frombuffer(view.humidities, dtype=np.float32)[mask])
+
+    def _columns(self):
+        """当前设备的时间、温度、湿度列（NumPy 数组，不复制）"""
+        if self._view is None:
+            self._sync()
+        if self._series is not None:
+            return self._series.columns()
+        view = self._view
+        return (np.frombuffer(view.timestamps, dtype=np.float64),
+                np.frombuffer(view.temperatures, dtype=np.float32),
+                np.frombuffer(view.humidities, dtype=np.float32))
+
+    def _visible_data(self, start, end):
+        ts, temp, hum = self._columns()
+        lo, hi = visible_range(ts, start, end)
+        ts, temp, hum = ts[lo:hi], temp[lo:hi], hum[lo:hi]
+        buckets = self.max_points // 2
+        return minmax_downsample(ts, temp, buckets), minmax_downsample(ts, hum, buckets)
+
+    # ---------- 绘制 ----------
+
+    def _format_time(self, value, pos=None):
+        start, end = self.hum_ax.get_xlim()
+        fmt = '%m-%d %H:%M' if end - start > 86400 else '%H:%M:%S'
+        try:
+            return datetime.fromtimestamp(value).strftime(fmt)
+        except (ValueError, OSError, OverflowError):
+            return ""
+
+    def _on_draw(self, event):
+        """整体重绘后保存背景，并把曲线画上去"""
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.temp_ax.draw_artist(self.temp_line)
+        self.hum_ax.draw_artist(self.hum_line)
+
+    def _blit(self):
+        self.canvas.restore_region(self._background)
+        self.temp_ax.draw_artist(self.temp_line)
+        self.hum_ax.draw_artist(self.hum_line)
+        self.canvas.blit(self.figure.bbox)
+
+    def _set_xlim(self, start, end):
+        self._setting_limits = True
+        try:
+            self.temp_ax.set_xlim(start, end)
+        finally:
+            self._setting_limits = False
+
+    def _fit_ylim(self, ax, values, band):
+        """数据或阈值带超出当前纵轴范围时扩展纵轴，返回是否发生变化"""
+        if not len(values):
+            return False
+        low = min(float(values.min()), band[0])
+        high = max(float(values.max()), band[1])
+        bottom, top = ax.get_ylim()
+        if low >= bottom and high <= top:
+            return False
+        margin = max((high - low) * 0.1, 1.0)
+        ax.set_ylim(low - margin, high + margin)
+        return True
+
+    def refresh(self):
+        """有新数据时调用：视图范围不变只 blit 曲线，否则整体重绘"""
+        self._sync()
+        ts, _, _ = self._columns()
+        if not len(ts):
+            return
+
+        full_redraw = self._background is None
+        start, end = self.temp_ax.get_xlim()
+        if self.follow and (ts[-1] > end or ts[-1] < start):
+            # 留出20%的右侧空白，避免每个新点都移动坐标轴
+            start = ts[-1] - self.window * 0.8
+            end = start + self.window
+            self._set_xlim(start, end)
+            full_redraw = True
+
+        (temp_x, temp_y), (hum_x, hum_y) = self._visible_data(start, end)
+        self.temp_line.set_data(temp_x, temp_y)
+        self.hum_line.set_data(hum_x, hum_y)
+
+        if self._fit_ylim(self.temp_ax, temp_y, self._band_limits(0)):
+            full_redraw = True
+        if self._fit_ylim(self.hum_ax, hum_y, self._band_limits(1)):
+            full_redraw = True
+
+        if full_redraw:
+            self.canvas.draw_idle()
+        else:
+            self._blit()
+
+    def _band_limits(self, index):
+        if index < len(self._band_values):
+            return self._band_values[index]
+        return (float('inf'), float('-inf'))
+
+    def _on_xlim_changed(self, ax):
+        """用户缩放或平移：停止跟随，并按新的可见范围重新降采样"""
+        if self._setting_limits:
+            return
+        self.follow = False
+        start, end = ax.get_xlim()
+        (temp_x, temp_y), (hum_x, hum_y) = self._visible_data(start, end)
+        self.temp_line.set_data(temp_x, temp_y)
+        self.hum_line.set_data(hum_x, hum_y)
+
+    # ---------- 控制 ----------
+
+    def set_device(self, device_code):
+        """切换显示的设备"""
+        if device_code != self.device_code:
+            self.device_code = device_code
+            self._generation = None
+            self._background = None
+            self.temp_line.set_data([], [])
+            self.hum_line.set_data([], [])
+            self.canvas.draw_idle()
+            self.refresh()
+
+    def set_thresholds(self, temp_min, temp_max, hum_min, hum_max):
+        """显示阈值范围"""
+        for band in self._bands:
+            band.remove()
+        self._band_values = [(temp_min, temp_max), (hum_min, hum_max)]
+        self._bands = [
+            self.temp_ax.axhspan(temp_min, temp_max, color='tab:green', alpha=0.1),
+            self.hum_ax.axhspan(hum_min, hum_max, color='tab:green', alpha=0.1)
+        ]
+        self._fit_ylim(self.temp_ax, np.array([temp_min, temp_max]), (temp_min, temp_max))
+        self._fit_ylim(self.hum_ax, np.array([hum_min, hum_max]), (hum_min, hum_max))
+        self.canvas.draw_idle()
+
+    def follow_latest(self):
+        """恢复跟随最新数据"""
+        self.follow = True
+        self.refresh()
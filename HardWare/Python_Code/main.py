@@ -1,260 +1,42 @@
-import serial
-import serial.tools.list_ports
-import threading
-import time
 import json
 import os
+import threading
+import time
 from datetime import datetime
-from queue import Queue
+from queue import Empty, SimpleQueue
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import matplotlib
-
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-
-class BluetoothMonitor:
-    def __init__(self):
-        self.serial_port = None
-        self.is_connected = False
-        self.data_queue = Queue()
-        self.command_queue = Queue()
-        self.running = False
-        self.config_file = "config.json"
-        self.history_file = "history.json"
-        self.config = self.load_config()
-        self.history = self.load_history()
-
-    def load_config(self):
-        """加载配置文件"""
-        default_config = {
-            "port": "COM10",
-            "baudrate": 9600,
-            "temp_min": 18.0,
-            "temp_max": 30.0,
-            "hum_min": 30.0,
-            "hum_max": 80.0,
-            "auto_connect": False
-        }
-
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    # 更新默认配置
-                    for key in default_config:
-                        if key in config:
-                            default_config[key] = config[key]
-            except:
-                pass
-        return default_config
-
-    def save_config(self):
-        """保存配置文件"""
-        with open(self.config_file, 'w') as f:
-            json.dump(self.config, f, indent=2)
-
-    def load_history(self):
-        """加载历史数据"""
-        history = []
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r') as f:
-                    history = json.load(f)
-            except:
-                pass
-        return history
-
-    def save_history(self):
-        """保存历史数据"""
-        # 只保留最近100条记录
-        if len(self.history) > 100:
-            self.history = self.history[-100:]
-
-        with open(self.history_file, 'w') as f:
-            json.dump(self.history, f, indent=2)
-
-    def get_available_ports(self):
-        """获取可用串口列表"""
-        ports = serial.tools.list_ports.comports()
-        return [port.device for port in ports]
-
-    def connect(self, port=None, baudrate=9600):
-        """连接蓝牙设备"""
-        if self.is_connected:
-            self.disconnect()
-
-        try:
-            port = port or self.config['port']
-            baudrate = baudrate or self.config['baudrate']
-
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                timeout=1,  # 缩短超时时间
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                bytesize=serial.EIGHTBITS
-            )
-
-            time.sleep(1)  # 缩短等待时间
-
-            # 清空缓冲区
-            self.serial_port.reset_input_buffer()
-            self.serial_port.reset_output_buffer()
-
-            # 发送连接命令
-            self.send_command("CONNECT")
-            time.sleep(0.3)
-
-            self.is_connected = True
-            self.running = True
-
-            # 启动数据接收线程
-            self.receive_thread = threading.Thread(target=self.receive_data, daemon=True)
-            self.receive_thread.start()
-
-            # 更新配置
-            self.config['port'] = port
-            self.config['baudrate'] = baudrate
-            self.save_config()
-
-            return True
-
-        except Exception as e:
-            print(f"连接失败: {e}")
-            return False
-
-    def disconnect(self):
-        """断开连接"""
-        if self.is_connected:
-            try:
-                self.send_command("DISCONNECT")
-                time.sleep(0.3)
-            except:
-                pass
-
-            self.running = False
-            self.is_connected = False
-
-            if self.serial_port and self.serial_port.is_open:
-                self.serial_port.close()
-
-    def send_command(self, command):
-        """发送命令到Arduino"""
-        if self.serial_port and self.serial_port.is_open:
-            try:
-                self.serial_port.write((command + '\n').encode('utf-8'))
-                self.serial_port.flush()  # 确保数据立即发送
-            except Exception as e:
-                print(f"发送命令失败: {e}")
 
-    def receive_data(self):
-        """接收数据线程 - 优化版本"""
-        buffer = ""
-        while self.running and self.is_connected:
-            try:
-                if self.serial_port and self.serial_port.in_waiting > 0:
-                    # 读取所有可用数据
-                    raw_data = self.serial_port.read(self.serial_port.in_waiting)
-                    buffer += raw_data.decode('utf-8', errors='ignore')
-
-                    # 按行分割处理
-                    lines = buffer.split('\n')
-                    buffer = lines[-1]  # 保留未完成的行
-
-                    for line in lines[:-1]:  # 处理完整的行
-                        line = line.strip()
-                        if not line:
-                            continue
-
-                        # 解析数据 - 支持两种格式
-                        if line.startswith('DATA:'):
-                            data_str = line.replace('DATA:', '')
-                            parts = data_str.split(',')
-                            if len(parts) == 2:
-                                self._process_sensor_data(parts[0], parts[1])
-                        elif line.startswith('D:'):  # 优化后的格式
-                            data_str = line.replace('D:', '')
-                            parts = data_str.split(',')
-                            if len(parts) == 2:
-                                self._process_sensor_data(parts[0], parts[1])
-                        elif line.startswith('RESP:'):
-                            response = line.replace('RESP:', '')
-                            print(f"设备响应: {response}")
-
-            except Exception as e:
-                print(f"接收数据错误: {e}")
-                break
-
-            time.sleep(0.02)  # 缩短睡眠时间，提高响应速度
-
-    def _process_sensor_data(self, temp_str, hum_str):
-        """处理传感器数据"""
-        try:
-            temperature = float(temp_str)
-            humidity = float(hum_str)
-
-            # 创建数据记录
-            record = {
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': temperature,
-                'humidity': humidity
-            }
-
-            # 添加到历史记录
-            self.history.append(record)
-
-            # 放入队列供GUI使用
-            self.data_queue.put(record)
-
-            # 定期保存历史数据（每5条保存一次）
-            if len(self.history) % 5 == 0:
-                self.save_history()
-
-        except ValueError:
-            pass
-
-    def get_latest_data(self):
-        """获取最新数据"""
-        if not self.data_queue.empty():
-            return self.data_queue.get()
-        return None
-
-    def set_thresholds(self, temp_min, temp_max, hum_min, hum_max):
-        """设置阈值"""
-        self.config['temp_min'] = temp_min
-        self.config['temp_max'] = temp_max
-        self.config['hum_min'] = hum_min
-        self.config['hum_max'] = hum_max
-
-        # 发送到设备
-        command = f"SET_THRESHOLD,{temp_min},{temp_max},{hum_min},{hum_max}"
-        self.send_command(command)
-
-        # 保存配置
-        self.save_config()
-
-    def request_data(self):
-        """请求数据"""
-        self.send_command("GET_DATA")
-
-    def get_history(self, limit=50):
-        """获取历史数据"""
-        return self.history[-limit:] if self.history else []
+from bluetooth_monitor import BluetoothMonitor, config_template
+from exporter import HistoryExporter
 
 
 class EnvironmentalMonitorGUI:
+    HISTORY_ROWS = 20       # 历史数据区域显示的行数
+    HISTORY_FIRST_ROW = 3   # 表头和分隔线之后的第一行
+
     def __init__(self):
-        self.monitor = BluetoothMonitor()
+        # 历史数据在后台线程中加载，窗口可以立即显示
+        self.monitor = BluetoothMonitor(background_load=True)
+        self.exporter = HistoryExporter(self.monitor)
         self.current_data = None
+        self.chart = None
+        self._chart_device_count = 0
+        self._chart_device_chosen = False
+        self._last_state = None
+        self._history_empty = True
+        self._history_shown = False
+        self._last_stats = 0.0
+        self._ports_version = 0
+
+        # 报警事件在报警线程中产生，经队列交给界面线程显示
+        self._alert_events = SimpleQueue()
+        self.monitor.alerts.listeners.append(self._alert_events.put)
 
         # 创建主窗口
         self.root = tk.Tk()
         self.root.title("环境监测系统")
-        self.root.geometry("900x700")
+        self.root.geometry("900x1000")
         self.root.configure(bg='#f0f0f0')
 
         # 设置样式
@@ -264,15 +46,28 @@ class EnvironmentalMonitorGUI:
         # 创建UI
         self.setup_ui()
 
-        # 启动数据更新线程
+        # 按显示帧率在主线程中合并刷新
         self.running = True
-        self.update_thread = threading.Thread(target=self.update_data, daemon=True)
-        self.update_thread.start()
+        self.frame_interval = max(1, int(1000 / self.monitor.config['ui_frame_rate']))
+        self.root.after(self.frame_interval, self.update_data)
+
+        # matplotlib 导入较慢，等窗口先显示出来再创建曲线图
+        self.root.after(50, self._create_chart)
+
+        # 本机 Prometheus 指标端点
+        self.monitor.start_metrics_server()
+
+        # 热插拔监视：串口列表在后台更新，update_data 发现变化后刷新下拉框
+        self.monitor.port_registry.start()
 
         # 自动连接（如果配置了）
         if self.monitor.config['auto_connect']:
             self.connect_bluetooth()
 
+        # 打开配置文件中的其他设备
+        if self.monitor.config['devices']:
+            self._run_in_background(self.monitor.connect_devices)
+
     def setup_ui(self):
         """设置用户界面"""
         # 创建主框架
@@ -336,6 +131,14 @@ class EnvironmentalMonitorGUI:
         self.time_label = ttk.Label(data_frame, text="最后更新: --", font=('Arial', 9))
         self.time_label.grid(row=4, column=0, pady=(20, 0))
 
+        # 最近一条报警
+        self.alert_label = ttk.Label(data_frame, text="报警: 无", font=('Arial', 9), wraplength=280)
+        self.alert_label.grid(row=5, column=0, pady=(5, 0))
+
+        # 滚动统计（窗口由 stats_windows 配置）
+        self.rolling_label = ttk.Label(data_frame, text="", font=('Courier', 9), justify=tk.LEFT)
+        self.rolling_label.grid(row=6, column=0, sticky=tk.W, pady=(10, 0))
+
         # 3. 阈值设置区域
         threshold_frame = ttk.LabelFrame(main_frame, text="阈值设置", padding="10")
         threshold_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -374,9 +177,19 @@ class EnvironmentalMonitorGUI:
         ttk.Button(threshold_frame, text="发送到设备",
                    command=self.send_thresholds_to_device).grid(row=5, column=0, columnspan=4)
 
-        # 4. 历史数据区域
+        # 4. 实时曲线区域
+        chart_frame = ttk.LabelFrame(main_frame, text="实时曲线", padding="10")
+        chart_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        chart_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(2, weight=1)
+
+        self.chart_frame = chart_frame
+        self.chart_placeholder = ttk.Label(chart_frame, text="正在加载图表...")
+        self.chart_placeholder.grid(row=0, column=0, pady=20)
+
+        # 5. 历史数据区域
         history_frame = ttk.LabelFrame(main_frame, text="历史数据", padding="10")
-        history_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        history_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
 
         # 创建文本框显示历史数据
         self.history_text = scrolledtext.ScrolledText(history_frame, height=10, width=80)
@@ -395,9 +208,42 @@ class EnvironmentalMonitorGUI:
         ttk.Button(button_frame, text="导出数据",
                    command=self.export_data).pack(side=tk.LEFT, padx=5)
 
-        # 5. 控制按钮区域
+        ttk.Button(button_frame, text="取消导出",
+                   command=self.exporter.cancel).pack(side=tk.LEFT, padx=5)
+
+        # 导出选项：格式和时间范围（留空表示不限）
+        export_frame = ttk.Frame(history_frame)
+        export_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+
+        ttk.Label(export_frame, text="格式:").pack(side=tk.LEFT)
+        self.export_format_var = tk.StringVar(value="csv")
+        ttk.Combobox(export_frame, textvariable=self.export_format_var,
+                     values=list(HistoryExporter.FORMATS), state="readonly",
+                     width=8).pack(side=tk.LEFT, padx=(5, 10))
+
+        ttk.Label(export_frame, text="开始:").pack(side=tk.LEFT)
+        self.export_start_var = tk.StringVar()
+        ttk.Entry(export_frame, textvariable=self.export_start_var,
+                  width=17).pack(side=tk.LEFT, padx=(5, 10))
+
+        ttk.Label(export_frame, text="结束:").pack(side=tk.LEFT)
+        self.export_end_var = tk.StringVar()
+        ttk.Entry(export_frame, textvariable=self.export_end_var,
+                  width=17).pack(side=tk.LEFT, padx=(5, 10))
+
+        self.export_progress = ttk.Progressbar(export_frame, maximum=100, length=150)
+        self.export_progress.pack(side=tk.LEFT, padx=5)
+        self.export_label = ttk.Label(export_frame, text="")
+        self.export_label.pack(side=tk.LEFT, padx=5)
+
+        # 6. 控制按钮区域
+        stats_frame = ttk.LabelFrame(main_frame, text="运行统计", padding="10")
+        stats_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.stats_label = ttk.Label(stats_frame, text="--", font=('Consolas', 9), justify=tk.LEFT)
+        self.stats_label.grid(row=0, column=0, sticky=tk.W)
+
         control_frame = ttk.Frame(main_frame)
-        control_frame.grid(row=3, column=0, columnspan=2, pady=(10, 0))
+        control_frame.grid(row=5, column=0, columnspan=2, pady=(10, 0))
 
         ttk.Button(control_frame, text="请求数据",
                    command=self.request_data).pack(side=tk.LEFT, padx=5)
@@ -408,15 +254,83 @@ class EnvironmentalMonitorGUI:
         ttk.Button(control_frame, text="退出",
                    command=self.on_closing).pack(side=tk.LEFT, padx=5)
 
-        # 初始刷新端口列表
+        # 初始刷新端口列表（后台枚举）
         self.refresh_ports()
 
         # 初始刷新历史数据
         self.refresh_history()
 
+    def _create_chart(self):
+        """创建实时曲线（此时才导入 matplotlib）"""
+        from live_chart import LiveChart
+
+        self.chart_placeholder.destroy()
+        self.chart = LiveChart(self.chart_frame, self.monitor.history,
+                               window=self.monitor.config['chart_window'],
+                               max_points=self.monitor.config['chart_max_points'])
+        self.chart.widget.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.chart.toolbar.grid(row=1, column=0, sticky=tk.W)
+
+        # 曲线只显示选中的设备，未选择时显示第一台发来数据的设备
+        controls = ttk.Frame(self.chart_frame)
+        controls.grid(row=1, column=1, sticky=tk.E)
+        ttk.Label(controls, text="设备:").grid(row=0, column=0, padx=(0, 5))
+        self.chart_device_var = tk.StringVar()
+        self.chart_device_combo = ttk.Combobox(controls, textvariable=self.chart_device_var,
+                                               state='readonly', width=12)
+        self.chart_device_combo.grid(row=0, column=1)
+        self.chart_device_combo.bind('<<ComboboxSelected>>', self._on_chart_device_selected)
+        ttk.Button(controls, text="跟随最新",
+                   command=self.chart.follow_latest).grid(row=0, column=2, padx=(10, 0))
+        self._update_chart_devices()
+        self.chart.set_thresholds(self.monitor.config['temp_min'], self.monitor.config['temp_max'],
+                                  self.monitor.config['hum_min'], self.monitor.config['hum_max'])
+        self.chart.refresh()
+
+    def _update_chart_devices(self):
+        """设备列表变化时更新曲线的设备下拉框"""
+        devices = list(self.monitor.device_ids)
+        self._chart_device_count = len(devices)
+        self.chart_device_combo['values'] = devices
+
+    def _on_chart_device_selected(self, event=None):
+        self._chart_device_chosen = True
+        self.chart.set_device(self.monitor.device_code(self.chart_device_var.get()))
+
+    def _select_chart_device(self, device):
+        """还没有选择设备时，曲线显示第一台发来数据的设备"""
+        self._chart_device_chosen = True
+        self.chart_device_var.set(device)
+        self.chart.set_device(self.monitor.device_code(device))
+
+    def _run_in_background(self, func, callback=None, *args):
+        """在后台线程中执行耗时操作，完成后在主线程中调用 callback(result)"""
+        result = {}
+
+        def worker():
+            try:
+                result['value'] = func(*args)
+            except Exception as e:
+                print(f"后台任务失败: {e}")
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+
+        def poll():
+            if thread.is_alive():
+                self.root.after(50, poll)
+            elif callback is not None and self.running:
+                callback(result.get('value'))
+
+        self.root.after(50, poll)
+
     def refresh_ports(self):
-        """刷新串口列表"""
-        ports = self.monitor.get_available_ports()
+        """刷新串口列表（在后台枚举串口，不阻塞界面）"""
+        self._run_in_background(self.monitor.get_available_ports, self._set_ports)
+
+    def _set_ports(self, ports):
+        if ports is None:
+            return
         self.port_combo['values'] = ports
         if ports and self.port_var.get() not in ports:
             self.port_var.set(ports[0])
@@ -432,18 +346,34 @@ class EnvironmentalMonitorGUI:
         # 更新自动连接配置
         self.monitor.config['auto_connect'] = self.auto_connect_var.get()
 
-        # 连接设备
-        if self.monitor.connect(port):
+        # 在后台连接设备，连接过程中的等待不阻塞界面
+        self.connect_btn.config(state='disabled')
+        self.status_label.config(text="状态: 连接中...")
+        self._run_in_background(self.monitor.connect,
+                                lambda connected: self._on_connect_finished(port, connected),
+                                port)
+
+    def _on_connect_finished(self, port, connected):
+        """连接完成后在主线程中更新界面"""
+        if connected:
             self.connect_btn.config(state='disabled')
             self.disconnect_btn.config(state='normal')
             self.status_label.config(text="状态: 已连接")
             messagebox.showinfo("成功", f"已连接到 {port}")
         else:
+            self.connect_btn.config(state='normal')
+            self.status_label.config(text="状态: 未连接")
             messagebox.showerror("错误", f"无法连接到 {port}")
 
     def disconnect_bluetooth(self):
-        """断开蓝牙连接"""
-        self.monitor.disconnect()
+        """断开蓝牙连接（在后台等待重连线程退出和设备确认，不阻塞界面）"""
+        self.connect_btn.config(state='disabled')
+        self.disconnect_btn.config(state='disabled')
+        self.status_label.config(text="状态: 正在断开...")
+        self._run_in_background(self.monitor.disconnect, lambda _: self._on_disconnect_finished())
+
+    def _on_disconnect_finished(self):
+        """断开完成后在主线程中更新界面"""
         self.connect_btn.config(state='normal')
         self.disconnect_btn.config(state='disabled')
         self.status_label.config(text="状态: 未连接")
@@ -470,21 +400,48 @@ class EnvironmentalMonitorGUI:
                 messagebox.showerror("错误", "湿度最小值必须小于最大值")
                 return
 
-            # 保存到配置
-            self.monitor.set_thresholds(temp_min, temp_max, hum_min, hum_max)
+            # 保存到配置（未连接时发送命令的 Future 直接失败，忽略即可）
+            future = self.monitor.set_thresholds(temp_min, temp_max, hum_min, hum_max)
+            if self.chart is not None:
+                self.chart.set_thresholds(temp_min, temp_max, hum_min, hum_max)
             messagebox.showinfo("成功", "阈值已保存")
+            return future
 
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数值")
 
     def send_thresholds_to_device(self):
-        """发送阈值到设备"""
+        """发送阈值到设备，收到设备确认后提示"""
         if not self.monitor.is_connected:
             messagebox.showwarning("警告", "请先连接设备")
             return
 
-        self.apply_thresholds()  # 先应用阈值
-        messagebox.showinfo("成功", "阈值已发送到设备")
+        future = self.apply_thresholds()  # 先应用阈值
+        if future is not None:
+            self._when_done(future, self._on_thresholds_sent)
+
+    def _on_thresholds_sent(self, future):
+        try:
+            reply = future.result()
+        except Exception as e:
+            messagebox.showerror("错误", f"阈值发送失败: {e}")
+            return
+        if reply.startswith("THRESHOLD_SET"):
+            messagebox.showinfo("成功", "阈值已发送到设备")
+        else:
+            messagebox.showerror("错误", f"设备回应: {reply}")
+
+    def _when_done(self, future, callback):
+        """命令完成后在主线程中调用 callback(future)，等待期间不阻塞界面"""
+        def poll():
+            if not self.running:
+                return
+            if future.done():
+                callback(future)
+            else:
+                self.root.after(50, poll)
+
+        self.root.after(50, poll)
 
     def request_data(self):
         """请求数据"""
@@ -496,10 +453,16 @@ class EnvironmentalMonitorGUI:
 
     def refresh_history(self):
         """刷新历史数据显示"""
-        history = self.monitor.get_history(20)  # 获取最近20条记录
+        history = self.monitor.get_history(self.HISTORY_ROWS)  # 获取最近20条记录
 
         self.history_text.delete(1.0, tk.END)
 
+        if not self.monitor.history_loaded.is_set():
+            self._history_empty = True
+            self.history_text.insert(tk.END, "正在加载历史数据...")
+            return
+
+        self._history_empty = not history
         if not history:
             self.history_text.insert(tk.END, "无历史数据")
             return
@@ -510,37 +473,89 @@ class EnvironmentalMonitorGUI:
         self.history_text.insert(tk.END, "-" * 40 + "\n")
 
         # 添加数据行
-        for record in reversed(history):  # 最新数据显示在最上面
-            line = f"{record['timestamp']:<20} {record['temperature']:<10.1f} {record['humidity']:<10.1f}\n"
-            self.history_text.insert(tk.END, line)
+        lines = []
+        for timestamp, temperature, humidity in reversed(history):  # 最新数据显示在最上面
+            time_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            lines.append(f"{time_str:<20} {temperature:<10.1f} {humidity:<10.1f}\n")
+        self.history_text.insert(tk.END, ''.join(lines))
+
+    def append_history_rows(self, records):
+        """只把新记录插入到历史区域顶部，并删除超出显示行数的旧行"""
+        if self._history_empty:
+            self.refresh_history()
+            return
+
+        records = records[-self.HISTORY_ROWS:]
+        lines = [f"{record['timestamp']:<20} {record['temperature']:<10.1f} {record['humidity']:<10.1f}\n"
+                 for record in reversed(records)]
+        self.history_text.insert(f"{self.HISTORY_FIRST_ROW}.0", ''.join(lines))
+        self.history_text.delete(f"{self.HISTORY_FIRST_ROW + self.HISTORY_ROWS}.0", tk.END)
 
     def clear_history(self):
         """清空历史数据"""
         if messagebox.askyesno("确认", "确定要清空所有历史数据吗？"):
-            self.monitor.history = []
-            self.monitor.save_history()
-            self.refresh_history()
+            # 历史还在后台加载时要先中止加载，在后台线程中等待，不阻塞界面
+            self._run_in_background(self.monitor.clear_history, lambda _: self.refresh_history())
+
+    @staticmethod
+    def _parse_time(text):
+        """解析导出时间范围，留空返回 None"""
+        text = text.strip()
+        if not text:
+            return None
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                return datetime.strptime(text, fmt).timestamp()
+            except ValueError:
+                continue
+        raise ValueError(f"无法识别的时间: {text}（格式: YYYY-MM-DD HH:MM）")
 
     def export_data(self):
-        """导出数据到文件"""
-        if not self.monitor.history:
+        """在后台线程中导出磁盘上的历史数据"""
+        if self.exporter.running:
+            messagebox.showinfo("提示", "正在导出，请稍候")
+            return
+        if self.monitor.store.is_empty():
             messagebox.showinfo("提示", "没有数据可导出")
             return
 
-        filename = f"environment_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                # 写入表头
-                f.write("时间,温度(°C),湿度(%)\n")
+            start = self._parse_time(self.export_start_var.get())
+            end = self._parse_time(self.export_end_var.get())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
 
-                # 写入数据
-                for record in self.monitor.history:
-                    f.write(f"{record['timestamp']},{record['temperature']:.1f},{record['humidity']:.1f}\n")
+        fmt = self.export_format_var.get()
+        filename = f"environment_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{HistoryExporter.FORMATS[fmt]}"
+
+        self.exporter.start(filename, fmt, start, end)
+        self.export_progress['value'] = 0
+        self.export_label.config(text="导出中...")
+        self.root.after(100, self._poll_export)
+
+    def _poll_export(self):
+        """在主线程中轮询导出进度"""
+        exporter = self.exporter
+        self.export_progress['value'] = exporter.progress * 100
+        self.export_label.config(text=f"{exporter.rows} 条")
+        if not exporter.finished:
+            if self.running:
+                self.root.after(100, self._poll_export)
+            return
 
-            messagebox.showinfo("成功", f"数据已导出到 {filename}")
-        except Exception as e:
-            messagebox.showerror("错误", f"导出失败: {e}")
+        if exporter.error is not None:
+            self.export_label.config(text="导出失败")
+            messagebox.showerror("错误", f"导出失败: {exporter.error}")
+        elif exporter.cancelled:
+            self.export_label.config(text="已取消")
+            messagebox.showinfo("提示", f"导出已取消，已写入 {exporter.rows} 条到 {exporter.filename}")
+        elif not exporter.rows:
+            self.export_label.config(text="没有数据")
+            messagebox.showinfo("提示", f"所选时间范围内没有数据，已导出只有表头的文件 {exporter.filename}")
+        else:
+            self.export_label.config(text=f"完成 {exporter.rows} 条")
+            messagebox.showinfo("成功", f"数据已导出到 {exporter.filename}")
 
     def save_config(self):
         """保存配置"""
@@ -553,31 +568,64 @@ class EnvironmentalMonitorGUI:
             messagebox.showerror("错误", f"保存失败: {e}")
 
     def update_data(self):
-        """更新数据线程 - 优化版本"""
-        while self.running:
-            try:
-                # 获取最新数据，批量处理避免UI阻塞
-                data_count = 0
-                while data_count < 5 and not self.monitor.data_queue.empty():
-                    data = self.monitor.get_latest_data()
-                    if data:
-                        self.current_data = data
-                        # 在主线程中更新UI
-                        self.root.after(0, self.update_ui, data)
-                        data_count += 1
-                    else:
-                        break
-
-                # 更新端口状态
-                if self.monitor.is_connected:
-                    self.root.after(0, self.update_status_connected)
-                else:
-                    self.root.after(0, self.update_status_disconnected)
+        """按帧合并刷新 - 每帧取出队列中所有新数据，只刷新一次界面"""
+        if not self.running:
+            return
 
-            except Exception as e:
-                print(f"更新数据错误: {e}")
+        try:
+            records = self.monitor.get_pending_data()
+
+            if records:
+                # 数据到达到显示的延迟
+                now = time.time()
+                for record in records:
+                    self.monitor.display_latency.observe(now - record['received_at'])
+                self.current_data = records[-1]
+                self.update_ui(records[-1])
+                self.append_history_rows(records)
+                if self.chart is not None:
+                    if len(self.monitor.device_ids) != self._chart_device_count:
+                        self._update_chart_devices()
+                    if not self._chart_device_chosen:
+                        self._select_chart_device(records[-1]['device'])
+                    self.chart.refresh()
+
+            # 后台历史加载完成后刷新一次历史区域和曲线
+            if not self._history_shown and self.monitor.history_loaded.is_set():
+                self._history_shown = True
+                self.refresh_history()
+                if self.chart is not None:
+                    self.chart.refresh()
+
+            # 串口插入或拔出后刷新下拉框
+            version = self.monitor.port_registry.version
+            if version != self._ports_version:
+                self._ports_version = version
+                self._set_ports(self.monitor.get_available_ports())
+
+            # 报警引擎产生的报警和解除
+            self.show_alerts()
+
+            # 运行统计每秒刷新一次
+            if time.time() - self._last_stats >= 1.0:
+                self._last_stats = time.time()
+                self.update_stats()
+
+            # 连接状态只在变化时更新（连接中由 connect_bluetooth 显示）
+            state = self.monitor.state
+            if state != self._last_state:
+                self._last_state = state
+                if state == self.monitor.CONNECTED:
+                    self.update_status_connected()
+                elif state == self.monitor.RECONNECTING:
+                    self.update_status_reconnecting()
+                elif state == self.monitor.DISCONNECTED:
+                    self.update_status_disconnected()
+
+        except Exception as e:
+            print(f"更新数据错误: {e}")
 
-            time.sleep(0.1)  # 缩短更新间隔
+        self.root.after(self.frame_interval, self.update_data)
 
     def update_ui(self, data):
         """更新UI显示"""
@@ -588,34 +636,93 @@ class EnvironmentalMonitorGUI:
         self.temp_label.config(text=f"{temp:.1f} °C")
         self.hum_label.config(text=f"{hum:.1f} %")
 
-        # 根据阈值改变颜色
-        temp_min = self.temp_min_var.get()
-        temp_max = self.temp_max_var.get()
-        hum_min = self.hum_min_var.get()
-        hum_max = self.hum_max_var.get()
-
-        if temp < temp_min or temp > temp_max:
-            self.temp_label.config(foreground='red')
-        else:
-            self.temp_label.config(foreground='black')
-
-        if hum < hum_min or hum > hum_max:
-            self.hum_label.config(foreground='red')
-        else:
-            self.hum_label.config(foreground='black')
+        # 读数超出阈值立即标红；报警（带回差和最短持续时间）由报警线程产生，显示在报警标签中
+        self.update_threshold_colors(data)
 
         # 更新时间
         self.time_label.config(text=f"最后更新: {data['timestamp']}")
 
-        # 自动刷新历史数据显示
-        self.refresh_history()
+        self.update_rolling_stats(data['device'])
+
+    @staticmethod
+    def _window_name(seconds):
+        if seconds >= 3600 and seconds % 3600 == 0:
+            return f"{seconds / 3600:g}小时"
+        if seconds >= 60 and seconds % 60 == 0:
+            return f"{seconds / 60:g}分钟"
+        return f"{seconds:g}秒"
+
+    def update_rolling_stats(self, device):
+        """显示设备的露点、EWMA 和各窗口的均值±标准差与范围"""
+        stats = self.monitor.get_statistics(device)
+        if stats is None:
+            return
+        dew = stats['dew_point']
+        lines = [f"露点 {dew['last']:.1f} °C" if dew['last'] is not None else "露点 --",
+                 f"EWMA 温度 {stats['temperature']['ewma']:.1f} 湿度 {stats['humidity']['ewma']:.1f}"]
+        for seconds in self.monitor.rolling.windows:
+            for channel, name in (('temperature', "温度"), ('humidity', "湿度")):
+                window = stats[channel]['windows'][seconds]
+                if window is not None:
+                    lines.append(f"{self._window_name(seconds)} {name} {window['mean']:.1f}±{window['std']:.2f} "
+                                 f"[{window['min']:.1f}, {window['max']:.1f}]")
+        self.rolling_label.config(text="\n".join(lines))
+
+    def update_threshold_colors(self, data):
+        """根据阈值改变颜色"""
+        violations = {name for name, *_ in self.monitor.check_thresholds(
+            data['temperature'], data['humidity'], data['device'])}
+        self.temp_label.config(foreground='red' if "温度" in violations else 'black')
+        self.hum_label.config(foreground='red' if "湿度" in violations else 'black')
+
+    def show_alerts(self):
+        """显示报警线程产生的新事件"""
+        event = None
+        try:
+            while True:
+                event = self._alert_events.get_nowait()
+        except Empty:
+            pass
+        if event is None:
+            return
+        # 还有未解除的报警时保持红色
+        self.alert_label.config(text=f"[{event['timestamp'][11:]}] {event['message']}",
+                                foreground='red' if self.monitor.alerts.active else 'black')
+
+    def update_stats(self):
+        """刷新运行统计面板"""
+        stats = self.monitor.metrics.snapshot()
+
+        def ms(value):
+            return "--" if value is None else f"{value * 1000:g}"
+
+        latency = stats['display_latency_seconds']
+        flush = stats['flush_duration_seconds']
+        errors = stats['receive_errors_total'] + stats['send_errors_total'] + stats['device_errors_total']
+        last_reconnect = self.monitor.last_reconnect_seconds
+        self.stats_label.config(text=(
+            f"字节 {stats['bytes_received_total']}  行 {stats['lines_total']}  "
+            f"记录 {stats['records_parsed_total']}  解析失败 {stats['parse_failures_total']}  "
+            f"未知行 {stats['unknown_lines_total']}  丢帧 {stats['lost_frames_total']}\n"
+            f"队列 {stats['data_queue_depth']}  丢弃 {stats['data_queue_dropped_total']}  "
+            f"合并 {stats['data_queue_coalesced_total']}  "
+            f"显示延迟 p50≤{ms(latency['p50'])}ms p99≤{ms(latency['p99'])}ms\n"
+            f"落盘 {flush['count']}次 p99≤{ms(flush['p99'])}ms  "
+            f"断线 {stats['link_drops_total']}  重连 {stats['reconnects_total']}"
+            f"{f' (上次 {last_reconnect:.1f}s)' if last_reconnect is not None else ''}  错误 {errors}"
+        ))
 
     def update_status_connected(self):
         """更新连接状态为已连接"""
-        if not self.connect_btn.cget('state') == 'disabled':
-            self.connect_btn.config(state='disabled')
-            self.disconnect_btn.config(state='normal')
-            self.status_label.config(text="状态: 已连接")
+        self.connect_btn.config(state='disabled')
+        self.disconnect_btn.config(state='normal')
+        self.status_label.config(text="状态: 已连接")
+
+    def update_status_reconnecting(self):
+        """链路失效后自动重连中：可以点击断开停止重连"""
+        self.connect_btn.config(state='disabled')
+        self.disconnect_btn.config(state='normal')
+        self.status_label.config(text="状态: 连接中断，正在重连...")
 
     def update_status_disconnected(self):
         """更新连接状态为未连接"""
@@ -632,8 +739,19 @@ class EnvironmentalMonitorGUI:
     def on_closing(self):
         """关闭窗口时的处理"""
         self.running = False
-        self.monitor.disconnect()
-        self.root.destroy()
+        self.exporter.cancel()
+        # 断开连接、等待后台加载和落盘可能需要数秒，先隐藏窗口，在后台线程中关闭后再销毁窗口
+        self.root.withdraw()
+        thread = threading.Thread(target=self.monitor.close, daemon=True)
+        thread.start()
+
+        def poll():
+            if thread.is_alive():
+                self.root.after(50, poll)
+            else:
+                self.root.destroy()
+
+        poll()
 
     def run(self):
         """运行GUI"""
@@ -641,18 +759,6 @@ class EnvironmentalMonitorGUI:
         self.root.mainloop()
 
 
-# 配置文件模板
-config_template = {
-    "port": "COM10",
-    "baudrate": 9600,
-    "temp_min": 18.0,
-    "temp_max": 30.0,
-    "hum_min": 30.0,
-    "hum_max": 80.0,
-    "auto_connect": False
-}
-
-
 if __name__ == "__main__":
     # 检查是否需要创建配置文件
     if not os.path.exists("config.json"):
@@ -0,0 +1,176 @@
+"""
+运行指标
+计数器、直方图和按需计算的采集项，可以渲染成 Prometheus 文本格式，
+并由 MetricsServer 在本机 HTTP 端口上提供 /metrics 供抓取。
+热路径上的计数（字节数、行数、解析失败）直接读取 LineFramer 已有的计数器，不增加额外开销。
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Counter:
+    """单调递增计数器"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """固定分桶的直方图（桶上界单位为秒）"""
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)     # 最后一个桶是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """按分桶估计分位数（返回所在桶的上界），没有数据时返回 None"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="env_monitor"):
+        self.prefix = prefix
+        self._metrics = []      # (名称, 类型, 说明, 对象或回调)
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _register(self, name, kind, help_text, item):
+        with self._lock:
+            self._metrics.append((f"{self.prefix}_{name}", kind, help_text, item))
+        return item
+
+    def counter(self, name, help_text):
+        return self._register(name, 'counter', help_text, Counter())
+
+    def histogram(self, name, help_text, buckets=Histogram.DEFAULT_BUCKETS):
+        return self._register(name, 'histogram', help_text, Histogram(buckets))
+
+    def gauge(self, name, help_text, func):
+        """抓取时调用 func() 取值"""
+        self._register(name, 'gauge', help_text, func)
+
+    def collector(self, name, kind, help_text, func):
+        """抓取时调用 func()，返回 [(标签字典, 数值), ...]，用于按设备区分的指标"""
+        self._register(name, kind, help_text, func)
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+    def render(self):
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for name, kind, help_text, item in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(item, Histogram):
+                cumulative = 0
+                for bound, count in zip(item.bounds, item.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {item.count}')
+                lines.append(f"{name}_sum {item.sum}")
+                lines.append(f"{name}_count {item.count}")
+                continue
+            if isinstance(item, Counter):
+                samples = [({}, item.value)]
+            else:
+                try:
+                    samples = item()
+                except Exception:
+                    continue
+                if not isinstance(samples, list):
+                    samples = [({}, samples)]
+            for labels, value in samples:
+                lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """以字典形式返回当前值（按设备的指标已求和），供界面显示"""
+        with self._lock:
+            metrics = list(self._metrics)
+        result = {}
+        for name, kind, help_text, item in metrics:
+            key = name[len(self.prefix) + 1:]
+            if isinstance(item, Histogram):
+                result[key] = {'count': item.count, 'sum': item.sum,
+                               'p50': item.quantile(0.5), 'p99': item.quantile(0.99)}
+            elif isinstance(item, Counter):
+                result[key] = item.value
+            else:
+                try:
+                    samples = item()
+                except Exception:
+                    continue
+                if isinstance(samples, list):
+                    samples = sum(value for _, value in samples)
+                result[key] = samples
+        return result
+
+
+class MetricsServer:
+    """在本机端口上提供 /metrics（Prometheus 文本格式）"""
+
+    def __init__(self, registry, port=9108, host="127.0.0.1"):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,181 @@
+"""
+串口并行探测
+同时探测所有串口，找出运行本固件的传感器：
+每个串口按可能性从高到低尝试波特率，发送 AT 和 STATUS 后等待回应，
+收到可识别的内容（RESP: 响应、D: 数据、二进制帧、HC-05 的 AT 回应 OK）立即结束，
+收到无法识别的字节说明波特率不对，立即换下一个，不做固定时长的等待。
+
+用法:
+    python port_probe.py                    # 探测所有串口并输出表格
+    python port_probe.py --json --first     # 找到第一个传感器即停止，输出 JSON
+    python port_probe.py --ports /dev/rfcomm0 COM10 --baudrates 9600 38400
+已知设备（port_cache.json 中有记录）先尝试上次成功的波特率，找到的传感器写回缓存。
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+from binary_framer import BinaryFramer
+from port_registry import PortRegistry
+
+# 固件默认 9600；HC-05 AT 模式默认 38400；其余为常见配置
+DEFAULT_BAUDRATES = (9600, 38400, 115200, 57600, 19200)
+# 固件会把 AT 当作未知命令回应 RESP:UNKNOWN_CMD，AT 模式下的 HC-05 回应 OK
+PROBE_COMMAND = b"AT\r\nSTATUS\r\n"
+# 收到这么多字节仍无法识别，认为波特率不对
+GARBAGE_LIMIT = 32
+
+
+def list_ports():
+    """所有串口的 (设备名, 描述, 硬件ID)"""
+    return [(port.device, port.description, port.hwid) for port in serial.tools.list_ports.comports()]
+
+
+def probe_baudrate(port, baudrate, timeout=0.5, stop=None):
+    """以指定波特率探测一次，返回 (类型, 回应)；类型为 sensor、at、garbage 或 None（无回应）"""
+    found = []
+
+    def on_data(temperature, humidity):
+        found.append(('sensor', f"D:{temperature},{humidity}"))
+
+    def on_response(response):
+        found.append(('sensor', f"RESP:{response}"))
+
+    framer = BinaryFramer(on_data, on_response)
+    received = bytearray()
+    with serial.Serial(port=port, baudrate=baudrate, timeout=0, write_timeout=timeout) as ser:
+        ser.reset_input_buffer()
+        ser.write(PROBE_COMMAND)
+        deadline = time.monotonic() + timeout
+        while not found:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or stop is not None and stop.is_set():
+                break
+            # 阻塞到第一个字节到达或超时，再取走已到达的全部字节
+            ser.timeout = min(remaining, 0.1) if stop is not None else remaining
+            data = ser.read(1)
+            if not data:
+                continue
+            data += ser.read(ser.in_waiting)
+            received += data
+            framer.feed(data)
+            if not found:
+                if b"OK" in received:
+                    return 'at', received.decode('ascii', errors='replace').strip()
+                if framer.unknown or framer.malformed or len(received) >= GARBAGE_LIMIT:
+                    return 'garbage', bytes(received[:GARBAGE_LIMIT]).hex()
+    if found:
+        return found[0]
+    return None, None
+
+
+def probe_port(port, baudrates=DEFAULT_BAUDRATES, timeout=0.5, stop=None):
+    """依次尝试各波特率，返回探测结果字典"""
+    result = {'port': port, 'baudrate': None, 'kind': None, 'response': None,
+              'attempts': [], 'error': None}
+    start = time.monotonic()
+    for baudrate in baudrates:
+        if stop is not None and stop.is_set():
+            break
+        try:
+            kind, response = probe_baudrate(port, baudrate, timeout, stop)
+        except (serial.SerialException, OSError, ValueError) as e:
+            result['error'] = str(e)
+            # 串口打不开（被占用、无权限）时换波特率也没用
+            if not result['attempts']:
+                break
+            continue
+        result['attempts'].append({'baudrate': baudrate, 'kind': kind})
+        if kind in ('sensor', 'at'):
+            result.update(baudrate=baudrate, kind=kind, response=response, error=None)
+            break
+        if kind == 'garbage' and result['kind'] is None:
+            result.update(kind='unknown', response=response)
+    result['elapsed'] = round(time.monotonic() - start, 3)
+    return result
+
+
+def probe_ports(ports=None, baudrates=DEFAULT_BAUDRATES, timeout=0.5, first=False, workers=32,
+                registry=None):
+    """并行探测多个串口（默认全部串口），first 为 True 时找到第一个传感器即停止其余探测；
+    给出 registry（PortRegistry）时已知设备先尝试缓存的波特率，结果写回缓存"""
+    if registry is not None:
+        registry.scan()
+        info = dict(registry.ports)
+    else:
+        info = {device: (description, hwid) for device, description, hwid in list_ports()}
+    if ports is None:
+        ports = sorted(info)
+    if not ports:
+        return []
+
+    stop = threading.Event() if first else None
+
+    def run(port):
+        order = baudrates
+        entry = registry.lookup(port) if registry is not None else None
+        if entry and entry.get('baudrate'):
+            order = [entry['baudrate']] + [b for b in baudrates if b != entry['baudrate']]
+        result = probe_port(port, order, timeout, stop)
+        result['cached'] = entry is not None
+        if result['kind'] == 'sensor':
+            if registry is not None:
+                registry.remember(port, baudrate=result['baudrate'])
+            if stop is not None:
+                stop.set()
+        description, hwid = info.get(port, (None, None))
+        result['description'] = description
+        result['hwid'] = hwid
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(ports))) as executor:
+        return list(executor.map(run, ports))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行探测串口，查找环境监测传感器")
+    parser.add_argument("--ports", nargs="+", help="只探测这些串口（默认全部）")
+    parser.add_argument("--baudrates", nargs="+", type=int, default=list(DEFAULT_BAUDRATES),
+                        help="按顺序尝试的波特率")
+    parser.add_argument("--timeout", type=float, default=0.5, help="每个波特率等待回应的最长时间（秒）")
+    parser.add_argument("--first", action="store_true", help="找到第一个传感器即停止")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--cache", default="port_cache.json", help="串口缓存文件")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不更新串口缓存")
+    args = parser.parse_args(argv)
+
+    registry = None if args.no_cache else PortRegistry(args.cache)
+    start = time.monotonic()
+    results = probe_ports(args.ports, args.baudrates, args.timeout, args.first, registry=registry)
+    elapsed = time.monotonic() - start
+    sensors = [result for result in results if result['kind'] == 'sensor']
+
+    if args.json:
+        print(json.dumps({'elapsed': round(elapsed, 3), 'sensors': [r['port'] for r in sensors],
+                          'ports': results}, ensure_ascii=False, indent=2))
+    else:
+        if not results:
+            print("没有找到任何串口设备")
+        for result in results:
+            if result['kind'] in ('sensor', 'at'):
+                status = f"{'传感器' if result['kind'] == 'sensor' else 'HC-05 AT 模式'} " \
+                         f"@ {result['baudrate']}  {result['response']}"
+            elif result['error']:
+                status = f"错误: {result['error']}"
+            elif result['kind'] == 'unknown':
+                status = "有数据但无法识别"
+            else:
+                status = "无响应"
+            print(f"{result['port']:<24} {status}  ({result['elapsed']:.2f}s)")
+        print(f"共 {len(results)} 个串口，找到 {len(sensors)} 个传感器，用时 {elapsed:.2f}s")
+    return 0 if sensors else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,162 @@
+"""
+串口登记与热插拔监视
+记住每个适配器（按硬件ID，即 BluetoothConnectionTester 显示的 port.hwid）上次成功连接时的
+串口名、波特率和协议（text/binary），保存在 port_cache.json 中；
+后台线程在设备插入和拔出时更新串口列表，界面和连接逻辑直接读取结果，不再每次重新枚举。
+Linux 上安装了 pyudev 时由 udev 事件唤醒，否则按固定间隔检查。
+"""
+
+import json
+import os
+import threading
+import time
+
+import serial.tools.list_ports
+
+
+class PortRegistry:
+    def __init__(self, cache_file="port_cache.json", interval=2.0):
+        self.cache_file = cache_file
+        self.interval = interval
+        self.ports = {}                 # 当前存在的串口：设备名 -> (描述, 硬件ID)
+        self.known = self._load()       # 指纹 -> {'port', 'baudrate', 'protocol', 'last_seen'}
+        self.version = 0                # 串口列表每次变化加1，界面据此判断是否需要刷新
+        self.listeners = []             # listener(added, removed)，在监视线程中调用
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._scanned = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def fingerprint(port, hwid):
+        """缓存键：有硬件ID时用硬件ID，否则（蓝牙 rfcomm、虚拟串口等）用串口名"""
+        if hwid and hwid != 'n/a':
+            return hwid
+        return f"port:{port}"
+
+    def _load(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取串口缓存失败: {e}")
+        return {}
+
+    def save(self):
+        """写入临时文件后替换，连接线程和接收线程同时保存时不会写坏文件"""
+        with self._save_lock:
+            with self._lock:
+                known = json.dumps(self.known, indent=2, ensure_ascii=False)
+            temp_file = self.cache_file + ".tmp"
+            try:
+                with open(temp_file, 'w') as f:
+                    f.write(known)
+                os.replace(temp_file, self.cache_file)
+            except OSError as e:
+                print(f"保存串口缓存失败: {e}")
+
+    # ---------- 串口列表 ----------
+
+    def scan(self):
+        """枚举一次串口，返回 (新增的串口, 移除的串口)"""
+        current = {port.device: (port.description, port.hwid)
+                   for port in serial.tools.list_ports.comports()}
+        with self._lock:
+            added = sorted(set(current) - set(self.ports))
+            removed = sorted(set(self.ports) - set(current))
+            self.ports = current
+            self._scanned = True
+            if added or removed:
+                self.version += 1
+        if added or removed:
+            for listener in list(self.listeners):
+                try:
+                    listener(added, removed)
+                except Exception as e:
+                    print(f"串口变化回调错误: {e}")
+        return added, removed
+
+    def available_ports(self):
+        """当前串口名列表；监视线程未运行且尚未枚举过时枚举一次"""
+        if not self._scanned:
+            self.scan()
+        with self._lock:
+            return sorted(self.ports)
+
+    def start(self):
+        """启动热插拔监视线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _watch(self):
+        udev = None
+        try:
+            import pyudev
+            context = pyudev.Context()
+            udev = pyudev.Monitor.from_netlink(context)
+            udev.filter_by('tty')
+            udev.start()
+        except Exception:
+            udev = None
+
+        try:
+            self.scan()
+        except Exception as e:
+            print(f"枚举串口失败: {e}")
+        while not self._stop.is_set():
+            if udev is not None:
+                # 有 tty 设备事件时立即重新枚举，超时后也检查一次
+                udev.poll(timeout=self.interval)
+                if self._stop.is_set():
+                    break
+            elif self._stop.wait(self.interval):
+                break
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"枚举串口失败: {e}")
+
+    # ---------- 设备缓存 ----------
+
+    def lookup(self, port):
+        """当前位于 port 上的设备的缓存记录，没有时返回 None"""
+        self.available_ports()
+        with self._lock:
+            info = self.ports.get(port)
+            key = self.fingerprint(port, info[1] if info else None)
+            entry = self.known.get(key)
+            return dict(entry) if entry else None
+
+    def resolve(self, port):
+        """返回 (实际串口, 缓存记录)：port 已不存在但同一适配器出现在其他串口上时返回新的串口名"""
+        self.available_ports()
+        with self._lock:
+            if port not in self.ports:
+                for device, (description, hwid) in self.ports.items():
+                    entry = self.known.get(self.fingerprint(device, hwid))
+                    if entry and entry.get('port') == port:
+                        return device, dict(entry)
+        return port, self.lookup(port)
+
+    def remember(self, port, **fields):
+        """记录 port 上的设备连接成功时的参数（baudrate、protocol 等）并写入缓存文件"""
+        self.available_ports()
+        with self._lock:
+            info = self.ports.get(port)
+            key = self.fingerprint(port, info[1] if info else None)
+            entry = self.known.setdefault(key, {})
+            entry.update(fields)
+            entry['port'] = port
+            entry['last_seen'] = time.time()
+        self.save()
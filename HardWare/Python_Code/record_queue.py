@@ -0,0 +1,120 @@
+"""
+有界记录队列
+采集线程和界面/采集程序之间的交接队列，容量有上限，消费跟不上时按策略处理：
+  drop_oldest        队列满时丢弃最旧的记录（默认）
+  latest_per_device  每个设备只保留最新一条，新记录覆盖同一设备尚未取走的记录
+  block              队列满时采集线程最多等待 put_timeout 秒，仍满则丢弃新记录
+接口与 queue.Queue 的 put/get/get_nowait/qsize/empty 一致，另外提供 drain() 一次取出全部记录。
+"""
+
+import threading
+from collections import OrderedDict, deque
+from queue import Empty
+
+
+class BoundedRecordQueue:
+    POLICIES = ("drop_oldest", "latest_per_device", "block")
+
+    def __init__(self, maxsize=10000, policy="drop_oldest", put_timeout=0.1, key='device'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的队列策略: {policy}（可选 {', '.join(self.POLICIES)}）")
+        if maxsize <= 0:
+            raise ValueError("队列容量必须大于0")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.key = key                  # latest_per_device 按记录中的这个字段合并
+
+        self._coalesce = policy == "latest_per_device"
+        self._items = OrderedDict() if self._coalesce else deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        # 统计
+        self.put_count = 0
+        self.dropped = 0                # 因队列满被丢弃的记录
+        self.coalesced = 0              # 被同一设备的新记录覆盖的记录
+        self.high_water = 0             # 队列长度的最大值
+
+    def put(self, record):
+        """放入一条记录，返回 False 表示新记录被丢弃（只有 block 策略会发生）"""
+        with self._lock:
+            items = self._items
+            self.put_count += 1
+            if self._coalesce:
+                key = record[self.key]
+                if key in items:
+                    # 同一设备尚未取走的记录直接覆盖，保持原来的排队位置
+                    items[key] = record
+                    self.coalesced += 1
+                    return True
+                if len(items) >= self.maxsize:
+                    items.popitem(last=False)
+                    self.dropped += 1
+                items[key] = record
+            elif self.policy == "drop_oldest":
+                if len(items) >= self.maxsize:
+                    items.popleft()
+                    self.dropped += 1
+                items.append(record)
+            else:
+                if not self._not_full.wait_for(lambda: len(items) < self.maxsize, self.put_timeout):
+                    self.dropped += 1
+                    return False
+                items.append(record)
+
+            if len(items) > self.high_water:
+                self.high_water = len(items)
+            self._not_empty.notify()
+            return True
+
+    def _pop(self):
+        if self._coalesce:
+            return self._items.popitem(last=False)[1]
+        return self._items.popleft()
+
+    def get(self, block=True, timeout=None):
+        """取出最早的一条记录，没有记录时按 queue.Queue 的约定抛出 Empty"""
+        with self._lock:
+            if not block or timeout is not None and timeout <= 0:
+                if not self._items:
+                    raise Empty
+            elif not self._not_empty.wait_for(lambda: self._items, timeout):
+                raise Empty
+            record = self._pop()
+            self._not_full.notify()
+            return record
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def drain(self, max_items=None):
+        """一次取出所有（最多 max_items 条）记录，不阻塞"""
+        with self._lock:
+            count = len(self._items) if max_items is None else min(max_items, len(self._items))
+            records = [self._pop() for _ in range(count)]
+            if records:
+                self._not_full.notify_all()
+            return records
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        """返回统计计数"""
+        return {
+            'policy': self.policy,
+            'maxsize': self.maxsize,
+            'depth': len(self._items),
+            'high_water': self.high_water,
+            'put': self.put_count,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,150 @@
+"""
+滚动统计
+每条读数到达时增量更新每个设备、每个通道（温度、湿度、露点）的统计量，每条读数的开销是常数，与窗口长短无关：
+  滑动窗口均值/方差  Welford 算法，新读数加入、移出窗口的读数减去
+  滑动窗口最小/最大  单调队列，每条读数最多入队、出队各一次
+  EWMA              按时间常数 ewma_tau 和相邻读数的间隔计算平滑系数，读数间隔不均匀时也一致
+窗口按时间（秒）计算，可以同时维护多个窗口。
+"""
+
+import math
+import threading
+from collections import deque
+
+# 露点（Magnus 公式，Sonntag 1990 系数，-45~60 °C 内误差约 0.35 °C）
+MAGNUS_B = 17.62
+MAGNUS_C = 243.12
+
+CHANNELS = ('temperature', 'humidity', 'dew_point')
+
+
+def dew_point(temperature, humidity):
+    """由温度（°C）和相对湿度（%）计算露点（°C），湿度不大于0时返回 None"""
+    if humidity <= 0:
+        return None
+    gamma = math.log(humidity / 100.0) + MAGNUS_B * temperature / (MAGNUS_C + temperature)
+    return MAGNUS_C * gamma / (MAGNUS_B - gamma)
+
+
+class RollingWindow:
+    """一个通道在一个时间窗口内的计数、均值、方差、最小值、最大值"""
+    __slots__ = ('seconds', 'samples', 'mean', 'm2', 'minimum', 'maximum')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()          # 窗口内的 (时间, 数值)
+        self.mean = 0.0
+        self.m2 = 0.0                   # 与均值之差的平方和
+        self.minimum = deque()          # 数值递增的单调队列，队首为窗口最小值
+        self.maximum = deque()          # 数值递减的单调队列，队首为窗口最大值
+
+    def add(self, timestamp, value):
+        # 移出窗口的读数（均摊 O(1)：每条读数只移出一次）
+        samples = self.samples
+        cutoff = timestamp - self.seconds
+        while samples and samples[0][0] <= cutoff:
+            old = samples.popleft()[1]
+            count = len(samples)
+            if count:
+                delta = old - self.mean
+                self.mean -= delta / count
+                self.m2 -= delta * (old - self.mean)
+            else:
+                self.mean = self.m2 = 0.0
+        minimum, maximum = self.minimum, self.maximum
+        while minimum and minimum[0][0] <= cutoff:
+            minimum.popleft()
+        while maximum and maximum[0][0] <= cutoff:
+            maximum.popleft()
+
+        # 加入新读数（三个队列共用同一个元组）
+        item = (timestamp, value)
+        samples.append(item)
+        delta = value - self.mean
+        self.mean += delta / len(samples)
+        self.m2 += delta * (value - self.mean)
+        while minimum and minimum[-1][1] >= value:
+            minimum.pop()
+        minimum.append(item)
+        while maximum and maximum[-1][1] <= value:
+            maximum.pop()
+        maximum.append(item)
+
+    def snapshot(self):
+        count = len(self.samples)
+        if not count:
+            return None
+        # 减去移出的读数时有舍入误差，方差可能略小于0
+        variance = max(self.m2, 0.0) / (count - 1) if count > 1 else 0.0
+        return {
+            'count': count,
+            'mean': self.mean,
+            'std': math.sqrt(variance),
+            'min': self.minimum[0][1],
+            'max': self.maximum[0][1]
+        }
+
+
+class ChannelStats:
+    """一个通道：最新值、EWMA 和各个时间窗口"""
+    __slots__ = ('windows', 'tau', 'last', 'last_time', 'ewma')
+
+    def __init__(self, windows, tau):
+        self.windows = [RollingWindow(seconds) for seconds in windows]
+        self.tau = tau
+        self.last = None
+        self.last_time = None
+        self.ewma = None
+
+    def add(self, timestamp, value):
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            elapsed = max(timestamp - self.last_time, 0.0)
+            alpha = 1.0 - math.exp(-elapsed / self.tau) if self.tau > 0 else 1.0
+            self.ewma += alpha * (value - self.ewma)
+        self.last = value
+        self.last_time = timestamp
+        for window in self.windows:
+            window.add(timestamp, value)
+
+    def snapshot(self):
+        return {
+            'last': self.last,
+            'ewma': self.ewma,
+            'windows': {window.seconds: window.snapshot() for window in self.windows}
+        }
+
+
+class RollingStats:
+    def __init__(self, windows=(60.0, 600.0), ewma_tau=30.0):
+        self.windows = tuple(windows)
+        self.ewma_tau = ewma_tau
+        self._devices = {}              # 设备 -> {通道: ChannelStats}
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, temperature, humidity, device):
+        """加入一条读数（接收线程调用）"""
+        with self._lock:
+            channels = self._devices.get(device)
+            if channels is None:
+                channels = self._devices[device] = {
+                    channel: ChannelStats(self.windows, self.ewma_tau) for channel in CHANNELS}
+            channels['temperature'].add(timestamp, temperature)
+            channels['humidity'].add(timestamp, humidity)
+            dew = dew_point(temperature, humidity)
+            if dew is not None:
+                channels['dew_point'].add(timestamp, dew)
+
+    def get(self, device):
+        """设备各通道的统计：{通道: {'last', 'ewma', 'windows': {秒: {'count', 'mean', 'std', 'min', 'max'}}}}，
+        没有读数时返回 None"""
+        with self._lock:
+            channels = self._devices.get(device)
+            if channels is None:
+                return None
+            return {channel: stats.snapshot() for channel, stats in channels.items()}
+
+    def devices(self):
+        with self._lock:
+            return list(self._devices)
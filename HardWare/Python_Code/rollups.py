@@ -0,0 +1,256 @@
+"""
+多分辨率汇总
+数据到达时增量维护每分钟、每小时、每天的 最小值/最大值/平均值/条数，
+分钟桶关闭后汇入小时桶，小时桶关闭后汇入天桶；
+关闭的桶追加写入历史目录下的 rollup_<层级>.jsonl，长时间范围的查询直接读取汇总层。
+"""
+
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+class _Bucket:
+    """正在累计的桶"""
+    __slots__ = ('start', 'count', 't_min', 't_max', 't_sum', 'h_min', 'h_max', 'h_sum')
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.t_min = self.h_min = float('inf')
+        self.t_max = self.h_max = float('-inf')
+        self.t_sum = self.h_sum = 0.0
+
+    def add(self, temperature, humidity):
+        self.count += 1
+        self.t_sum += temperature
+        self.h_sum += humidity
+        if temperature < self.t_min:
+            self.t_min = temperature
+        if temperature > self.t_max:
+            self.t_max = temperature
+        if humidity < self.h_min:
+            self.h_min = humidity
+        if humidity > self.h_max:
+            self.h_max = humidity
+
+    def merge(self, count, t_min, t_max, t_sum, h_min, h_max, h_sum):
+        self.count += count
+        self.t_sum += t_sum
+        self.h_sum += h_sum
+        self.t_min = min(self.t_min, t_min)
+        self.t_max = max(self.t_max, t_max)
+        self.h_min = min(self.h_min, h_min)
+        self.h_max = max(self.h_max, h_max)
+
+    def values(self):
+        return (self.count, self.t_min, self.t_max, self.t_sum,
+                self.h_min, self.h_max, self.h_sum)
+
+
+class _Series:
+    """一个设备在一个层级上已关闭的桶（按列存储）"""
+    COLUMNS = ('count', 't_min', 't_max', 't_sum', 'h_min', 'h_max', 'h_sum')
+
+    def __init__(self):
+        self.starts = array('d')
+        self.columns = {name: array('d') for name in self.COLUMNS}
+
+    def append(self, start, values):
+        self.starts.append(start)
+        for name, value in zip(self.COLUMNS, values):
+            self.columns[name].append(value)
+
+
+class RollupTier:
+    def __init__(self, name, interval, directory):
+        self.name = name
+        self.interval = interval
+        self.path = os.path.join(directory, f"rollup_{name}.jsonl")
+        self.series = {}        # device -> _Series
+        self.open = {}          # device -> _Bucket
+        self.parent = None
+        self._file = None
+
+    def bucket_start(self, timestamp, utc_offset):
+        """按本地时间对齐的桶起始时间"""
+        return timestamp - (timestamp + utc_offset) % self.interval
+
+    def last_end(self, device):
+        series = self.series.get(device)
+        if series is None or not series.starts:
+            return None
+        return series.starts[-1] + self.interval
+
+    def load(self, cutoff=None):
+        """读取已持久化的桶，cutoff 之前的桶被丢弃并重写文件"""
+        if not os.path.exists(self.path):
+            return
+        dropped = 0
+        lines = []
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                    start = entry['start']
+                    values = tuple(entry[name] for name in _Series.COLUMNS)
+                except (ValueError, KeyError, TypeError):
+                    dropped += 1
+                    continue
+                if cutoff is not None and start < cutoff:
+                    dropped += 1
+                    continue
+                self.series.setdefault(entry.get('device'), _Series()).append(start, values)
+                lines.append(raw.rstrip(b'\n'))
+
+        if dropped:
+            tmp = self.path + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(b'\n'.join(lines) + (b'\n' if lines else b''))
+            os.replace(tmp, self.path)
+
+    def _persist(self, device, bucket):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        entry = {'start': bucket.start}
+        if device is not None:
+            entry['device'] = device
+        entry.update(zip(_Series.COLUMNS, bucket.values()))
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def add_bucket(self, device, start, values, utc_offset):
+        """汇入下一级已关闭的桶"""
+        self._roll(device, start, utc_offset).merge(*values)
+
+    def add_sample(self, device, timestamp, temperature, humidity, utc_offset):
+        self._roll(device, timestamp, utc_offset).add(temperature, humidity)
+
+    def _roll(self, device, timestamp, utc_offset):
+        """返回 timestamp 所在的桶，跨过桶边界时关闭旧桶"""
+        start = self.bucket_start(timestamp, utc_offset)
+        bucket = self.open.get(device)
+        # 时钟回拨或迟到的数据计入当前桶，保证桶起始时间单调递增
+        if bucket is not None and bucket.start >= start:
+            return bucket
+        if bucket is not None and bucket.count:
+            self._close(device, bucket, utc_offset)
+        bucket = self.open[device] = _Bucket(start)
+        return bucket
+
+    def _close(self, device, bucket, utc_offset):
+        self.series.setdefault(device, _Series()).append(bucket.start, bucket.values())
+        self._persist(device, bucket)
+        if self.parent is not None:
+            self.parent.add_bucket(device, bucket.start, bucket.values(), utc_offset)
+
+    def query(self, device, start, end, include_open=True):
+        """返回 [start, end) 范围内的桶（列字典）"""
+        series = self.series.get(device)
+        result = {'start': [], 'count': [],
+                  'temperature_min': [], 'temperature_max': [], 'temperature_mean': [],
+                  'humidity_min': [], 'humidity_max': [], 'humidity_mean': []}
+        rows = []
+        if series is not None:
+            lo = bisect_left(series.starts, start - self.interval + 1e-9)
+            hi = bisect_left(series.starts, end)       # 起始时间等于 end 的桶不在范围内
+            columns = series.columns
+            for i in range(lo, hi):
+                rows.append((series.starts[i],) + tuple(columns[name][i] for name in _Series.COLUMNS))
+        bucket = self.open.get(device)
+        if include_open and bucket is not None and bucket.count and \
+                bucket.start < end and bucket.start + self.interval > start:
+            rows.append((bucket.start,) + bucket.values())
+
+        for row_start, count, t_min, t_max, t_sum, h_min, h_max, h_sum in rows:
+            result['start'].append(row_start)
+            result['count'].append(int(count))
+            result['temperature_min'].append(t_min)
+            result['temperature_max'].append(t_max)
+            result['temperature_mean'].append(t_sum / count)
+            result['humidity_min'].append(h_min)
+            result['humidity_max'].append(h_max)
+            result['humidity_mean'].append(h_sum / count)
+        return result
+
+    def clear(self):
+        self.close()
+        self.series = {}
+        self.open = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class RollupTiers:
+    TIERS = (("minute", 60), ("hour", 3600), ("day", 86400))
+
+    def __init__(self, directory="history", minute_retention_days=180):
+        os.makedirs(directory, exist_ok=True)
+        self.tiers = [RollupTier(name, interval, directory) for name, interval in self.TIERS]
+        for child, parent in zip(self.tiers, self.tiers[1:]):
+            child.parent = parent
+        self._lock = threading.Lock()
+        self.utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+
+        # 分钟层只保留与原始数据相同的天数，小时层和天层长期保留
+        self.tiers[0].load(cutoff=time.time() - minute_retention_days * 86400)
+        for tier in self.tiers[1:]:
+            tier.load()
+        self._restore_open_buckets()
+
+    def _restore_open_buckets(self):
+        """用已持久化的下级桶重建上级尚未关闭的桶"""
+        for child, parent in zip(self.tiers, self.tiers[1:]):
+            for device, series in child.series.items():
+                resume = parent.last_end(device) or 0.0
+                for i in range(bisect_left(series.starts, resume), len(series.starts)):
+                    values = tuple(series.columns[name][i] for name in _Series.COLUMNS)
+                    parent.add_bucket(device, series.starts[i], values, self.utc_offset)
+
+    def resume_time(self, device=None):
+        """原始数据需要从哪个时间点开始补入汇总；没有任何汇总数据时返回 None"""
+        if not any(tier.series for tier in self.tiers):
+            return None
+        return self.tiers[0].last_end(device) or 0.0
+
+    def add(self, timestamp, temperature, humidity, device=None):
+        """增量加入一条原始记录，O(1)"""
+        with self._lock:
+            self.tiers[0].add_sample(device, timestamp, temperature, humidity, self.utc_offset)
+
+    def select_tier(self, resolution):
+        """选择不超过所需分辨率的最粗层级，分辨率比分钟还细时返回 None"""
+        for tier in reversed(self.tiers):
+            if tier.interval <= resolution:
+                return tier
+        return None
+
+    def query(self, start, end, resolution, device=None):
+        """按分辨率（秒）查询 [start, end) 的汇总数据"""
+        tier = self.select_tier(resolution)
+        if tier is None:
+            return None
+        with self._lock:
+            result = tier.query(device, start, end)
+        result['tier'] = tier.name
+        return result
+
+    def clear(self):
+        """删除所有汇总数据"""
+        with self._lock:
+            for tier in self.tiers:
+                tier.clear()
+
+    def close(self):
+        with self._lock:
+            for tier in self.tiers:
+                tier.close()
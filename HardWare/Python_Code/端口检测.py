@@ -5,6 +5,8 @@ import serial.tools.list_ports
 import time
 import threading
 
+import port_probe
+
 
 class BluetoothConnectionTester:
     def __init__(self):
@@ -30,60 +32,23 @@ class BluetoothConnectionTester:
         return ports
 
     def test_port(self, port_name):
-        """测试指定串口"""
+        """测试指定串口：按可能性依次尝试波特率，收到回应立即返回"""
         print(f"\n=== 测试串口: {port_name} ===")
 
-        try:
-            # 尝试不同的波特率
-            baudrates = [9600, 115200, 57600, 38400, 19200]
-
-            for baudrate in baudrates:
-                print(f"尝试波特率 {baudrate}...")
-
-                try:
-                    ser = serial.Serial(
-                        port=port_name,
-                        baudrate=baudrate,
-                        timeout=1,
-                        write_timeout=1
-                    )
-
-                    # 清理缓冲区
-                    ser.reset_input_buffer()
-                    ser.reset_output_buffer()
-
-                    # 发送测试命令
-                    test_commands = [
-                        b"AT\r\n",
-                        b"AT\r",
-                        b"AT\n",
-                        b"TEST\r\n",
-                        b"CONNECT\r\n"
-                    ]
-
-                    for cmd in test_commands:
-                        print(f"发送: {cmd}")
-                        ser.write(cmd)
-                        time.sleep(0.5)
-
-                        # 读取响应
-                        if ser.in_waiting:
-                            response = ser.read(ser.in_waiting)
-                            print(f"收到响应: {response}")
-                            if response:
-                                print(f"成功使用波特率 {baudrate}")
-                                ser.close()
-                                return baudrate
-
-                    ser.close()
-
-                except Exception as e:
-                    print(f"波特率 {baudrate} 失败: {str(e)}")
-
-        except Exception as e:
-            print(f"测试失败: {str(e)}")
-
-        return None
+        result = port_probe.probe_port(port_name)
+        for attempt in result['attempts']:
+            print(f"波特率 {attempt['baudrate']}: {attempt['kind'] or '无响应'}")
+        if result['error']:
+            print(f"测试失败: {result['error']}")
+        if result['baudrate']:
+            print(f"收到响应: {result['response']}")
+            print(f"成功使用波特率 {result['baudrate']}（用时 {result['elapsed']:.2f}s）")
+        return result['baudrate']
+
+    def probe_all_ports(self):
+        """并行探测所有串口"""
+        print("=== 并行探测所有串口 ===")
+        port_probe.main([])
 
     def connect_to_bluetooth(self, port_name, baudrate=9600):
         """连接到蓝牙设备"""
@@ -215,15 +180,18 @@ def main():
         print("\n选择操作:")
         print("1. 列出所有串口")
         print("2. 手动测试")
-        print("3. 退出")
+        print("3. 并行探测所有串口")
+        print("4. 退出")
 
-        choice = input("请输入选项 (1-3): ").strip()
+        choice = input("请输入选项 (1-4): ").strip()
 
         if choice == '1':
             tester.list_all_ports()
         elif choice == '2':
             tester.manual_test()
         elif choice == '3':
+            tester.probe_all_ports()
+        elif choice == '4':
             break
         else:
             print("无效选项")
@@ -9,6 +9,7 @@ import sys
 
 PACKAGES = [
 "pandas",
+"pyarrow",
 "opencv-python",
 "numpy",
 "pyserial"